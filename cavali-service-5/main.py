@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import time
 import json
@@ -10,6 +11,11 @@ from typing import List, Dict
 from dotenv import load_dotenv
 from google.cloud import storage
 
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import tracing
+
 # --- Configuración del Logging ---
 # Esto nos dará logs más detallados en Cloud Run
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +27,7 @@ app = FastAPI(
     title="Cavali Service (Modo Local/Cloud)",
     description="Servicio que se conecta a la API de Cavali y gestiona el token en GCS."
 )
+tracing.install(app, "cavali")
 
 # --- Configuración de Cavali y GCS ---
 CAVALI_CLIENT_ID = os.getenv("CAVALI_CLIENT_ID")
@@ -102,7 +109,8 @@ async def validate_invoices(request: CavaliValidationRequest):
         # LOG: Registrar el cuerpo de la solicitud para depuración (sin datos sensibles si es necesario)
         logging.info(f"Recibida solicitud para validar {len(request.xml_files_data)} facturas.")
 
-        token = get_cavali_token()
+        with tracing.span("cavali_token"):
+            token = get_cavali_token()
         headers = {
             "Authorization": f"Bearer {token}",
             "x-api-key": CAVALI_API_KEY,
@@ -113,8 +121,9 @@ async def validate_invoices(request: CavaliValidationRequest):
         payload_bloqueo = {"invoiceXMLDetail": {"invoiceXML": invoice_xml_list}}
 
         logging.info("Enviando solicitud de bloqueo a Cavali...")
-        response_bloqueo = requests.post(CAVALI_BLOCK_URL, json=payload_bloqueo, headers=headers, timeout=60)
-        response_bloqueo.raise_for_status()
+        with tracing.span("cavali_block", invoice_count=len(invoice_xml_list)):
+            response_bloqueo = requests.post(CAVALI_BLOCK_URL, json=payload_bloqueo, headers=headers, timeout=60)
+            response_bloqueo.raise_for_status()
         
         # LOG: Registrar la respuesta de Cavali para ver qué se recibió
         bloqueo_data = response_bloqueo.json()
@@ -127,12 +136,14 @@ async def validate_invoices(request: CavaliValidationRequest):
             raise HTTPException(status_code=500, detail="Cavali no retornó un idProceso.")
 
         # Se recomienda un sleep mayor para dar tiempo a Cavali a procesar
-        time.sleep(7) 
+        with tracing.span("cavali_wait"):
+            time.sleep(7)
         
         logging.info(f"Consultando estado del proceso con id: {id_proceso}")
         payload_estado = {"ProcessFilter": {"idProcess": id_proceso}}
-        response_estado = requests.post(CAVALI_STATUS_URL, json=payload_estado, headers=headers, timeout=30)
-        response_estado.raise_for_status()
+        with tracing.span("cavali_status", process_id=id_proceso):
+            response_estado = requests.post(CAVALI_STATUS_URL, json=payload_estado, headers=headers, timeout=30)
+            response_estado.raise_for_status()
 
         # LOG: Registrar la respuesta de estado de Cavali
         cavali_response_data = response_estado.json()
@@ -1,5 +1,6 @@
 # drive-service/main.py
 import os
+import sys
 import io
 from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel, Field
@@ -9,11 +10,17 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload
 
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import tracing
+
 # --- Configuración ---
 app = FastAPI(
     title="Servicio de Google Drive",
     description="Crea carpetas y sube archivos desde Cloud Storage a Google Drive."
 )
+tracing.install(app, "drive")
 
 # Carga las variables de entorno
 DRIVE_PARENT_FOLDER_ID = os.getenv("DRIVE_PARENT_FOLDER_ID")
@@ -42,34 +49,33 @@ class ArchiveRequest(BaseModel):
     gcs_file_paths: list[str] = Field(..., description="Lista de rutas de archivos en GCS a archivar.")
 
 
-# --- Endpoint ---
-@app.post("/archive-files")
-async def archive_files(request: ArchiveRequest):
-    """
-    Crea una carpeta en Drive para la operación y sube los archivos desde GCS.
-    """
-    if not drive_service:
-        raise HTTPException(status_code=500, detail="El servicio de Google Drive no está inicializado correctamente.")
-    if not request.gcs_file_paths:
-        raise HTTPException(status_code=400, detail="No se proporcionaron rutas de archivos para archivar.")
+class SubmissionArchiveRequest(BaseModel):
+    submission_id: str = Field(..., description="ID del envío, se usará para el nombre de la carpeta compartida.")
+    gcs_file_paths: list[str] = Field(..., description="Todas las rutas de archivos del envío. Cada una se sube una sola vez.")
+    operations: list[ArchiveRequest] = Field(..., description="Operaciones del envío con los archivos que le corresponden.")
 
-    # 1. Crear la carpeta para la operación en la Unidad Compartida
-    try:
-        folder_metadata = {
-            'name': f"Operacion_{request.operation_id}",
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [DRIVE_PARENT_FOLDER_ID]
-        }
-        # 'supportsAllDrives=True' es crucial para Unidades Compartidas
-        folder = drive_service.files().create(
-            body=folder_metadata,
-            fields='id, webViewLink',
-            supportsAllDrives=True
-        ).execute()
-        folder_id = folder.get('id')
-        folder_url = folder.get('webViewLink')
-        print(f"Carpeta creada con éxito en Drive. URL: {folder_url}")
 
+# --- Funciones Auxiliares ---
+def _create_folder(name: str, parent_id: str) -> dict:
+    folder_metadata = {
+        'name': name,
+        'mimeType': 'application/vnd.google-apps.folder',
+        'parents': [parent_id]
+    }
+    # 'supportsAllDrives=True' es crucial para Unidades Compartidas
+    return drive_service.files().create(
+        body=folder_metadata,
+        fields='id, webViewLink',
+        supportsAllDrives=True
+    ).execute()
+
+
+def _create_folder_or_fail(name: str, parent_id: str) -> dict:
+    try:
+        with tracing.span("drive_create_folder", folder=name):
+            folder = _create_folder(name, parent_id)
+        print(f"Carpeta creada con éxito en Drive. URL: {folder.get('webViewLink')}")
+        return folder
     except HttpError as e:
         print(f"ERROR FATAL al crear carpeta en Drive: {e.content}")
         raise HTTPException(status_code=500, detail=f"No se pudo crear la carpeta en Drive: {e.content}")
@@ -77,34 +83,127 @@ async def archive_files(request: ArchiveRequest):
         print(f"ERROR FATAL Inesperado al crear carpeta: {e}")
         raise HTTPException(status_code=500, detail=f"Error inesperado al crear carpeta: {str(e)}")
 
-    # 2. Subir cada archivo a la nueva carpeta
-    successful_uploads = 0
-    for gcs_path in request.gcs_file_paths:
-        try:
-            # Descargar archivo de GCS
-            bucket_name, blob_name = gcs_path.replace("gs://", "").split("/", 1)
-            blob = storage_client.bucket(bucket_name).blob(blob_name)
-            file_bytes = blob.download_as_bytes()
-            
-            # Subir archivo a Drive
-            file_metadata = {
-                'name': os.path.basename(gcs_path),
-                'parents': [folder_id]
-            }
-            media = MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype='application/octet-stream', resumable=True)
-            
-            drive_service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id',
-                supportsAllDrives=True # También necesario aquí
-            ).execute()
-            successful_uploads += 1
 
+def _upload_from_gcs(gcs_path: str, folder_id: str) -> str:
+    """
+    Copia un archivo de GCS a una carpeta de Drive y devuelve el ID del archivo creado.
+    """
+    bucket_name, blob_name = gcs_path.replace("gs://", "").split("/", 1)
+    blob = storage_client.bucket(bucket_name).blob(blob_name)
+    with tracing.span("gcs_download", gcs_path=gcs_path):
+        file_bytes = blob.download_as_bytes()
+
+    file_metadata = {
+        'name': os.path.basename(gcs_path),
+        'parents': [folder_id]
+    }
+    media = MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype='application/octet-stream', resumable=True)
+
+    with tracing.span("drive_upload", size_bytes=len(file_bytes)):
+        created = drive_service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id',
+            supportsAllDrives=True # También necesario aquí
+        ).execute()
+    return created.get('id')
+
+
+def _create_shortcut(name: str, target_id: str, folder_id: str):
+    shortcut_metadata = {
+        'name': name,
+        'mimeType': 'application/vnd.google-apps.shortcut',
+        'shortcutDetails': {'targetId': target_id},
+        'parents': [folder_id]
+    }
+    drive_service.files().create(body=shortcut_metadata, fields='id', supportsAllDrives=True).execute()
+
+
+def _upload_all(gcs_file_paths: list[str], folder_id: str) -> dict:
+    """
+    Sube cada archivo distinto una sola vez. Devuelve {ruta GCS: ID en Drive}.
+    """
+    uploaded = {}
+    for gcs_path in dict.fromkeys(gcs_file_paths):
+        try:
+            uploaded[gcs_path] = _upload_from_gcs(gcs_path, folder_id)
         except Exception as e:
             # Si un archivo falla, solo se imprime una advertencia y se continúa con el siguiente
             print(f"ADVERTENCIA: Falló la subida de '{gcs_path}' a Drive. Error: {e}")
-            
+    return uploaded
+
+
+# --- Endpoints ---
+@app.post("/archive-files")
+async def archive_files(request: ArchiveRequest):
+    """
+    Crea una carpeta en Drive para la operación y sube los archivos desde GCS.
+    """
+    if not drive_service:
+        raise HTTPException(status_code=500, detail="El servicio de Google Drive no está inicializado correctamente.")
+    if not request.gcs_file_paths:
+        raise HTTPException(status_code=400, detail="No se proporcionaron rutas de archivos para archivar.")
+
+    # 1. Crear la carpeta para la operación en la Unidad Compartida
+    folder = _create_folder_or_fail(f"Operacion_{request.operation_id}", DRIVE_PARENT_FOLDER_ID)
+    folder_url = folder.get('webViewLink')
+
+    # 2. Subir cada archivo a la nueva carpeta
+    successful_uploads = len(_upload_all(request.gcs_file_paths, folder.get('id')))
     print(f"Proceso de subida finalizado. {successful_uploads}/{len(request.gcs_file_paths)} archivos subidos.")
     
-    return {"status": "SUCCESS", "drive_folder_url": folder_url, "files_uploaded": successful_uploads}
\ No newline at end of file
+    return {"status": "SUCCESS", "drive_folder_url": folder_url, "files_uploaded": successful_uploads}
+
+
+@app.post("/archive-submission")
+async def archive_submission(request: SubmissionArchiveRequest):
+    """
+    Archiva un envío completo: cada archivo se sube una sola vez y cada operación
+    recibe su propia carpeta con accesos directos solo a sus archivos.
+    Si el envío tiene una sola operación, los archivos se suben directamente a su carpeta.
+    """
+    if not drive_service:
+        raise HTTPException(status_code=500, detail="El servicio de Google Drive no está inicializado correctamente.")
+    if not request.gcs_file_paths or not request.operations:
+        raise HTTPException(status_code=400, detail="No se proporcionaron archivos u operaciones para archivar.")
+
+    if len(request.operations) == 1:
+        op = request.operations[0]
+        folder = _create_folder_or_fail(f"Operacion_{op.operation_id}", DRIVE_PARENT_FOLDER_ID)
+        uploaded = _upload_all(op.gcs_file_paths or request.gcs_file_paths, folder.get('id'))
+        print(f"Proceso de subida finalizado. {len(uploaded)} archivos subidos para {op.operation_id}.")
+        return {
+            "status": "SUCCESS",
+            "submission_folder_url": folder.get('webViewLink'),
+            "files_uploaded": len(uploaded),
+            "operations": {op.operation_id: {"drive_folder_url": folder.get('webViewLink'), "files_linked": len(uploaded)}}
+        }
+
+    # 1. Carpeta compartida del envío con una sola copia de cada archivo
+    shared_folder = _create_folder_or_fail(f"Envio_{request.submission_id}", DRIVE_PARENT_FOLDER_ID)
+    uploaded = _upload_all(request.gcs_file_paths, shared_folder.get('id'))
+    print(f"Archivos del envío subidos una sola vez: {len(uploaded)}/{len(set(request.gcs_file_paths))}.")
+
+    # 2. Una carpeta por operación con accesos directos a sus archivos
+    operations = {}
+    for op in request.operations:
+        folder = _create_folder_or_fail(f"Operacion_{op.operation_id}", DRIVE_PARENT_FOLDER_ID)
+        linked = 0
+        with tracing.span("drive_shortcuts", operation_id=op.operation_id):
+            for gcs_path in dict.fromkeys(op.gcs_file_paths):
+                if gcs_path not in uploaded:
+                    continue
+                try:
+                    _create_shortcut(os.path.basename(gcs_path), uploaded[gcs_path], folder.get('id'))
+                    linked += 1
+                except Exception as e:
+                    print(f"ADVERTENCIA: No se pudo crear el acceso directo de '{gcs_path}' en {op.operation_id}. Error: {e}")
+        operations[op.operation_id] = {"drive_folder_url": folder.get('webViewLink'), "files_linked": linked}
+        print(f"Carpeta de {op.operation_id}: {linked} accesos directos creados.")
+
+    return {
+        "status": "SUCCESS",
+        "submission_folder_url": shared_folder.get('webViewLink'),
+        "files_uploaded": len(uploaded),
+        "operations": operations
+    }
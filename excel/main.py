@@ -1,8 +1,14 @@
 import gspread
 import os
+import sys
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict
+
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import tracing
 
 # --- Modelo de Datos de Entrada ---
 class Contacto(BaseModel):
@@ -10,11 +16,15 @@ class Contacto(BaseModel):
     correo: str
     nombre_deudor: Optional[str] = None
 
+class SincronizacionContactos(BaseModel):
+    contactos: List[Contacto]
+
 # --- Inicialización de FastAPI y Google Sheets ---
 app = FastAPI(
     title="Microservicio de Google Sheets (Versión Estable)",
     description="Actualiza o crea contactos de deudores en una hoja de cálculo."
 )
+tracing.install(app, "excel")
 
 credentials_file = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
 if not credentials_file:
@@ -92,3 +102,78 @@ def get_emails(ruc: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error inesperado al obtener correos: {str(e)}")
 
+
+@app.post("/contacts/sync", summary="Actualizar o Crear varios Contactos en una sola pasada")
+def sync_contacts(request: SincronizacionContactos):
+    """
+    Versión en lote de /update-contact + /get-emails. Lee la hoja una sola vez,
+    aplica todos los cambios con un único batch_update/append_rows y devuelve la
+    lista de correos resultante de cada RUC.
+    """
+    try:
+        with tracing.span("sheets_read"):
+            all_rows = worksheet.get_all_values()
+
+        # Índice RUC -> (fila 1-indexada, correos actuales); gana la primera aparición
+        filas_por_ruc: Dict[str, int] = {}
+        correos_por_ruc: Dict[str, set] = {}
+        for i, row in enumerate(all_rows):
+            if row and row[0] and row[0] not in filas_por_ruc:
+                filas_por_ruc[row[0]] = i + 1
+                correos_actuales_str = row[2] if len(row) > 2 else ""
+                correos_por_ruc[row[0]] = {c.strip() for c in correos_actuales_str.split(';') if c.strip()}
+
+        filas_modificadas = set()
+        nuevas_filas: Dict[str, List[str]] = {}
+        resultados = {}
+
+        for contacto in request.contactos:
+            correo_nuevo = contacto.correo.strip()
+
+            if contacto.ruc in filas_por_ruc:
+                # --- LÓGICA SI EL RUC YA EXISTE ---
+                lista_de_correos = correos_por_ruc[contacto.ruc]
+                if correo_nuevo and correo_nuevo not in lista_de_correos:
+                    lista_de_correos.add(correo_nuevo)
+                    filas_modificadas.add(contacto.ruc)
+                    resultados[contacto.ruc] = {"status": "SUCCESS", "message": f"Contacto para RUC {contacto.ruc} actualizado."}
+                else:
+                    resultados.setdefault(contacto.ruc, {"status": "SUCCESS", "message": "RUC encontrado, sin correo nuevo para añadir."})
+
+            elif contacto.ruc in nuevas_filas:
+                # El RUC se repite dentro del mismo lote: se agregan sus correos a la fila nueva
+                if correo_nuevo:
+                    correos_por_ruc[contacto.ruc].add(correo_nuevo)
+
+            else:
+                # --- LÓGICA SI EL RUC NO SE ENCONTRÓ ---
+                if not contacto.nombre_deudor:
+                    resultados[contacto.ruc] = {
+                        "status": "ERROR",
+                        "message": f"RUC '{contacto.ruc}' no existe y se necesita 'nombre_deudor' para crearlo."
+                    }
+                    continue
+                nuevas_filas[contacto.ruc] = [contacto.ruc, contacto.nombre_deudor]
+                correos_por_ruc[contacto.ruc] = {correo_nuevo} if correo_nuevo else set()
+                resultados[contacto.ruc] = {"status": "CREATED", "message": f"Nuevo contacto para RUC {contacto.ruc} creado."}
+
+        with tracing.span("sheets_write", updated=len(filas_modificadas), created=len(nuevas_filas)):
+            if filas_modificadas:
+                worksheet.batch_update([
+                    {"range": f"C{filas_por_ruc[ruc]}", "values": [[";".join(sorted(correos_por_ruc[ruc]))]]}
+                    for ruc in filas_modificadas
+                ])
+            if nuevas_filas:
+                worksheet.append_rows([
+                    fila + [";".join(sorted(correos_por_ruc[ruc]))] for ruc, fila in nuevas_filas.items()
+                ])
+
+        for ruc, resultado in resultados.items():
+            resultado["emails"] = ";".join(sorted(correos_por_ruc.get(ruc, set())))
+
+        print(f"Sincronizados {len(request.contactos)} contactos: {len(filas_modificadas)} actualizados, {len(nuevas_filas)} creados.")
+        return {"status": "SUCCESS", "results": resultados}
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        raise HTTPException(status_code=500, detail=f"Error inesperado en excel-service: {str(e)}")
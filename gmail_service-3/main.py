@@ -1,4 +1,5 @@
 import os
+import sys
 import base64
 import mimetypes
 import io
@@ -20,6 +21,11 @@ from googleapiclient.discovery import build
 from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
 from openpyxl.utils import get_column_letter
 
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import tracing
+
 load_dotenv()
 
 # --- Configuración ---
@@ -45,6 +51,7 @@ RUC_GLORIA = [
 ]
 
 app = FastAPI(title="Servicio de Gmail Híbrido Avanzado")
+tracing.install(app, "gmail")
 
 class InvoiceData(BaseModel):
     document_id: Optional[str] = None
@@ -254,7 +261,8 @@ async def send_verification_email(request: Request):
             print(f"DEBUG: Verificando RUC del DEUDOR. RUC: '{ruc_deudor}', ¿Está en la lista de Gloria?: {ruc_deudor in RUC_GLORIA}")
 
             if ruc_deudor in RUC_GLORIA:
-                excel_filename, excel_bytes = create_gloria_excel(facturas_grupo)
+                with tracing.span("gmail_excel_gloria", invoice_count=len(facturas_grupo)):
+                    excel_filename, excel_bytes = create_gloria_excel(facturas_grupo)
                 
                 if excel_bytes:
                     print(f"DEBUG: Archivo Excel CREADO para DEUDOR '{ruc_deudor}'. Tamaño: {len(excel_bytes)} bytes. Adjuntando...")
@@ -273,16 +281,18 @@ async def send_verification_email(request: Request):
                 try:
                     bucket_name, blob_name = pdf_path.replace("gs://", "").split("/", 1)
                     blob = storage_client.bucket(bucket_name).blob(blob_name)
-                    pdf_bytes = blob.download_as_bytes()
+                    with tracing.span("gcs_download", gcs_path=pdf_path):
+                        pdf_bytes = blob.download_as_bytes()
                     maintype, subtype = (mimetypes.guess_type(os.path.basename(pdf_path))[0] or "application/octet-stream").split('/')
                     message.add_attachment(pdf_bytes, maintype=maintype, subtype=subtype, filename=os.path.basename(pdf_path))
                 except Exception as e:
                     print(f"ADVERTENCIA al adjuntar {pdf_path}: {e}")
 
             encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            gmail_service.users().messages().send(
-                userId=SENDER_USER_ID, body={'raw': encoded_message}
-            ).execute()
+            with tracing.span("gmail_send", debtor_ruc=ruc_deudor):
+                gmail_service.users().messages().send(
+                    userId=SENDER_USER_ID, body={'raw': encoded_message}
+                ).execute()
             print(f"Correo para deudor {ruc_deudor} enviado a: {emails_from_excel} con CC a: {cc_string}")
 
         return {"status": "SUCCESS", "message": "Correos de notificación enviados."}
@@ -0,0 +1,111 @@
+# orquestador-service-0/benchmarks/bench_startup.py
+"""
+Mide el tiempo hasta la primera petición de cada servicio del repositorio, con
+los clientes externos (GCS, Cloud SQL, Pub/Sub, Firebase, Google Sheets, Drive)
+reemplazados por mocks para no depender de credenciales ni de la red.
+
+Cada medición corre en un intérprete nuevo: importa main.py, arranca la app
+(lifespan/startup) y responde GET /openapi.json con el TestClient de FastAPI.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --services orquestador-service-0 parser-service-1
+"""
+import os
+import sys
+import json
+import glob
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Constructores de clientes que abren conexiones o leen credenciales al crearse
+STUBBED_CLIENTS = [
+    "google.cloud.storage.Client",
+    "google.cloud.sql.connector.Connector",
+    "google.cloud.pubsub_v1.PublisherClient",
+    "firebase_admin.initialize_app",
+    "firebase_admin.credentials.ApplicationDefault",
+    "gspread.service_account",
+    "googleapiclient.discovery.build",
+    "google.oauth2.service_account.Credentials.from_service_account_file",
+]
+
+ENV = {
+    "BUCKET_NAME": "bench",
+    "GCS_BUCKET_NAME": "bench",
+    "DATABASE_URL": "sqlite:///:memory:",
+    "BROKER_MODE": "memory",
+    "GOOGLE_SHEETS_CREDENTIALS": os.devnull,
+}
+
+CHILD = r"""
+import json, sys, time
+from unittest import mock
+started = time.perf_counter()
+for target in json.loads(sys.argv[1]):
+    try:
+        mock.patch(target, mock.MagicMock()).start()
+    except (ImportError, AttributeError):
+        pass
+stubs_s = time.perf_counter() - started
+
+t = time.perf_counter()
+import main
+import_s = time.perf_counter() - t
+
+from fastapi.testclient import TestClient
+t = time.perf_counter()
+with TestClient(main.app) as client:
+    startup_s = time.perf_counter() - t
+    t = time.perf_counter()
+    status = client.get("/openapi.json").status_code
+    first_request_s = time.perf_counter() - t
+    total_s = time.perf_counter() - started
+print(json.dumps({
+    "stubs_s": stubs_s, "import_s": import_s, "startup_s": startup_s,
+    "first_request_s": first_request_s, "total_s": total_s, "status": status,
+}))
+"""
+
+
+def measure(service_dir: str):
+    env = {**os.environ, **ENV}
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, json.dumps(STUBBED_CLIENTS)],
+        cwd=service_dir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["sin salida"])[-1]
+        return None, error
+    return json.loads(result.stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--services", nargs="+", help="directorios de servicio (por defecto, todos)")
+    args = parser.parse_args()
+
+    services = args.services or sorted(os.path.basename(os.path.dirname(p)) for p in glob.glob(os.path.join(REPO_ROOT, "*", "main.py")))
+    print(f"{'servicio':<24} | {'import':>8} | {'startup':>8} | {'1a req':>8} | {'total':>8}")
+    for service in services:
+        runs, error = [], None
+        for _ in range(args.repeat):
+            run, error = measure(os.path.join(REPO_ROOT, service))
+            if run is None:
+                break
+            runs.append(run)
+        if not runs:
+            print(f"{service:<24} | no disponible: {error}")
+            continue
+        median = {key: statistics.median(r[key] for r in runs) * 1000 for key in ("import_s", "startup_s", "first_request_s", "total_s")}
+        print(
+            f"{service:<24} | {median['import_s']:7.0f}ms | {median['startup_s']:7.0f}ms | "
+            f"{median['first_request_s']:7.0f}ms | {median['total_s']:7.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
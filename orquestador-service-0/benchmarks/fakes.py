@@ -0,0 +1,282 @@
+# orquestador-service-0/benchmarks/fakes.py
+"""
+Reemplazos locales de los servicios externos (GCS, Drive, Gmail, Google Sheets,
+Cavali y Trello) para las pruebas de carga sin red ni credenciales. Los usa
+run_service.py antes de importar el main.py de cada servicio.
+
+La latencia y los fallos de cada dependencia se configuran por variables de entorno:
+    BENCH_LATENCY_<DEP>_MS   latencia media en ms (con ±25 % de variación)
+    BENCH_FAILURE_<DEP>      probabilidad de fallo, entre 0 y 1
+con <DEP> en GCS, DRIVE, GMAIL, SHEETS, CAVALI_TOKEN, CAVALI_BLOCK, CAVALI_STATUS y TRELLO.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import itertools
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import requests
+
+# Referencia propia: la latencia simulada no debe pasar por el time.sleep reemplazado en Cavali
+_real_sleep = time.sleep
+
+# Carpeta compartida por todos los procesos que hace de bucket
+BENCH_GCS_DIR = os.getenv("BENCH_GCS_DIR", "/tmp/bench-gcs")
+
+
+# Usuario de las rutas autenticadas del orquestador (estado de los trabajos): el
+# mismo user_email de la metadata de bench_e2e.py, para que los trabajos sean suyos
+BENCH_USER_EMAIL = "bench@capitalexpress.pe"
+
+
+def fake_current_user() -> SimpleNamespace:
+    """Reemplaza a get_current_user: no hay tokens de Firebase en la prueba de carga."""
+    return SimpleNamespace(email=BENCH_USER_EMAIL, name="bench", claims={"email": BENCH_USER_EMAIL})
+
+
+class SimulatedFailure(Exception):
+    pass
+
+
+def simulate(dependency: str):
+    """Aplica la latencia configurada de la dependencia y, según su tasa, falla."""
+    key = dependency.upper()
+    latency_ms = float(os.getenv(f"BENCH_LATENCY_{key}_MS", "0"))
+    if latency_ms > 0:
+        _real_sleep(latency_ms * random.uniform(0.75, 1.25) / 1000)
+    if random.random() < float(os.getenv(f"BENCH_FAILURE_{key}", "0")):
+        raise SimulatedFailure(f"Fallo simulado de {dependency}")
+
+
+# --- GCS ---
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(BENCH_GCS_DIR, self.bucket.name, self.name)
+
+    def exists(self) -> bool:
+        simulate("gcs")
+        return os.path.exists(self._path)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        simulate("gcs")
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        # Se escribe a un temporal y se renombra para que las lecturas concurrentes vean el archivo completo
+        tmp_path = f"{self._path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        os.replace(tmp_path, self._path)
+
+    def upload_from_file(self, file_obj, size=None, content_type=None, **kwargs):
+        self.upload_from_string(file_obj.read() if size is None else file_obj.read(size), content_type=content_type)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        simulate("gcs")
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    download_as_string = download_as_bytes
+
+
+class FakeBucket:
+    def __init__(self, name: str):
+        self.name = name
+
+    def blob(self, name: str, chunk_size=None) -> FakeBlob:
+        return FakeBlob(self, name, chunk_size)
+
+
+class FakeStorageClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def bucket(self, name: str) -> FakeBucket:
+        return FakeBucket(name)
+
+
+# --- Drive y Gmail (googleapiclient) ---
+class _FakeRequest:
+    def __init__(self, dependency: str, result: Dict[str, Any]):
+        self.dependency = dependency
+        self.result = result
+
+    def execute(self) -> Dict[str, Any]:
+        simulate(self.dependency)
+        return self.result
+
+
+class _FakeDriveFiles:
+    def create(self, body=None, media_body=None, fields=None, **kwargs) -> _FakeRequest:
+        file_id = uuid.uuid4().hex
+        return _FakeRequest("drive", {"id": file_id, "webViewLink": f"https://drive.fake/{file_id}"})
+
+
+class _FakeDrive:
+    def files(self):
+        return _FakeDriveFiles()
+
+
+class _FakeGmail:
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId=None, body=None) -> _FakeRequest:
+        return _FakeRequest("gmail", {"id": uuid.uuid4().hex, "labelIds": ["SENT"]})
+
+
+def fake_build(service_name: str, version: str, **kwargs):
+    return _FakeGmail() if service_name == "gmail" else _FakeDrive()
+
+
+# --- Google Sheets (gspread) ---
+class FakeWorksheet:
+    """Hoja en memoria con la parte de la API de gspread que usa el servicio de Excel."""
+
+    def __init__(self, rows: List[List[str]] = None):
+        self.rows = rows if rows is not None else [["RUC", "NOMBRE", "CORREOS"]]
+        self._lock = threading.Lock()
+
+    def get_all_values(self) -> List[List[str]]:
+        simulate("sheets")
+        with self._lock:
+            return [list(r) for r in self.rows]
+
+    def cell(self, row: int, col: int):
+        simulate("sheets")
+        with self._lock:
+            values = self.rows[row - 1] if row <= len(self.rows) else []
+            return SimpleNamespace(row=row, col=col, value=values[col - 1] if col <= len(values) else None)
+
+    def find(self, value: str, in_column: int = None):
+        simulate("sheets")
+        with self._lock:
+            for i, row in enumerate(self.rows):
+                if in_column and len(row) >= in_column and row[in_column - 1] == value:
+                    return SimpleNamespace(row=i + 1, col=in_column, value=value)
+        import gspread
+        raise gspread.exceptions.CellNotFound(value)
+
+    def _set(self, row: int, col: int, value: str):
+        while len(self.rows) < row:
+            self.rows.append([])
+        values = self.rows[row - 1]
+        values.extend([""] * (col - len(values)))
+        values[col - 1] = value
+
+    def update_cell(self, row: int, col: int, value: str):
+        simulate("sheets")
+        with self._lock:
+            self._set(row, col, value)
+
+    def batch_update(self, updates: List[Dict[str, Any]]):
+        simulate("sheets")
+        with self._lock:
+            for update in updates:
+                # Solo rangos de una celda, como "C12"
+                cell_range = update["range"]
+                col = ord(cell_range[0].upper()) - ord("A") + 1
+                self._set(int(cell_range[1:]), col, update["values"][0][0])
+
+    def append_rows(self, rows: List[List[str]]):
+        simulate("sheets")
+        with self._lock:
+            self.rows.extend(list(r) for r in rows)
+
+    def append_row(self, row: List[str]):
+        self.append_rows([row])
+
+
+class _FakeSpreadsheet:
+    def __init__(self):
+        self._worksheet = FakeWorksheet()
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        return self._worksheet
+
+
+class _FakeGspreadClient:
+    def open(self, name: str) -> _FakeSpreadsheet:
+        return _FakeSpreadsheet()
+
+
+def fake_gspread_service_account(filename=None, **kwargs) -> _FakeGspreadClient:
+    return _FakeGspreadClient()
+
+
+# --- Cavali y Trello (requests.post) ---
+CAVALI_TOKEN_URL = "http://cavali.fake/token"
+CAVALI_BLOCK_URL = "http://cavali.fake/block"
+CAVALI_STATUS_URL = "http://cavali.fake/status"
+
+_processes: Dict[int, List[Dict[str, Any]]] = {}
+_processes_lock = threading.Lock()
+_process_ids = itertools.count(1)
+
+
+def _response(url: str, status_code: int, data: Dict[str, Any]) -> requests.Response:
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response._content = json.dumps(data).encode("utf-8")
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+def _cavali_invoices(invoice_xml: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    invoices = []
+    for item in invoice_xml:
+        # Nombre SUNAT: {ruc}-01-{serie}-{numero}.xml
+        parts = os.path.splitext(item["name"])[0].split("-")
+        ruc, serie, numeration = (parts[0], parts[2], parts[3]) if len(parts) >= 4 else ("", "", "")
+        invoices.append({
+            "ruc": ruc, "serie": serie, "numeration": numeration,
+            "resultCode": "0", "message": "Factura registrada y bloqueada correctamente.",
+        })
+    return invoices
+
+
+def fake_requests_post(url: str, *args, **kwargs) -> requests.Response:
+    if url.startswith("http://cavali.fake/"):
+        dependency = "cavali_" + url.rsplit("/", 1)[-1]
+    elif url.startswith("https://api.trello.com/"):
+        dependency = "trello"
+    else:
+        raise requests.ConnectionError(f"URL sin fake en las pruebas de carga: {url}")
+    try:
+        simulate(dependency)
+    except SimulatedFailure as e:
+        return _response(url, 503, {"error": str(e)})
+
+    if url == CAVALI_TOKEN_URL:
+        return _response(url, 200, {"access_token": uuid.uuid4().hex, "expires_in": 3600})
+    if url == CAVALI_BLOCK_URL:
+        invoices = _cavali_invoices(kwargs["json"]["invoiceXMLDetail"]["invoiceXML"])
+        with _processes_lock:
+            process_id = next(_process_ids)
+            _processes[process_id] = invoices
+        return _response(url, 200, {"response": {"idProceso": process_id}})
+    if url == CAVALI_STATUS_URL:
+        with _processes_lock:
+            invoices = _processes.pop(kwargs["json"]["ProcessFilter"]["idProcess"], [])
+        return _response(url, 200, {"response": {"Process": {"ProcessInvoiceDetail": {"Invoice": invoices}}}})
+    return _response(url, 200, {"id": uuid.uuid4().hex})
+
+
+def cavali_time(poll_wait_seconds: float) -> SimpleNamespace:
+    """
+    Sustituto del módulo time para el main.py de Cavali: la espera fija antes de
+    consultar el estado del proceso pasa a durar poll_wait_seconds.
+    """
+    return SimpleNamespace(time=time.time, sleep=lambda seconds: _real_sleep(poll_wait_seconds))
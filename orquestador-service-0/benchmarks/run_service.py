@@ -0,0 +1,64 @@
+# orquestador-service-0/benchmarks/run_service.py
+"""
+Arranca un servicio del repositorio con uvicorn y sus dependencias externas
+reemplazadas por las de fakes.py. Lo lanza bench_e2e.py, un proceso por servicio:
+
+    python benchmarks/run_service.py <directorio del servicio> <puerto> [--cavali-wait 0.5]
+"""
+import os
+import sys
+import argparse
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Objetivo a reemplazar -> atributo de fakes.py (o None para un MagicMock)
+PATCHES = {
+    "google.cloud.storage.Client": "FakeStorageClient",
+    "googleapiclient.discovery.build": "fake_build",
+    "gspread.service_account": "fake_gspread_service_account",
+    "google.oauth2.service_account.Credentials.from_service_account_file": None,
+    "firebase_admin.initialize_app": None,
+    "firebase_admin.credentials.ApplicationDefault": None,
+    "requests.post": "fake_requests_post",
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("service_dir")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--cavali-wait", type=float, default=0.5, help="espera de Cavali antes de consultar el estado (segundos)")
+    args = parser.parse_args(argv)
+
+    service_dir = os.path.abspath(args.service_dir)
+    os.chdir(service_dir)
+    sys.path[:0] = [service_dir, BENCH_DIR]
+    import fakes
+
+    for target, replacement in PATCHES.items():
+        try:
+            mock.patch(target, getattr(fakes, replacement) if replacement else mock.MagicMock()).start()
+        except (ImportError, AttributeError):
+            # El servicio no usa esa librería
+            pass
+
+    import main as service
+
+    name = os.path.basename(service_dir)
+    if name.startswith("gmail"):
+        # Lee token.json y la cuenta de servicio en cada petición
+        service.get_user_credentials = mock.MagicMock()
+        service.get_storage_client = fakes.FakeStorageClient
+    elif name.startswith("cavali"):
+        service.time = fakes.cavali_time(args.cavali_wait)
+    elif name.startswith("orquestador"):
+        service.app.dependency_overrides[service.get_current_user] = fakes.fake_current_user
+
+    import uvicorn
+    uvicorn.run(service.app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# orquestador-service-0/benchmarks/ubl_corpus.py
+"""
+Genera facturas electrónicas UBL 2.1 (formato SUNAT) sintéticas pero realistas:
+firma en UBLExtensions, emisor y adquirente, términos de pago (forma de pago,
+cuotas y detracción), impuestos y varias líneas. Cada factura tiene un número
+distinto, así que el orquestador nunca las toma por reenvíos.
+
+    python benchmarks/ubl_corpus.py --out /tmp/corpus --count 500
+"""
+import os
+import random
+import argparse
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+SUPPLIERS = [
+    ("20601234567", "INVERSIONES ANDINAS S.A.C."),
+    ("20512345678", "DISTRIBUIDORA DEL PACIFICO S.A."),
+    ("20498765432", "SERVICIOS INDUSTRIALES DEL SUR E.I.R.L."),
+    ("20387654321", "CONSTRUCTORA LOS ANDES S.A.C."),
+]
+CUSTOMERS = [
+    ("20100190797", "GLORIA S.A."),
+    ("20100070970", "SUPERMERCADOS PERUANOS S.A."),
+    ("20331061655", "COMPAÑIA MINERA ANTAMINA S.A."),
+    ("20100130204", "BBVA PERU"),
+    ("20131312955", "SUPERINTENDENCIA NACIONAL DE ADUANAS Y DE ADMINISTRACION TRIBUTARIA"),
+    ("20419387658", "HIPERMERCADOS TOTTUS S.A."),
+]
+
+NAMESPACES = (
+    'xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2" '
+    'xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" '
+    'xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2" '
+    'xmlns:ds="http://www.w3.org/2000/09/xmldsig#" '
+    'xmlns:ext="urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"'
+)
+
+
+def _party(tag: str, ruc: str, name: str) -> str:
+    return f"""  <cac:{tag}>
+    <cac:Party>
+      <cac:PartyIdentification>
+        <cbc:ID schemeID="6">{ruc}</cbc:ID>
+      </cac:PartyIdentification>
+      <cac:PartyLegalEntity>
+        <cbc:RegistrationName><![CDATA[{name}]]></cbc:RegistrationName>
+        <cac:RegistrationAddress>
+          <cbc:AddressTypeCode>0000</cbc:AddressTypeCode>
+          <cac:AddressLine><cbc:Line><![CDATA[AV. JAVIER PRADO ESTE 4200 - SANTIAGO DE SURCO - LIMA]]></cbc:Line></cac:AddressLine>
+        </cac:RegistrationAddress>
+      </cac:PartyLegalEntity>
+    </cac:Party>
+  </cac:{tag}>
+"""
+
+
+def _signature(rng: random.Random) -> str:
+    digest = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(28))
+    signature_value = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(344))
+    certificate = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(1800))
+    return f"""  <ext:UBLExtensions>
+    <ext:UBLExtension>
+      <ext:ExtensionContent>
+        <ds:Signature Id="SignSUNAT">
+          <ds:SignedInfo>
+            <ds:CanonicalizationMethod Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/>
+            <ds:SignatureMethod Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1"/>
+            <ds:Reference URI="">
+              <ds:Transforms><ds:Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"/></ds:Transforms>
+              <ds:DigestMethod Algorithm="http://www.w3.org/2000/09/xmldsig#sha1"/>
+              <ds:DigestValue>{digest}</ds:DigestValue>
+            </ds:Reference>
+          </ds:SignedInfo>
+          <ds:SignatureValue>{signature_value}</ds:SignatureValue>
+          <ds:KeyInfo><ds:X509Data><ds:X509Certificate>{certificate}</ds:X509Certificate></ds:X509Data></ds:KeyInfo>
+        </ds:Signature>
+      </ext:ExtensionContent>
+    </ext:UBLExtension>
+  </ext:UBLExtensions>
+"""
+
+
+def _line(n: int, rng: random.Random, currency: str) -> Tuple[str, float]:
+    quantity = rng.randint(1, 50)
+    unit_price = round(rng.uniform(5, 900), 2)
+    base = round(quantity * unit_price, 2)
+    igv = round(base * 0.18, 2)
+    description = escape(rng.choice([
+        "SERVICIO DE MANTENIMIENTO PREVENTIVO", "SUMINISTRO DE MATERIALES DE CONSTRUCCION",
+        "TRANSPORTE DE CARGA LIMA - AREQUIPA", "ALQUILER DE MAQUINARIA PESADA", "INSUMOS PARA PRODUCCION",
+    ]))
+    return f"""  <cac:InvoiceLine>
+    <cbc:ID>{n}</cbc:ID>
+    <cbc:InvoicedQuantity unitCode="NIU">{quantity}</cbc:InvoicedQuantity>
+    <cbc:LineExtensionAmount currencyID="{currency}">{base:.2f}</cbc:LineExtensionAmount>
+    <cac:PricingReference><cac:AlternativeConditionPrice>
+      <cbc:PriceAmount currencyID="{currency}">{unit_price * 1.18:.2f}</cbc:PriceAmount>
+      <cbc:PriceTypeCode>01</cbc:PriceTypeCode>
+    </cac:AlternativeConditionPrice></cac:PricingReference>
+    <cac:TaxTotal>
+      <cbc:TaxAmount currencyID="{currency}">{igv:.2f}</cbc:TaxAmount>
+      <cac:TaxSubtotal>
+        <cbc:TaxableAmount currencyID="{currency}">{base:.2f}</cbc:TaxableAmount>
+        <cbc:TaxAmount currencyID="{currency}">{igv:.2f}</cbc:TaxAmount>
+        <cac:TaxCategory><cbc:Percent>18</cbc:Percent><cbc:TaxExemptionReasonCode>10</cbc:TaxExemptionReasonCode>
+          <cac:TaxScheme><cbc:ID>1000</cbc:ID><cbc:Name>IGV</cbc:Name><cbc:TaxTypeCode>VAT</cbc:TaxTypeCode></cac:TaxScheme>
+        </cac:TaxCategory>
+      </cac:TaxSubtotal>
+    </cac:TaxTotal>
+    <cac:Item><cbc:Description><![CDATA[{description}]]></cbc:Description>
+      <cac:SellersItemIdentification><cbc:ID>PRD{rng.randint(1000, 9999)}</cbc:ID></cac:SellersItemIdentification>
+    </cac:Item>
+    <cac:Price><cbc:PriceAmount currencyID="{currency}">{unit_price:.2f}</cbc:PriceAmount></cac:Price>
+  </cac:InvoiceLine>
+""", base
+
+
+def make_invoice(supplier: Tuple[str, str], customer: Tuple[str, str], serie: str, number: int, currency: str,
+                 issue_date: date, rng: random.Random, lines: int = 3) -> Tuple[str, bytes]:
+    """Devuelve (nombre de archivo SUNAT, contenido) de una factura."""
+    invoice_lines, bases = [], []
+    for n in range(1, lines + 1):
+        xml, base = _line(n, rng, currency)
+        invoice_lines.append(xml)
+        bases.append(base)
+    base_total = round(sum(bases), 2)
+    igv_total = round(base_total * 0.18, 2)
+    payable = round(base_total + igv_total, 2)
+    document_id = f"{serie}-{number}"
+    due_date = issue_date + timedelta(days=rng.choice([30, 45, 60, 90]))
+    detraccion = ""
+    if rng.random() < 0.3:
+        detraccion = f"""  <cac:PaymentTerms>
+    <cbc:ID>Detraccion</cbc:ID>
+    <cbc:PaymentMeansID>037</cbc:PaymentMeansID>
+    <cbc:PaymentPercent>12</cbc:PaymentPercent>
+    <cbc:Amount currencyID="PEN">{payable * 0.12:.2f}</cbc:Amount>
+  </cac:PaymentTerms>
+"""
+    xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+<Invoice {NAMESPACES}>
+{_signature(rng)}  <cbc:UBLVersionID>2.1</cbc:UBLVersionID>
+  <cbc:CustomizationID>2.0</cbc:CustomizationID>
+  <cbc:ID>{document_id}</cbc:ID>
+  <cbc:IssueDate>{issue_date.isoformat()}</cbc:IssueDate>
+  <cbc:IssueTime>10:{rng.randint(10, 59)}:00</cbc:IssueTime>
+  <cbc:DueDate>{due_date.isoformat()}</cbc:DueDate>
+  <cbc:InvoiceTypeCode listID="0101">01</cbc:InvoiceTypeCode>
+  <cbc:Note languageLocaleID="1000"><![CDATA[SON {payable:.2f} {currency}]]></cbc:Note>
+  <cbc:DocumentCurrencyCode>{currency}</cbc:DocumentCurrencyCode>
+  <cbc:LineCountNumeric>{lines}</cbc:LineCountNumeric>
+  <cac:Signature>
+    <cbc:ID>{supplier[0]}</cbc:ID>
+    <cac:SignatoryParty><cac:PartyIdentification><cbc:ID>{supplier[0]}</cbc:ID></cac:PartyIdentification></cac:SignatoryParty>
+    <cac:DigitalSignatureAttachment><cac:ExternalReference><cbc:URI>#SignSUNAT</cbc:URI></cac:ExternalReference></cac:DigitalSignatureAttachment>
+  </cac:Signature>
+{_party("AccountingSupplierParty", *supplier)}{_party("AccountingCustomerParty", *customer)}  <cac:PaymentTerms>
+    <cbc:ID>FormaPago</cbc:ID>
+    <cbc:PaymentMeansID>Credito</cbc:PaymentMeansID>
+    <cbc:Amount currencyID="{currency}">{payable:.2f}</cbc:Amount>
+  </cac:PaymentTerms>
+  <cac:PaymentTerms>
+    <cbc:ID>FormaPago</cbc:ID>
+    <cbc:PaymentMeansID>Cuota001</cbc:PaymentMeansID>
+    <cbc:Amount currencyID="{currency}">{payable:.2f}</cbc:Amount>
+    <cbc:PaymentDueDate>{due_date.isoformat()}</cbc:PaymentDueDate>
+  </cac:PaymentTerms>
+{detraccion}  <cac:TaxTotal>
+    <cbc:TaxAmount currencyID="{currency}">{igv_total:.2f}</cbc:TaxAmount>
+    <cac:TaxSubtotal>
+      <cbc:TaxableAmount currencyID="{currency}">{base_total:.2f}</cbc:TaxableAmount>
+      <cbc:TaxAmount currencyID="{currency}">{igv_total:.2f}</cbc:TaxAmount>
+      <cac:TaxCategory><cac:TaxScheme><cbc:ID>1000</cbc:ID><cbc:Name>IGV</cbc:Name><cbc:TaxTypeCode>VAT</cbc:TaxTypeCode></cac:TaxScheme></cac:TaxCategory>
+    </cac:TaxSubtotal>
+  </cac:TaxTotal>
+  <cac:LegalMonetaryTotal>
+    <cbc:LineExtensionAmount currencyID="{currency}">{base_total:.2f}</cbc:LineExtensionAmount>
+    <cbc:TaxInclusiveAmount currencyID="{currency}">{payable:.2f}</cbc:TaxInclusiveAmount>
+    <cbc:PayableAmount currencyID="{currency}">{payable:.2f}</cbc:PayableAmount>
+  </cac:LegalMonetaryTotal>
+{"".join(invoice_lines)}</Invoice>
+"""
+    return f"{supplier[0]}-01-{document_id}.xml", xml.encode("utf-8")
+
+
+def iter_submissions(count: int, invoices_per_submission: int, seed: int = 0,
+                     usd_ratio: float = 0.3) -> Iterator[List[Tuple[str, bytes]]]:
+    """
+    Envíos de `invoices_per_submission` facturas del mismo emisor, con números
+    correlativos que no se repiten entre envíos ni entre ejecuciones con otra semilla.
+    """
+    rng = random.Random(seed)
+    serie = f"F{seed % 1000:03d}"
+    number = 1
+    for i in range(count):
+        supplier = SUPPLIERS[i % len(SUPPLIERS)]
+        files = []
+        for _ in range(invoices_per_submission):
+            currency = "USD" if rng.random() < usd_ratio else "PEN"
+            issue_date = date(2024, 1, 1) + timedelta(days=rng.randint(0, 300))
+            files.append(make_invoice(supplier, rng.choice(CUSTOMERS), serie, number, currency, issue_date, rng,
+                                      lines=rng.randint(1, 8)))
+            number += 1
+        yield files
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    for files in iter_submissions(args.count, 1, seed=args.seed):
+        for filename, content in files:
+            with open(os.path.join(args.out, filename), "wb") as f:
+                f.write(content)
+    print(f"{args.count} facturas escritas en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+# orquestador-service-0/broker.py
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class BrokerMessage:
+    id: int
+    topic: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class SQLiteBroker:
+    """
+    Broker local con semántica de Pub/Sub (entrega al menos una vez, ack y
+    reintentos con espera) sobre una tabla SQLite. Con path=":memory:" funciona
+    dentro del mismo proceso, útil para pruebas de carga sin conexión.
+    """
+
+    def __init__(self, path: str = ":memory:", max_attempts: int = 5):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mensajes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                estado TEXT NOT NULL DEFAULT 'PENDIENTE',
+                disponible_en REAL NOT NULL,
+                error TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_mensajes_topic_estado ON mensajes (topic, estado, disponible_en)")
+
+    def publish_batch(self, topic: str, payloads: List[Dict[str, Any]]) -> List[int]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            ids = []
+            for payload in payloads:
+                cursor = self._conn.execute(
+                    "INSERT INTO mensajes (topic, payload, disponible_en) VALUES (?, ?, ?)",
+                    (topic, json.dumps(payload), now),
+                )
+                ids.append(cursor.lastrowid)
+            self._conn.execute("COMMIT")
+        return ids
+
+    def pull(self, topic: str, max_messages: int = 10, ack_deadline: float = 60.0) -> List[BrokerMessage]:
+        """
+        Reserva hasta max_messages mensajes disponibles. Si no se confirman antes de
+        ack_deadline segundos vuelven a quedar disponibles.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT id, payload, intentos FROM mensajes "
+                "WHERE topic = ? AND estado = 'PENDIENTE' AND disponible_en <= ? ORDER BY id LIMIT ?",
+                (topic, now, max_messages),
+            ).fetchall()
+            for row in rows:
+                self._conn.execute(
+                    "UPDATE mensajes SET intentos = intentos + 1, disponible_en = ? WHERE id = ?",
+                    (now + ack_deadline, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        return [BrokerMessage(id=r[0], topic=topic, payload=json.loads(r[1]), attempts=r[2] + 1) for r in rows]
+
+    def ack(self, message_id: int):
+        with self._lock:
+            self._conn.execute("UPDATE mensajes SET estado = 'CONFIRMADO' WHERE id = ?", (message_id,))
+
+    def nack(self, message: BrokerMessage, retry_delay: float, error: Optional[str] = None):
+        """
+        Devuelve el mensaje a la cola tras retry_delay segundos, o lo marca como
+        FALLIDO (dead letter) si ya agotó sus intentos.
+        """
+        estado = "FALLIDO" if message.attempts >= self.max_attempts else "PENDIENTE"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE mensajes SET estado = ?, disponible_en = ?, error = ? WHERE id = ?",
+                (estado, time.time() + retry_delay, error, message.id),
+            )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT topic, estado, COUNT(*) FROM mensajes GROUP BY topic, estado").fetchall()
+        stats: Dict[str, Dict[str, int]] = {}
+        for topic, estado, count in rows:
+            stats.setdefault(topic, {})[estado] = count
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Subscriber:
+    """
+    Grupo de workers que consumen un topic del broker local. Cada mensaje se
+    confirma (ack) si el handler termina bien; si falla, se reintenta con espera
+    exponencial hasta agotar los intentos del broker.
+    """
+
+    def __init__(self, broker: SQLiteBroker, topic: str, handler: Callable[[Dict[str, Any]], Awaitable[None]],
+                 workers: int = 1, batch_size: int = 5, ack_deadline: float = 300.0,
+                 poll_interval: float = 0.2, retry_base_seconds: float = 2.0):
+        self.broker = broker
+        self.topic = topic
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.ack_deadline = ack_deadline
+        self.poll_interval = poll_interval
+        self.retry_base_seconds = retry_base_seconds
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            messages = await asyncio.to_thread(self.broker.pull, self.topic, self.batch_size, self.ack_deadline)
+            if not messages:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            for message in messages:
+                await self._deliver(message)
+
+    async def _deliver(self, message: BrokerMessage):
+        try:
+            await self.handler(message.payload)
+        except Exception as e:
+            delay = self.retry_base_seconds * (2 ** (message.attempts - 1))
+            print(f"ADVERTENCIA: Falló el mensaje {message.id} de {self.topic} (intento {message.attempts}). Error: {e}")
+            await asyncio.to_thread(self.broker.nack, message, delay, str(e))
+            return
+        await asyncio.to_thread(self.broker.ack, message.id)
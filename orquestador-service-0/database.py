@@ -1,35 +1,88 @@
 # orquestador-service-0/database.py
 import os
+import threading
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects import postgresql, sqlite
 
 # --- Importaciones añadidas ---
 from dotenv import load_dotenv
-from google.cloud.sql.connector import Connector
+from google.cloud.sql.connector import Connector, create_async_connector
+
+import db_metrics
 
 
 load_dotenv()
 
-connector = Connector()
+# --- Configuración del pool (se aplica al motor síncrono y al asíncrono) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
 
-def get_db_connection():
+# Motores, sesiones y conectores se crean recién cuando se usan por primera vez:
+# importar este módulo no abre conexiones ni necesita credenciales.
+_engine = None
+_async_engine = None
+_session_factory = None
+_async_session_factory = None
+_connector = None
+_async_connector = None
+_lock = threading.Lock()
+
+
+def _pool_kwargs(url: str, poolclass) -> dict:
+    # SQLite en memoria usa su propio pool de una conexión, sin tamaño configurable
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _async_url(database_url: str) -> str:
     """
-    Crea y retorna un motor de conexión a la base de datos de Cloud SQL.
+    Versión asíncrona de DATABASE_URL: postgresql -> asyncpg, sqlite -> aiosqlite.
+    Se puede indicar una distinta con ASYNC_DATABASE_URL.
     """
+    url = make_url(database_url)
+    driver = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}[url.get_backend_name()]
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _cloud_sql_settings():
     instance_connection_name = os.getenv("DB_INSTANCE_CONNECTION_NAME")
     db_user = os.getenv("DB_USER")
-    db_pass = os.getenv("DB_PASS")
-    db_name = os.getenv("DB_NAME")
 
     if not instance_connection_name:
         raise ValueError("La variable de entorno DB_INSTANCE_CONNECTION_NAME no está definida.")
     if not db_user:
         raise ValueError("La variable de entorno DB_USER no está definida.")
+    return instance_connection_name, db_user, os.getenv("DB_PASS"), os.getenv("DB_NAME")
+
+
+def get_db_connection():
+    """
+    Crea y retorna un motor de conexión a la base de datos de Cloud SQL.
+    Si se define DATABASE_URL (p. ej. un Postgres o SQLite local) se usa esa URL.
+    """
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return create_engine(database_url, pool_pre_ping=True, **_pool_kwargs(database_url, db_metrics.InstrumentedQueuePool))
 
+    global _connector
+    instance_connection_name, db_user, db_pass, db_name = _cloud_sql_settings()
+    _connector = _connector or Connector()
     engine = create_engine(
         "postgresql+pg8000://",
-        creator=lambda: connector.connect(
+        creator=lambda: _connector.connect(
             instance_connection_name,
             "pg8000",
             user=db_user,
@@ -37,19 +90,103 @@ def get_db_connection():
             db=db_name
         ),
         pool_pre_ping=True,
+        **_pool_kwargs("postgresql", db_metrics.InstrumentedQueuePool),
     )
     return engine
 
-engine = get_db_connection()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_async_db_connection():
+    """
+    Motor asíncrono para los endpoints y el pipeline: asyncpg sobre el conector de
+    Cloud SQL, o la versión asíncrona de DATABASE_URL si está definida.
+    """
+    database_url = os.getenv("ASYNC_DATABASE_URL") or (os.getenv("DATABASE_URL") and _async_url(os.getenv("DATABASE_URL")))
+    if database_url:
+        return create_async_engine(
+            database_url, pool_pre_ping=True, **_pool_kwargs(database_url, db_metrics.InstrumentedAsyncAdaptedQueuePool)
+        )
+
+    instance_connection_name, db_user, db_pass, db_name = _cloud_sql_settings()
+
+    async def _connect():
+        # El conector asíncrono debe crearse dentro del event loop que lo va a usar
+        global _async_connector
+        if _async_connector is None:
+            _async_connector = await create_async_connector()
+        return await _async_connector.connect_async(
+            instance_connection_name,
+            "asyncpg",
+            user=db_user,
+            password=db_pass,
+            db=db_name
+        )
+
+    return create_async_engine(
+        "postgresql+asyncpg://",
+        async_creator=_connect,
+        pool_pre_ping=True,
+        **_pool_kwargs("postgresql", db_metrics.InstrumentedAsyncAdaptedQueuePool),
+    )
+
+
+def get_engine():
+    """
+    Motor síncrono, solo para manage.py y los benchmarks.
+    """
+    global _engine, _session_factory
+    with _lock:
+        if _engine is None:
+            _engine = get_db_connection()
+            db_metrics.instrument_engine(_engine, "sync")
+            _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    return _engine
+
+def get_async_engine():
+    """
+    Motor asíncrono de los endpoints y del pipeline.
+    """
+    global _async_engine, _async_session_factory
+    with _lock:
+        if _async_engine is None:
+            _async_engine = get_async_db_connection()
+            db_metrics.instrument_engine(_async_engine.sync_engine, "async")
+            _async_session_factory = async_sessionmaker(
+                bind=_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+            )
+    return _async_engine
+
+def SessionLocal() -> Session:
+    get_engine()
+    return _session_factory()
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_session_factory()
+
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """
-    Abre y cierra una sesión de base de datos por cada petición.
+    Abre y cierra una sesión asíncrona de base de datos por cada petición.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+async def close_engines():
+    """
+    Cierra los pools y conectores que se hayan llegado a crear.
+    """
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _async_connector is not None:
+        await _async_connector.close_async()
+    if _engine is not None:
+        _engine.dispose()
+    if _connector is not None:
+        _connector.close()
+
+def dialect_insert(bind):
+    """
+    insert() del dialecto del motor, que admite ON CONFLICT en Postgres y SQLite.
+    """
+    return {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[bind.dialect.name]
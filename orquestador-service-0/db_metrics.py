@@ -0,0 +1,127 @@
+# orquestador-service-0/db_metrics.py
+import time
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Límites de los buckets en segundos (acumulativos, como en Prometheus)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._sum += seconds
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[f"le_{bound}"] = running
+        cumulative["le_inf"] = running + counts[-1]
+        return {"count": cumulative["le_inf"], "sum_s": round(total_sum, 6), "buckets": cumulative}
+
+
+class EngineMetrics:
+    """
+    Métricas de un motor de SQLAlchemy: espera para obtener una conexión del pool,
+    conexiones en uso y latencia de cada consulta.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_wait = Histogram()
+        self.query_latency = Histogram()
+        self.engine = None
+
+    def snapshot(self) -> Dict[str, object]:
+        pool = {}
+        current = self.engine.pool if self.engine is not None else None
+        if isinstance(current, QueuePool):
+            pool = {
+                "size": current.size(),
+                "checked_out": current.checkedout(),
+                "checked_in": current.checkedin(),
+                "overflow": max(current.overflow(), 0),
+            }
+        return {
+            "pool": pool,
+            "checkout_wait_s": self.checkout_wait.snapshot(),
+            "query_latency_s": self.query_latency.snapshot(),
+        }
+
+
+_engines: Dict[str, EngineMetrics] = {}
+
+
+class _TimedCheckoutMixin:
+    """Mide cuánto se espera por una conexión libre del pool."""
+    metrics: Optional[EngineMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.checkout_wait.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() reemplaza el pool; el nuevo sigue reportando a las mismas métricas
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str) -> EngineMetrics:
+    """
+    Registra las métricas de un motor (síncrono, o el sync_engine de uno asíncrono).
+    """
+    metrics = EngineMetrics(name)
+    metrics.engine = engine
+    if isinstance(engine.pool, _TimedCheckoutMixin):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started: List[float] = conn.info.get("query_started") or []
+        if started:
+            metrics.query_latency.observe(time.perf_counter() - started.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        started: List[float] = (context.connection.info.get("query_started") if context.connection else None) or []
+        if started:
+            metrics.query_latency.observe(time.perf_counter() - started.pop())
+
+    _engines[name] = metrics
+    return metrics
+
+
+def snapshot() -> Dict[str, object]:
+    return {name: metrics.snapshot() for name, metrics in _engines.items()}
@@ -0,0 +1,295 @@
+# orquestador-service-0/event_pipeline.py
+import os
+import asyncio
+import contextlib
+import functools
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncSessionLocal
+from repository import AsyncOperationRepository, is_duplicate_invoice_error
+from broker import Subscriber
+import gcs_uploader
+import jobs
+import pipeline
+import publisher_utils
+import stage_journal
+import tracing
+from xml_index import XmlContentIndex
+
+# --- Topics del pipeline por eventos ---
+# recibidas -> parse -> parseadas -> excel/cavali -> validadas -> BD -> guardadas
+#   -> Drive (una vez por envío) -> archivadas (un mensaje por moneda) -> Gmail/Trello
+TOPIC_RECIBIDAS = "operaciones-recibidas"
+TOPIC_PARSEADAS = "operaciones-parseadas"
+TOPIC_VALIDADAS = "operaciones-validadas"
+TOPIC_GUARDADAS = "operaciones-guardadas"
+TOPIC_ARCHIVADAS = "operaciones-archivadas"
+
+# Workers por etapa cuando se usa el broker local (sqlite/memory)
+STAGE_WORKERS = {
+    TOPIC_RECIBIDAS: int(os.getenv("EVENT_WORKERS_PARSE", "2")),
+    TOPIC_PARSEADAS: int(os.getenv("EVENT_WORKERS_VALIDATE", "4")),
+    TOPIC_VALIDADAS: int(os.getenv("EVENT_WORKERS_PERSIST", "2")),
+    TOPIC_GUARDADAS: int(os.getenv("EVENT_WORKERS_ARCHIVE", "4")),
+    TOPIC_ARCHIVADAS: int(os.getenv("EVENT_WORKERS_NOTIFY", "4")),
+}
+EVENT_PULL_BATCH = int(os.getenv("EVENT_PULL_BATCH", "5"))
+EVENT_ACK_DEADLINE_SECONDS = float(os.getenv("EVENT_ACK_DEADLINE_SECONDS", "600"))
+EVENT_RETRY_BASE_SECONDS = float(os.getenv("EVENT_RETRY_BASE_SECONDS", "2"))
+
+
+async def publish(topic: str, payloads: List[Dict[str, Any]]):
+    # Cada mensaje lleva la traza de la etapa que lo publicó
+    trace = tracing.outgoing_headers()
+    payloads = [{**p, "trace": trace} for p in payloads] if trace else payloads
+    await asyncio.to_thread(publisher_utils.publish_messages, topic, payloads)
+
+
+class EventPipeline:
+    """
+    Ejecuta las etapas del pipeline como consumidores de topics. Cada etapa publica
+    el resultado en el topic siguiente, por lo que un consumidor lento (p. ej. Drive)
+    no retiene a los demás ni a la petición del usuario.
+
+    Con Pub/Sub los mensajes llegan por push a POST /events/{topic}; con el broker
+    local (sqlite/memory) los consume un grupo de workers por etapa en este proceso.
+
+    Un mismo mensaje puede llegar más de una vez (nack, vencimiento del plazo de
+    ack, reintento tras un 5xx). Por eso cada etapa anota su salida en la bitácora
+    del trabajo (etapas_envio, con el job_id) y, si ya la había anotado, la reutiliza
+    sin repetir sus efectos: IDs y registro en la BD, carpetas de Drive y notificaciones.
+    """
+
+    def __init__(self, get_bucket: Callable[[], Any]):
+        # El bucket se obtiene al usarlo, para no crear el cliente de GCS al importar
+        self.get_bucket = get_bucket
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {
+            TOPIC_RECIBIDAS: self.on_received,
+            TOPIC_PARSEADAS: self.on_parsed,
+            TOPIC_VALIDADAS: self.on_validated,
+            TOPIC_GUARDADAS: self.on_persisted,
+            TOPIC_ARCHIVADAS: self.on_archived,
+        }
+        self._subscribers: List[Subscriber] = []
+
+    # --- Ciclo de vida ---
+    def start(self):
+        if not publisher_utils.uses_local_broker():
+            return
+        broker = publisher_utils.get_local_broker()
+        self._subscribers = [
+            Subscriber(
+                broker, topic, functools.partial(self.handle, topic),
+                workers=STAGE_WORKERS[topic],
+                batch_size=EVENT_PULL_BATCH,
+                ack_deadline=EVENT_ACK_DEADLINE_SECONDS,
+                retry_base_seconds=EVENT_RETRY_BASE_SECONDS,
+            )
+            for topic in self.handlers
+        ]
+        for subscriber in self._subscribers:
+            subscriber.start()
+        print(f"--- 📨 Pipeline por eventos iniciado con broker '{publisher_utils.BROKER_MODE}' ---")
+
+    async def stop(self):
+        await asyncio.gather(*(s.stop() for s in self._subscribers))
+        self._subscribers = []
+
+    async def submit(self, submission: pipeline.Submission, job_id: Optional[str] = None):
+        await publish(TOPIC_RECIBIDAS, [{"job_id": job_id, "submission": submission.to_dict()}])
+
+    async def handle(self, topic: str, payload: Dict[str, Any]):
+        handler = self.handlers.get(topic)
+        if handler is None:
+            raise KeyError(topic)
+        with tracing.continue_trace(payload.get("trace"), f"event {topic}"):
+            await handler(payload)
+
+    # --- Seguimiento del trabajo ---
+    @contextlib.asynccontextmanager
+    async def _stage(self, msg: Dict[str, Any], name: str):
+        job_id = msg.get("job_id")
+        if not job_id:
+            yield
+            return
+        async with AsyncSessionLocal() as db:
+            async with jobs.JobStageTracker(db, job_id).stage(name):
+                yield
+
+    async def _update_job(self, msg: Dict[str, Any], update: Callable[..., Awaitable[Any]], *args):
+        if not msg.get("job_id"):
+            return None
+        async with AsyncSessionLocal() as db:
+            return await update(db, msg["job_id"], *args)
+
+    async def _journal(self, msg: Dict[str, Any]) -> pipeline.StageJournal:
+        if not msg.get("job_id"):
+            return pipeline.StageJournal()
+        async with AsyncSessionLocal() as db:
+            return await stage_journal.DbStageJournal.load(db, msg["job_id"])
+
+    # --- Etapas ---
+    async def on_received(self, msg: Dict[str, Any]):
+        submission = msg["submission"]
+        journal = await self._journal(msg)
+
+        async def _parse():
+            async with self._stage(msg, "parse"):
+                return {"results": await pipeline.parse_invoices(submission["upload_id"], submission["xml_paths"])}
+
+        parsed_results = (await pipeline.run_stage(journal, "parse", _parse))["results"]
+        if not pipeline.collect_valid_invoices(parsed_results):
+            await journal.record_failure("No se pudo parsear ninguna factura válida.")
+            await self._update_job(msg, jobs.fail_job, "No se pudo parsear ninguna factura válida.")
+            return
+        await publish(TOPIC_PARSEADAS, [{**msg, "parsed_results": parsed_results}])
+
+    async def on_parsed(self, msg: Dict[str, Any]):
+        submission = msg["submission"]
+        parsed_results = msg["parsed_results"]
+        journal = await self._journal(msg)
+        groups = pipeline.InvoiceGroups()
+        for res in parsed_results:
+            groups.add(res)
+        groups.finish()
+        invoices = groups.invoices
+        invoices_by_currency = groups.by_currency
+        filenames_by_currency = {
+            currency: {inv['xml_filename'] for inv in group}
+            for currency, group in invoices_by_currency.items()
+        }
+        correo_de_la_operacion = submission["metadata"].get('mailVerificacion', '').strip()
+
+        async def _excel():
+            async with self._stage(msg, "excel"):
+                return {"correos_por_ruc": await pipeline.sync_debtor_contacts(
+                    invoices, correo_de_la_operacion, groups.by_debtor_ruc
+                )}
+
+        async def _cavali():
+            async with self._stage(msg, "cavali"):
+                xml_index = XmlContentIndex.from_contents(
+                    await gcs_uploader.download_files(self.get_bucket(), submission["xml_paths"])
+                )
+                return {"results_by_currency": await pipeline.validate_groups_in_cavali(xml_index, filenames_by_currency)}
+
+        excel_output, cavali_output = await asyncio.gather(
+            pipeline.run_stage(journal, "excel", _excel), pipeline.run_stage(journal, "cavali", _cavali)
+        )
+        cavali_results_by_currency = cavali_output["results_by_currency"]
+
+        await self._update_job(msg, jobs.register_groups, list(invoices_by_currency.keys()))
+        await publish(TOPIC_VALIDADAS, [{
+            "job_id": msg.get("job_id"),
+            "submission": submission,
+            "parsed_results": parsed_results,
+            "groups": [
+                {
+                    "currency": currency,
+                    "invoices": group,
+                    "cavali_results": cavali_results_by_currency[currency],
+                }
+                for currency, group in invoices_by_currency.items()
+            ],
+            "correos_por_ruc": excel_output["correos_por_ruc"],
+        }])
+
+    async def on_validated(self, msg: Dict[str, Any]):
+        # Las operaciones se registran antes de archivarlas: los IDs se generan y se
+        # guardan en el mismo paso, y las URLs de Drive se completan en la etapa siguiente.
+        journal = await self._journal(msg)
+        currencies = [group["currency"] for group in msg["groups"]]
+        ids_reused = journal.completed("operation_ids") is not None
+
+        async def _ids():
+            async with AsyncSessionLocal() as db:
+                operation_ids = await AsyncOperationRepository(db).generar_ids_operacion(len(currencies))
+            return {"operation_ids": dict(zip(currencies, operation_ids))}
+
+        async def _save():
+            async with self._stage(msg, "db"):
+                async with AsyncSessionLocal() as db:
+                    with tracing.span("db", group_count=len(msg["groups"])):
+                        repo = AsyncOperationRepository(db)
+                        # Un intento anterior pudo guardarlas y fallar antes de anotar la etapa
+                        if not (ids_reused and await repo.existe_operacion(operation_ids[currencies[0]])):
+                            await repo.save_full_operations([
+                                {
+                                    "operation_id": operation_ids[group["currency"]],
+                                    "metadata": msg["submission"]["metadata"],
+                                    "drive_url": None,
+                                    "invoices_data": group["invoices"],
+                                    "cavali_results_map": group["cavali_results"],
+                                }
+                                for group in msg["groups"]
+                            ])
+            return {"operation_ids": operation_ids}
+
+        try:
+            operation_ids = (await pipeline.run_stage(journal, "operation_ids", _ids))["operation_ids"]
+            await pipeline.run_stage(journal, "db", _save)
+        except IntegrityError as e:
+            if not is_duplicate_invoice_error(e):
+                raise
+            # Otro envío registró las mismas facturas: reintentar el mensaje no cambiaría el resultado
+            await journal.record_failure(pipeline.DUPLICATE_INVOICES_DETAIL)
+            await self._update_job(msg, jobs.fail_job, pipeline.DUPLICATE_INVOICES_DETAIL)
+            return
+        groups = [{**group, "operation_id": operation_ids[group["currency"]]} for group in msg["groups"]]
+        await publish(TOPIC_GUARDADAS, [{**msg, "groups": groups}])
+
+    async def on_persisted(self, msg: Dict[str, Any]):
+        submission = pipeline.Submission(**msg["submission"])
+        journal = await self._journal(msg)
+        paths_by_operation = {
+            group["operation_id"]: pipeline.files_for_group(submission, {inv['xml_filename'] for inv in group["invoices"]})
+            for group in msg["groups"]
+        }
+
+        async def _drive():
+            async with self._stage(msg, "drive"):
+                return {"urls": await pipeline.archive_submission(submission.all_gcs_paths, paths_by_operation)}
+
+        drive_urls = (await pipeline.run_stage(journal, "drive", _drive))["urls"]
+        # Guardar la URL es idempotente: se repite sin problema si el mensaje vuelve a llegar
+        async with AsyncSessionLocal() as db:
+            repo = AsyncOperationRepository(db)
+            for operation_id, drive_folder_url in drive_urls.items():
+                await repo.actualizar_url_drive(operation_id, drive_folder_url)
+        # Las notificaciones de cada operación se envían como mensajes independientes
+        await publish(TOPIC_ARCHIVADAS, [
+            {
+                "job_id": msg.get("job_id"),
+                "submission": msg["submission"],
+                "parsed_results": msg["parsed_results"],
+                "correos_por_ruc": msg["correos_por_ruc"],
+                **group,
+                "drive_folder_url": drive_urls[group["operation_id"]],
+            }
+            for group in msg["groups"]
+        ])
+
+    async def on_archived(self, msg: Dict[str, Any]):
+        submission = msg["submission"]
+        currency = msg["currency"]
+        journal = await self._journal(msg)
+        async with self._stage(msg, f"notifications_{currency}"):
+            # Solo por los canales que no se completaron en una entrega anterior del mensaje
+            await pipeline.notify_with_journal(
+                journal, msg["operation_id"], submission["metadata"], msg["drive_folder_url"], msg["invoices"],
+                msg["parsed_results"], submission["pdf_paths"], submission["respaldo_paths"],
+                msg["cavali_results"], msg["correos_por_ruc"]
+            )
+        resultado = await self._update_job(msg, jobs.complete_group, currency, {
+            "operation_id": msg["operation_id"], "currency": currency,
+            "drive_url": msg["drive_folder_url"], "invoice_count": len(msg["invoices"])
+        })
+        if resultado is not None:
+            # Cierra la bitácora como run_submission: el envío solo se puede reanudar
+            # si alguna notificación quedó postergada
+            await journal.record(pipeline.ETAPA_RESULTADO, {
+                "message": resultado["message"], "operations": resultado["operations"],
+                "existing_operations": (journal.submission_data or {}).get("existing_operations", []),
+            })
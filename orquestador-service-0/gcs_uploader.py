@@ -0,0 +1,137 @@
+# orquestador-service-0/gcs_uploader.py
+import os
+import time
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from fastapi import UploadFile
+
+# --- Configuración ---
+# Número de archivos que se suben a GCS en simultáneo
+GCS_UPLOAD_CONCURRENCY = int(os.getenv("GCS_UPLOAD_CONCURRENCY", "16"))
+# Tamaño de cada trozo en subidas reanudables (GCS exige múltiplos de 256 KB)
+GCS_CHUNK_SIZE = int(os.getenv("GCS_CHUNK_SIZE_KB", "8192")) // 256 * 256 * 1024
+# A partir de este tamaño se usa subida reanudable por trozos en lugar de una sola petición
+GCS_RESUMABLE_THRESHOLD = int(os.getenv("GCS_RESUMABLE_THRESHOLD_KB", "8192")) * 1024
+# Los archivos se guardan por contenido: {GCS_CONTENT_PREFIX}/{sha256}/{nombre}
+GCS_CONTENT_PREFIX = os.getenv("GCS_CONTENT_PREFIX", "contenido")
+HASH_READ_SIZE = 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=GCS_UPLOAD_CONCURRENCY, thread_name_prefix="gcs-upload")
+
+
+@dataclass
+class UploadResult:
+    filename: str
+    folder: str
+    gcs_path: str
+    size_bytes: int
+    sha256: str
+    seconds: float
+    # True si el contenido ya estaba en el bucket y no se volvió a subir
+    reused: bool = False
+
+
+def _stream_size(stream) -> int:
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def _sha256_of(stream) -> str:
+    """
+    Lee el archivo completo una vez antes de subirlo: la ruta por contenido y la
+    comprobación de si ya existe necesitan el hash antes de empezar la subida, así
+    que no se puede calcular al vuelo mientras se sube. Los XML no pasan por aquí
+    (el índice ya trae su sha256); solo los PDF y los respaldos se leen dos veces.
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_READ_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def content_path(sha256: str, filename: str) -> str:
+    return f"{GCS_CONTENT_PREFIX}/{sha256}/{filename}"
+
+
+def _upload_one(bucket, file: UploadFile, folder: str) -> UploadResult:
+    """
+    Sube un archivo bajo su clave por contenido. Acepta un UploadFile o cualquier
+    objeto con filename, file y content_type (p. ej. una entrada del índice de XML,
+    que además trae su sha256 ya calculado).
+    """
+    started = time.perf_counter()
+    stream = file.file
+    size = _stream_size(stream)
+    sha256 = getattr(file, "sha256", None) or _sha256_of(stream)
+    blob_path = content_path(sha256, file.filename)
+
+    # Los archivos grandes se envían en trozos mediante una sesión reanudable
+    chunk_size = GCS_CHUNK_SIZE if size >= GCS_RESUMABLE_THRESHOLD else None
+    blob = bucket.blob(blob_path, chunk_size=chunk_size)
+
+    # Un reenvío del mismo archivo (p. ej. tras un timeout) ya está en el bucket
+    reused = blob.exists()
+    if not reused:
+        blob.upload_from_file(stream, size=size, content_type=file.content_type or None)
+
+    return UploadResult(
+        filename=file.filename,
+        folder=folder,
+        gcs_path=f"gs://{bucket.name}/{blob_path}",
+        size_bytes=size,
+        sha256=sha256,
+        seconds=time.perf_counter() - started,
+        reused=reused,
+    )
+
+
+async def upload_files(bucket, files_by_folder: Dict[str, List[UploadFile]]) -> Dict[str, List[UploadResult]]:
+    """
+    Sube a GCS todos los archivos de una operación con concurrencia acotada.
+    Devuelve, por carpeta, los resultados en el mismo orden en que llegaron los archivos.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    folders = list(files_by_folder.keys())
+    tasks = [
+        [loop.run_in_executor(_executor, _upload_one, bucket, f, folder) for f in files_by_folder[folder]]
+        for folder in folders
+    ]
+    results = {folder: list(await asyncio.gather(*folder_tasks)) for folder, folder_tasks in zip(folders, tasks)}
+
+    all_results = [r for folder in folders for r in results[folder]]
+    if all_results:
+        slowest = max(all_results, key=lambda r: r.seconds)
+        total_bytes = sum(r.size_bytes for r in all_results if not r.reused)
+        reused = sum(1 for r in all_results if r.reused)
+        print(
+            f"--- ☁️  {len(all_results) - reused} archivos ({total_bytes} bytes) subidos a GCS y {reused} ya existentes en "
+            f"{time.perf_counter() - started:.2f}s. Más lento: {slowest.filename} ({slowest.seconds:.2f}s) ---"
+        )
+        for r in all_results:
+            estado = "ya existía" if r.reused else f"{r.size_bytes} bytes"
+            print(f"[GCS] {r.folder}/{r.filename}: {estado} en {r.seconds:.3f}s sha256={r.sha256}")
+    return results
+
+
+def _download_one(bucket, gcs_path: str) -> bytes:
+    blob_path = gcs_path.replace(f"gs://{bucket.name}/", "", 1)
+    return bucket.blob(blob_path).download_as_bytes()
+
+
+async def download_files(bucket, gcs_paths: List[str]) -> Dict[str, bytes]:
+    """
+    Descarga en paralelo archivos del bucket y los devuelve por nombre de archivo.
+    """
+    loop = asyncio.get_running_loop()
+    contents = await asyncio.gather(*(loop.run_in_executor(_executor, _download_one, bucket, p) for p in gcs_paths))
+    return {os.path.basename(p): c for p, c in zip(gcs_paths, contents)}
@@ -0,0 +1,212 @@
+# orquestador-service-0/http_client.py
+import os
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+import resilience
+import tracing
+
+# --- Configuración del cliente HTTP compartido ---
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+# Número máximo de llamadas simultáneas a los microservicios desde esta instancia
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "16"))
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP asíncrono compartido (pool con keep-alive).
+    Se crea de forma perezosa en la primera llamada.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(HTTP_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close_client():
+    """
+    Cierra el pool de conexiones. Se llama al apagar la aplicación.
+    """
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+async def _send(method: str, url: str, service: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+    # Cada intento es un span hijo de la etapa y su ID viaja al servicio llamado
+    with tracing.span(f"http {service or httpx.URL(url).host}", method=method) as current:
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), **tracing.outgoing_headers()}
+        async with _get_semaphore():
+            response = await get_client().request(method, url, **kwargs)
+        current.attributes["status_code"] = response.status_code
+        return response
+
+
+async def request(method: str, url: str, timeout: Optional[float] = None, service: Optional[str] = None,
+                  idempotent: bool = False, **kwargs: Any) -> httpx.Response:
+    """
+    Ejecuta una petición usando el pool compartido, limitando la concurrencia
+    global y aplicando un timeout por llamada.
+
+    Si se indica `service`, la llamada pasa por el circuit breaker de ese servicio
+    (CircuitOpenError si está abierto) y los fallos pasajeros se reintentan con
+    jitter mientras quede presupuesto global de reintentos. Los cuerpos enviados
+    como stream no se pueden repetir y no se reintentan.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+    if service is None:
+        return await _send(method, url, **kwargs)
+
+    breaker = resilience.get_breaker(service)
+    content = kwargs.get("content")
+    replayable = content is None or isinstance(content, (bytes, str))
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise resilience.CircuitOpenError(service)
+        attempt += 1
+        breaker.requests += 1
+        resilience.retry_budget.record_request()
+        response, error = None, None
+        try:
+            response = await _send(method, url, service, **kwargs)
+        except httpx.HTTPError as e:
+            error = e
+
+        if resilience.is_failure(response, error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if (
+            (error is not None or response.status_code >= 400)
+            and replayable
+            and attempt < resilience.HTTP_RETRY_MAX_ATTEMPTS
+            and resilience.is_retryable(response, error, idempotent)
+            and not breaker.is_open()
+            and resilience.retry_budget.try_acquire()
+        ):
+            breaker.retries += 1
+            wait = resilience.backoff_seconds(attempt)
+            print(f"--- 🔁 Reintento {attempt} de {service} en {wait:.2f}s ({describe_error(error) if error else response.status_code}) ---")
+            await asyncio.sleep(wait)
+            continue
+        if error is not None:
+            raise error
+        return response
+
+
+def _record_outcome(breaker: Optional[resilience.CircuitBreaker], response: Optional[httpx.Response],
+                    error: Optional[Exception]):
+    if breaker is None:
+        return
+    if resilience.is_failure(response, error):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+@contextlib.asynccontextmanager
+async def stream(method: str, url: str, timeout: Optional[float] = None, service: Optional[str] = None,
+                 idempotent: bool = False, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+    """
+    Como request(), pero entrega la respuesta sin leer el cuerpo, para consumirlo a
+    medida que llega (response.aiter_lines()). La conexión ocupa un lugar del límite
+    de concurrencia hasta salir del bloque.
+
+    Solo se reintenta mientras no hay respuesta (p. ej. sin conexión): una vez
+    entregada, quien consume ya pudo haber usado una parte del cuerpo. Los cortes a
+    mitad del cuerpo también cuentan como fallo en el circuit breaker de `service`.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+    breaker = resilience.get_breaker(service) if service is not None else None
+    content = kwargs.get("content")
+    replayable = content is None or isinstance(content, (bytes, str))
+    attempt = 0
+    while True:
+        if breaker is not None:
+            if not breaker.allow():
+                raise resilience.CircuitOpenError(service)
+            breaker.requests += 1
+            resilience.retry_budget.record_request()
+        attempt += 1
+        response, error = None, None
+        with tracing.span(f"http {service or httpx.URL(url).host}", method=method, stream=True) as current:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **tracing.outgoing_headers()}
+            async with _get_semaphore():
+                client = get_client()
+                try:
+                    response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+                except httpx.TransportError as e:
+                    error = e
+                if response is not None:
+                    current.attributes["status_code"] = response.status_code
+                    try:
+                        yield response
+                    except httpx.TransportError as e:
+                        # Un raise_for_status() dentro del bloque no es un error de red: cuenta su código
+                        error = e
+                        raise
+                    finally:
+                        await response.aclose()
+                        _record_outcome(breaker, response, error)
+                    return
+        _record_outcome(breaker, None, error)
+
+        if (
+            breaker is not None
+            and replayable
+            and attempt < resilience.HTTP_RETRY_MAX_ATTEMPTS
+            and resilience.is_retryable(None, error, idempotent)
+            and not breaker.is_open()
+            and resilience.retry_budget.try_acquire()
+        ):
+            breaker.retries += 1
+            wait = resilience.backoff_seconds(attempt)
+            print(f"--- 🔁 Reintento {attempt} de {service} en {wait:.2f}s ({describe_error(error)}) ---")
+            await asyncio.sleep(wait)
+            continue
+        raise error
+
+
+async def post_json(url: str, payload: Any, timeout: Optional[float] = None, service: Optional[str] = None,
+                    idempotent: bool = False) -> httpx.Response:
+    return await request("POST", url, json=payload, timeout=timeout, service=service, idempotent=idempotent)
+
+
+async def get(url: str, timeout: Optional[float] = None, service: Optional[str] = None) -> httpx.Response:
+    return await request("GET", url, timeout=timeout, service=service, idempotent=True)
+
+
+def describe_error(e: httpx.HTTPError) -> str:
+    """
+    Texto legible de un error HTTP, incluyendo el cuerpo de la respuesta si existe.
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.text
+    return str(e) or e.__class__.__name__
@@ -0,0 +1,66 @@
+# orquestador-service-0/id_allocator.py
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection, Engine
+
+from database import dialect_insert
+from models import Operacion, SecuenciaOperacion
+
+
+class OperationIdAllocator:
+    """
+    Asigna IDs de operación OP-YYYYMMDD-NNN a partir de un contador por día en la
+    tabla secuencias_operacion. Cada reserva es un UPDATE ... RETURNING que
+    incrementa el contador en la cantidad pedida, así que dos envíos simultáneos
+    nunca reciben el mismo número y un envío con varias monedas obtiene todos sus
+    IDs en un solo viaje a la base de datos.
+
+    Usa su propia conexión y confirma en el acto: la fila del contador queda
+    bloqueada solo durante el incremento y no mientras dura el resto del envío.
+    """
+
+    def __init__(self, bind: Engine):
+        self.bind = bind
+        self._insert = dialect_insert(bind)
+
+    def reserve(self, cantidad: int = 1, fecha: Optional[datetime] = None) -> List[str]:
+        if cantidad < 1:
+            raise ValueError("La cantidad de IDs a reservar debe ser mayor que cero.")
+        fecha_str = (fecha or datetime.now()).strftime('%Y%m%d')
+
+        with self.bind.begin() as conn:
+            ultimo = conn.execute(
+                update(SecuenciaOperacion)
+                .where(SecuenciaOperacion.fecha == fecha_str)
+                .values(ultimo_numero=SecuenciaOperacion.ultimo_numero + cantidad)
+                .returning(SecuenciaOperacion.ultimo_numero)
+            ).scalar()
+            if ultimo is None:
+                # Primera reserva del día: crea el contador. Si otro envío lo creó
+                # en paralelo, el ON CONFLICT lo incrementa igual que el UPDATE.
+                inicial = self._ultimo_numero_existente(conn, fecha_str)
+                stmt = self._insert(SecuenciaOperacion).values(fecha=fecha_str, ultimo_numero=inicial + cantidad)
+                ultimo = conn.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[SecuenciaOperacion.fecha],
+                        set_={"ultimo_numero": SecuenciaOperacion.ultimo_numero + cantidad},
+                    ).returning(SecuenciaOperacion.ultimo_numero)
+                ).scalar()
+
+        primero = ultimo - cantidad + 1
+        return [f"OP-{fecha_str}-{n:03d}" for n in range(primero, ultimo + 1)]
+
+    @staticmethod
+    def _ultimo_numero_existente(conn: Connection, fecha_str: str) -> int:
+        """
+        Número más alto ya usado ese día, para no repetir IDs creados antes de
+        que existiera el contador. Solo se consulta al crear la fila del día. Se
+        compara el número y no el texto del ID: "OP-...-1000" < "OP-...-999".
+        """
+        ids = conn.execute(
+            select(Operacion.id).where(Operacion.id.like(f"OP-{fecha_str}-%"))
+        ).scalars()
+        numeros = [int(suffix) for suffix in (op_id.rsplit('-', 1)[-1] for op_id in ids) if suffix.isdigit()]
+        return max(numeros, default=0)
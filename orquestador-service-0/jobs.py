@@ -0,0 +1,216 @@
+# orquestador-service-0/jobs.py
+import os
+import time
+import uuid
+import asyncio
+import contextlib
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import TrabajoOperacion
+import pipeline
+import stage_journal
+import tracing
+
+# --- Configuración ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+
+ESTADO_PENDIENTE = "PENDIENTE"
+ESTADO_EN_PROCESO = "EN_PROCESO"
+ESTADO_COMPLETADO = "COMPLETADO"
+ESTADO_ERROR = "ERROR"
+
+
+class JobStageTracker(pipeline.StageTracker):
+    """
+    Guarda en la tabla trabajos_operacion el inicio, fin y duración de cada etapa.
+    """
+
+    def __init__(self, db: AsyncSession, job_id: str):
+        self.db = db
+        self.job_id = job_id
+        # Las etapas en paralelo (Excel y CAVALI) comparten la sesión, que no admite uso concurrente
+        self._lock = asyncio.Lock()
+
+    async def _update_stage(self, name: str, **fields):
+        async with self._lock:
+            job = await self.db.get(TrabajoOperacion, self.job_id)
+            etapas = dict(job.etapas or {})
+            etapas[name] = {**etapas.get(name, {}), **fields}
+            job.etapas = etapas
+            if fields.get("estado") == ESTADO_EN_PROCESO:
+                job.etapa_actual = name
+            await self.db.commit()
+
+    @contextlib.asynccontextmanager
+    async def stage(self, name: str):
+        started = time.perf_counter()
+        await self._update_stage(name, estado=ESTADO_EN_PROCESO, inicio=datetime.now().isoformat())
+        try:
+            yield
+        except Exception as e:
+            await self._update_stage(
+                name, estado=ESTADO_ERROR, fin=datetime.now().isoformat(),
+                duracion_s=round(time.perf_counter() - started, 3), error=str(e)
+            )
+            raise
+        await self._update_stage(
+            name, estado=ESTADO_COMPLETADO, fin=datetime.now().isoformat(),
+            duracion_s=round(time.perf_counter() - started, 3)
+        )
+
+
+async def create_job(db: AsyncSession, submission: pipeline.Submission, etapas: Optional[Dict[str, Any]] = None) -> TrabajoOperacion:
+    job = TrabajoOperacion(
+        id=uuid.uuid4().hex,
+        estado=ESTADO_PENDIENTE,
+        etapas=etapas or {},
+        email_usuario=submission.metadata.get('user_email'),
+        metadata_envio=submission.metadata,
+        archivos={
+            "upload_id": submission.upload_id,
+            "xml_paths": submission.xml_paths,
+            "pdf_paths": submission.pdf_paths,
+            "respaldo_paths": submission.respaldo_paths,
+        },
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+def job_to_dict(job: TrabajoOperacion) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.estado,
+        "current_stage": job.etapa_actual,
+        "stages": job.etapas or {},
+        "result": job.resultado,
+        "error": job.error,
+        "created_at": job.fecha_creacion.isoformat() if job.fecha_creacion else None,
+        "updated_at": job.fecha_actualizacion.isoformat() if job.fecha_actualizacion else None,
+    }
+
+
+async def _set_job_state(db: AsyncSession, job_id: str, **fields):
+    job = await db.get(TrabajoOperacion, job_id)
+    for key, value in fields.items():
+        setattr(job, key, value)
+    await db.commit()
+
+
+async def fail_job(db: AsyncSession, job_id: str, error: str):
+    await _set_job_state(db, job_id, estado=ESTADO_ERROR, error=error)
+
+
+async def complete_job(db: AsyncSession, job_id: str, result: Dict[str, Any]):
+    await _set_job_state(db, job_id, estado=ESTADO_COMPLETADO, etapa_actual=None, resultado=result, error=None)
+
+
+async def register_groups(db: AsyncSession, job_id: str, currencies: List[str]):
+    """
+    Anota qué grupos de moneda tiene el trabajo, para saber cuándo termina
+    cuando cada grupo avanza por separado en el pipeline de eventos.
+    """
+    job = await db.get(TrabajoOperacion, job_id)
+    # Un mensaje repetido no reinicia los grupos que ya avanzaron
+    if (job.resultado or {}).get("pending_currencies") is not None:
+        return
+    await _set_job_state(db, job_id, estado=ESTADO_EN_PROCESO, resultado={"pending_currencies": currencies, "operations": []})
+
+
+async def complete_group(db: AsyncSession, job_id: str, currency: str, operation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Anota la operación de un grupo de moneda ya notificado. Devuelve el resultado
+    del trabajo si con este grupo terminó.
+    """
+    job = (await db.execute(
+        select(TrabajoOperacion).where(TrabajoOperacion.id == job_id).with_for_update()
+    )).scalar_one()
+    resultado = dict(job.resultado or {})
+    if currency not in resultado.get("pending_currencies", []):
+        # Mensaje repetido: el grupo ya se había completado
+        return
+    pending = [c for c in resultado["pending_currencies"] if c != currency]
+    operations = resultado.get("operations", []) + [operation]
+    resultado.update(pending_currencies=pending, operations=operations)
+    if not pending:
+        job.estado = ESTADO_COMPLETADO
+        job.etapa_actual = None
+        resultado["message"] = f"Proceso finalizado. Se crearon {len(operations)} operaciones."
+    job.resultado = resultado
+    await db.commit()
+    return resultado if not pending else None
+
+
+class JobRunner:
+    """
+    Cola en memoria con un grupo fijo de workers que ejecutan el pipeline de los
+    envíos recibidos en modo asíncrono.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        print(f"--- 🧵 {self.workers} workers de trabajos asíncronos iniciados ---")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: str, submission: pipeline.Submission):
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="El procesamiento asíncrono no está disponible.")
+        try:
+            # La traza de la petición sigue en el worker que procesa el trabajo
+            self._queue.put_nowait((job_id, submission, tracing.outgoing_headers()))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Demasiadas operaciones en cola. Intente nuevamente en unos minutos.")
+
+    async def _worker(self, n: int):
+        while True:
+            job_id, submission, trace = await self._queue.get()
+            try:
+                with tracing.continue_trace(trace, "job", job_id=job_id):
+                    await self._process(job_id, submission)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str, submission: pipeline.Submission):
+        print(f"--- 🧵 Procesando trabajo {job_id} ---")
+        db = AsyncSessionLocal()
+        tracking_db = AsyncSessionLocal()
+        try:
+            await _set_job_state(tracking_db, job_id, estado=ESTADO_EN_PROCESO)
+            # La bitácora del envío usa el mismo ID que el trabajo (ver POST /api/operaciones/envios/{id}/reanudar)
+            result = await pipeline.run_submission(
+                db, submission, JobStageTracker(tracking_db, job_id), stage_journal.DbStageJournal(job_id)
+            )
+            await complete_job(tracking_db, job_id, result)
+            print(f"--- ✅ Trabajo {job_id} completado ---")
+        except Exception as e:
+            await db.rollback()
+            await tracking_db.rollback()
+            error = pipeline.to_http_exception(e)
+            await _set_job_state(tracking_db, job_id, estado=ESTADO_ERROR, error=str(error.detail))
+            print(f"ERROR: Falló el trabajo {job_id}: {error.detail}")
+        finally:
+            await db.close()
+            await tracking_db.close()
+
+
+job_runner = JobRunner()
@@ -0,0 +1,86 @@
+# orquestador-service-0/last_login.py
+import os
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from database import AsyncSessionLocal
+from repository import AsyncOperationRepository
+
+# --- Configuración ---
+# Cada cuántos segundos se guardan en la tabla usuarios los ingresos acumulados
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "30"))
+
+
+class LastLoginTracker:
+    """
+    Registra los ingresos de los usuarios sin escribir en la base en cada petición.
+    El último ingreso de cada usuario se mantiene en memoria (se lee de la tabla
+    usuarios solo la primera vez que se le ve en este proceso) y los ingresos nuevos
+    se acumulan y se guardan juntos en un solo upsert cada LAST_LOGIN_FLUSH_SECONDS
+    y al apagar el servicio.
+    """
+
+    def __init__(self, flush_seconds: float = LAST_LOGIN_FLUSH_SECONDS, session_factory=AsyncSessionLocal):
+        self.flush_seconds = flush_seconds
+        self.session_factory = session_factory
+        self._last_login: Dict[str, Optional[datetime]] = {}
+        self._pending: Dict[str, Tuple[str, datetime]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(self, repo: AsyncOperationRepository, email: str, name: str) -> Optional[datetime]:
+        """
+        Anota el ingreso actual del usuario y devuelve el anterior (None si es el primero).
+        """
+        with self._lock:
+            known = email in self._last_login
+            previous = self._last_login.get(email)
+        if not known:
+            previous = await repo.get_last_login(email)
+
+        now = datetime.now()
+        with self._lock:
+            # Si otra petición del mismo usuario se adelantó, su ingreso es el anterior
+            previous = self._last_login.get(email, previous)
+            self._last_login[email] = now
+            self._pending[email] = (name, now)
+        return previous
+
+    async def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        async with self.session_factory() as db:
+            try:
+                await AsyncOperationRepository(db).save_last_logins(pending)
+            except Exception as e:
+                await db.rollback()
+                # Se devuelven a la cola sin pisar ingresos más recientes
+                with self._lock:
+                    for email, login in pending.items():
+                        self._pending.setdefault(email, login)
+                print(f"ADVERTENCIA: No se pudieron guardar {len(pending)} ingresos de usuarios. Error: {e}")
+                return 0
+        return len(pending)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        flushed = await self.flush()
+        print(f"--- 👤 {flushed} ingresos de usuarios guardados al apagar ---")
+
+
+last_login_tracker = LastLoginTracker()
@@ -1,37 +1,79 @@
 import json
 import os
+import sys
+import hmac
+import uuid
 import base64
-import requests
-from typing import List, Annotated, Optional
-from collections import defaultdict
+import asyncio
+import functools
+from contextlib import asynccontextmanager, suppress
+from typing import List, Annotated, Literal, Optional
 from dotenv import load_dotenv
-from datetime import datetime
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
+from datetime import date, datetime
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from google.cloud import storage
-from database import get_db, engine
-from repository import OperationRepository
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from database import get_db, close_engines
+from repository import AsyncOperationRepository, ADMIN_EMAIL
 import models
-import firebase_admin
-from firebase_admin import credentials, auth
-
-try:
-    cred = credentials.ApplicationDefault()
-    firebase_admin.initialize_app(cred)
-    print("Firebase Admin SDK inicializado correctamente.")
-except Exception as e:
-    print(f"ERROR: No se pudo inicializar Firebase Admin SDK: {e}")
-
-models.Base.metadata.create_all(bind=engine)
+import manage
+import db_metrics
+import http_client
+import resilience
+import tracing
+import gcs_uploader
+import jobs
+import event_pipeline
+import pipeline
+import publisher_utils
+import stage_journal
+from xml_index import XmlContentIndex
+from token_cache import AuthenticatedUser, get_current_user, token_cache, verify_pubsub_push
+from last_login import last_login_tracker
 
 # Cargar variables de entorno
 load_dotenv()
 
+# El esquema se gestiona con `python manage.py init-db` al desplegar. Solo para
+# desarrollo local se puede crear al arrancar con DB_CREATE_SCHEMA_ON_STARTUP=true.
+DB_CREATE_SCHEMA_ON_STARTUP = os.getenv("DB_CREATE_SCHEMA_ON_STARTUP", "false").lower() == "true"
+
+
+# Identifica el envío en la bitácora de etapas, para reanudarlo si falla a medias
+SUBMISSION_ID_HEADER = "X-Submission-ID"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Al arrancar solo se inician los workers en memoria. La base de datos, GCS y
+    # Firebase se conectan con la primera petición que los necesita.
+    if DB_CREATE_SCHEMA_ON_STARTUP:
+        await asyncio.to_thread(manage.init_db)
+    await jobs.job_runner.start()
+    if ASYNC_JOB_BACKEND == "events":
+        # Solo con este backend: el broker local crea su archivo y consulta los topics
+        events.start()
+    last_login_tracker.start()
+    resilience.deferred_calls.start()
+    yield
+    await jobs.job_runner.stop()
+    await events.stop()
+    await last_login_tracker.stop()
+    await resilience.deferred_calls.stop()
+    await http_client.close_client()
+    await close_engines()
+
+
 # --- Inicialización de FastAPI ---
 app = FastAPI(
     title="Orquestador de Operaciones Multi-Moneda",
-    description="Orquesta el procesamiento de operaciones de factoring."
+    description="Orquesta el procesamiento de operaciones de factoring.",
+    lifespan=lifespan
 )
 
 # --- Configuración de CORS ---
@@ -41,258 +83,295 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.REQUEST_ID_HEADER, SUBMISSION_ID_HEADER],
 )
 
-# --- URLs de los Microservicios ---
+# --- Trazas: X-Request-ID, spans por etapa y GET /metrics (Prometheus) ---
+tracing.install(app, "orquestador")
+
+# --- Configuración de Storage (las URLs de los microservicios viven en pipeline.py) ---
 BUCKET_NAME = os.getenv("BUCKET_NAME")
-PARSER_SERVICE_URL = os.getenv("PARSER_SERVICE_URL")
-TRELLO_SERVICE_URL = os.getenv("TRELLO_SERVICE_URL")
-GMAIL_SERVICE_URL = os.getenv("GMAIL_SERVICE_URL")
-DRIVE_SERVICE_URL = os.getenv("DRIVE_SERVICE_URL")
-CAVALI_SERVICE_URL = os.getenv("CAVALI_SERVICE_URL")
-EXCEL_SERVICE_URL = os.getenv("EXCEL_SERVICE_URL")
 
-# --- Cliente de Google Storage ---
-storage_client = storage.Client()
-bucket = storage_client.bucket(BUCKET_NAME)
+# Backend del modo asíncrono: "workers" (cola en memoria) o "events" (pipeline por topics)
+ASYNC_JOB_BACKEND = os.getenv("ASYNC_JOB_BACKEND", "workers").lower()
+
+# --- Cliente de Google Storage (se crea con la primera subida) ---
+@functools.lru_cache(maxsize=None)
+def get_bucket():
+    return storage.Client().bucket(BUCKET_NAME)
+
+events = event_pipeline.EventPipeline(get_bucket)
 
 
 @app.get("/api/operaciones", summary="Obtener operaciones por usuario")
 async def get_user_operations(
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    user: AuthenticatedUser = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200, description="Operaciones por página"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    moneda: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Falta el token de autorización")
-
-    try:
-        token = authorization.split("Bearer ")[1]
-        decoded_token = auth.verify_id_token(token)
-        user_email = decoded_token['email']
-        user_name = decoded_token.get('name', user_email.split('@')[0])
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
-
     try:
-        repo = OperationRepository(db)
-        last_login_timestamp = repo.update_and_get_last_login(user_email, user_name)
-        operaciones = repo.get_operations_by_user_email(user_email)
+        repo = AsyncOperationRepository(db)
+        last_login_timestamp = await last_login_tracker.record(repo, user.email, user.name)
+        page = await repo.get_operations_by_user_email(
+            user.email, limit=limit, cursor=cursor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta, moneda=moneda
+        )
         
         return {
             "last_login": last_login_timestamp.isoformat() if last_login_timestamp else None,
-            "operations": operaciones
+            "operations": page["operations"],
+            "next_cursor": page["next_cursor"]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error al obtener operaciones de la base de datos: {e}")
         raise HTTPException(status_code=500, detail="Error interno al consultar las operaciones.")
 
+@app.get("/api/operaciones/resumen", summary="Totales de operaciones para el tablero")
+async def get_operations_summary(
+    user: AuthenticatedUser = Depends(get_current_user),
+    agrupar_por: Literal["ejecutivo", "cliente", "moneda", "dia"] = Query("moneda"),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        repo = AsyncOperationRepository(db)
+        return {
+            "agrupar_por": agrupar_por,
+            "totales": await repo.get_operations_summary(user.email, agrupar_por, fecha_desde, fecha_hasta)
+        }
+    except Exception as e:
+        print(f"Error al obtener el resumen de operaciones: {e}")
+        raise HTTPException(status_code=500, detail="Error interno al consultar el resumen de operaciones.")
+
+async def _upload_submission(
+    submission: pipeline.Submission, pdf_files: List[UploadFile], respaldo_files: List[UploadFile],
+    journal: stage_journal.DbStageJournal = None
+):
+    """
+    Sube a GCS los archivos del envío, completa sus rutas y, si hay bitácora, la abre
+    (solo entonces el envío se puede reanudar, porque sus XML ya están en el bucket).
+    """
+    xml_index = submission.xml_index
+    with tracing.span("gcs_upload", file_count=len(xml_index) + len(pdf_files) + len(respaldo_files)):
+        uploads = await gcs_uploader.upload_files(
+            get_bucket(), {"xml": xml_index.entries(), "pdf": pdf_files, "respaldos": respaldo_files}
+        )
+    submission.xml_paths = [u.gcs_path for u in uploads["xml"]]
+    submission.pdf_paths = [u.gcs_path for u in uploads["pdf"]]
+    submission.respaldo_paths = [u.gcs_path for u in uploads["respaldos"]]
+    if journal is not None:
+        await journal.record_submission(submission)
+
+
+async def _receive_submission(
+    db: AsyncSession, metadata: dict, xml_files: List[UploadFile], pdf_files: List[UploadFile], respaldo_files: List[UploadFile],
+    journal: stage_journal.DbStageJournal = None, upload_in_background: bool = False
+) -> pipeline.Submission:
+    """
+    Lee cada XML una sola vez en el índice de contenidos, descarta las facturas que
+    ya están registradas (y sus PDF) y sube el resto a GCS bajo su clave por contenido.
+    Con upload_in_background la subida sigue en submission.upload_task y el pipeline
+    puede empezar mientras tanto (el parser recibe los XML en la petición).
+    """
+    upload_id = f"OP-{datetime.now().strftime('%Y%m%d')}"
+    xml_index = await XmlContentIndex.from_upload_files(xml_files)
+
+    with tracing.span("dedupe_check", xml_count=len(xml_index)):
+        processed = await pipeline.find_processed_invoices(db, xml_index)
+    if processed["filenames"]:
+        print(f"--- ♻️  {len(processed['filenames'])} facturas ya registradas; se omiten: {processed['filenames']} ---")
+        xml_index.discard(processed["filenames"])
+        duplicate_stems = {os.path.splitext(name)[0] for name in processed["filenames"]}
+        pdf_files = [f for f in pdf_files if os.path.splitext(f.filename)[0] not in duplicate_stems]
+
+    submission = pipeline.Submission(
+        upload_id=upload_id, metadata=metadata, xml_paths=[], pdf_paths=[], respaldo_paths=[],
+        xml_index=xml_index, existing_operations=processed["operations"],
+    )
+    if not len(xml_index):
+        return submission
+
+    upload = _upload_submission(submission, pdf_files, respaldo_files, journal)
+    if upload_in_background:
+        submission.upload_task = asyncio.create_task(upload)
+    else:
+        await upload
+    return submission
+
+
 @app.post("/submit-operation", summary="Registrar y Procesar Operación")
 async def submit_multi_currency_operation(
     metadata_str: Annotated[str, Form(alias="metadata")],
     xml_files: Annotated[List[UploadFile], File(alias="xml_files")],
     pdf_files: Annotated[List[UploadFile], File(alias="pdf_files")],
     respaldo_files: Annotated[List[UploadFile], File(alias="respaldo_files")],
-    db: Session = Depends(get_db)
+    async_job: bool = Query(False, description="Si es true, responde 202 con un job_id y procesa en segundo plano."),
+    db: AsyncSession = Depends(get_db)
 ):
+    # En modo síncrono la bitácora identifica el envío para reanudarlo si falla a medias
+    journal = None if async_job else stage_journal.DbStageJournal(uuid.uuid4().hex)
     try:
         metadata = json.loads(metadata_str)
-        upload_id = f"OP-{datetime.now().strftime('%Y%m%d')}"
-        # --- 1. Subir archivos a GCS ---
-        def upload_file(file: UploadFile, folder: str) -> str:
-            blob_path = f"{upload_id}/{folder}/{file.filename}"
-            blob = bucket.blob(blob_path)
-            file.file.seek(0)
-            blob.upload_from_file(file.file)
-            return f"gs://{BUCKET_NAME}/{blob_path}"
-
-        xml_paths = [upload_file(f, "xml") for f in xml_files]
-        pdf_paths = [upload_file(f, "pdf") for f in pdf_files]
-        respaldo_paths = [upload_file(f, "respaldos") for f in respaldo_files]
-        all_gcs_paths = xml_paths + pdf_paths + respaldo_paths
-
-        # --- 2. Parsear XMLs ---
-        parser_payload = {"operation_id": upload_id, "xml_paths": xml_paths}
-        print("--- 📝 Enviando XMLs al servicio de Parser ---")
-        parser_response = requests.post(PARSER_SERVICE_URL, json=parser_payload)
-        parser_response.raise_for_status()
-        parsed_results = parser_response.json().get("results", [])
-
-        invoices_data_with_filename = []
-        for res in parsed_results:
-            if res.get('status') == 'SUCCESS':
-                data = res['parsed_invoice_data']
-                data['xml_filename'] = os.path.basename(res['xml_path'])
-                invoices_data_with_filename.append(data)
-
-        if not invoices_data_with_filename:
-            raise HTTPException(status_code=400, detail="No se pudo parsear ninguna factura válida.")
-
-        # --- 3. Actualizar y Consultar EXCEL por cada deudor ---
-        print("--- 📊 Actualizando y consultando contactos en Google Sheets ---")
-        invoices_by_debtor_ruc = defaultdict(list)
-        for inv in invoices_data_with_filename:
-            invoices_by_debtor_ruc[inv['debtor_ruc']].append(inv)
-
-        correos_finales_por_ruc = {}
-
-        for ruc, invoices in invoices_by_debtor_ruc.items():
-            nombre_deudor = invoices[0]['debtor_name']
-            correo_de_la_operacion = metadata.get('mailVerificacion', '').strip()
-
-            excel_update_payload = {"ruc": ruc, "correo": correo_de_la_operacion, "nombre_deudor": nombre_deudor}
-            try:
-                requests.post(EXCEL_SERVICE_URL, json=excel_update_payload).raise_for_status()
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Alerta: No se pudo actualizar el contacto para RUC {ruc}. Error: {e}")
-
-            correos_del_excel = ""
-            try:
-                # Construye la URL para obtener correos, quitando la parte '/update-contact'
-                base_excel_url = EXCEL_SERVICE_URL.replace('/update-contact', '')
-                get_emails_url = f"{base_excel_url}/get-emails/{ruc}"
-                emails_response = requests.get(get_emails_url)
-                if emails_response.status_code == 200:
-                    correos_del_excel = emails_response.json().get("emails", "")
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Alerta: No se pudieron obtener los correos para RUC {ruc}. Error: {e}")
-
-            # Lógica para construir la lista final de correos
-            lista_final = set(c.strip() for c in correos_del_excel.split(';') if c.strip())
-            if correo_de_la_operacion:
-                lista_final.add(correo_de_la_operacion)
-            
-            correos_finales_por_ruc[ruc] = ";".join(sorted(list(lista_final)))
-            print(f"Lista de correos final para {ruc}: {correos_finales_por_ruc[ruc]}")
-
-        # --- 4. Agrupar facturas por moneda ---
-        invoices_by_currency = defaultdict(list)
-        for inv in invoices_data_with_filename:
-            invoices_by_currency[inv['currency']].append(inv)
-
-        repo = OperationRepository(db)
-        created_operations = []
-
-        # --- 5. Procesar cada grupo de moneda como una operación independiente ---
-        for currency, invoices_in_group in invoices_by_currency.items():
-            print(f"--- ⚙️  Procesando Lote para Moneda: {currency} ---")
-            
-            # 5.1. Validar en CAVALI
-            xml_filenames_in_group = {inv['xml_filename'] for inv in invoices_in_group}
-            xml_files_b64_group = []
-            for xml_file in xml_files:
-                await xml_file.seek(0)
-                if xml_file.filename in xml_filenames_in_group:
-                    content_bytes = await xml_file.read()
-                    xml_files_b64_group.append({
-                        "filename": xml_file.filename,
-                        "content_base64": base64.b64encode(content_bytes).decode('utf-8')
-                    })
-            
-            print("--- 📄 Enviando XMLs al servicio de CAVALI para validación ---")
-            cavali_results_json = {}
-            try:
-                cavali_response = requests.post(CAVALI_SERVICE_URL, json={"xml_files_data": xml_files_b64_group})
-                cavali_response.raise_for_status()
-                cavali_results_json = cavali_response.json().get("results", {})
-                print("--- ✅ Validación en CAVALI completada ---")
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Alerta: Falló la comunicación con el servicio de CAVALI. Error: {e}")
-            print(f"------------------Resultados de CAVALI: {cavali_results_json}")
-            # 5.2. Generar ID y Archivar en Drive
-            operation_id = repo.generar_siguiente_id_operacion()
-            drive_response = requests.post(DRIVE_SERVICE_URL, json={"operation_id": operation_id, "gcs_file_paths": all_gcs_paths})
-            drive_response.raise_for_status()
-            drive_folder_url = drive_response.json().get("drive_folder_url")
-            print("--- 📂 Archivos archivados en Google Drive ---")
-
-            # 5.3. Guardar operación en la BD
-            repo.save_full_operation(
-                operation_id, 
-                metadata, 
-                drive_folder_url, 
-                invoices_in_group,
-                cavali_results_json
-            )
-
-            created_operations.append({
-                "operation_id": operation_id, "currency": currency,
-                "drive_url": drive_folder_url, "invoice_count": len(invoices_in_group)
+        # --- 1. Subir archivos a GCS (en paralelo). En modo síncrono, con los XML
+        # en la petición al parser, la subida corre mientras avanzan las etapas ---
+        upload_started = datetime.now()
+        submission = await _receive_submission(
+            db, metadata, xml_files, pdf_files, respaldo_files,
+            journal=journal, upload_in_background=not async_job and pipeline.PARSER_INLINE_XML,
+        )
+
+        if not len(submission.xml_index):
+            # Todas las facturas ya estaban registradas: se devuelven sus operaciones sin reprocesar
+            return {
+                "message": "Las facturas del envío ya fueron procesadas.",
+                "operations": submission.existing_operations,
+                "duplicate": True,
+            }
+
+        if async_job:
+            # --- Modo asíncrono: se guarda el envío y se procesa con los workers ---
+            job = await jobs.create_job(db, submission, etapas={"gcs_upload": {
+                "estado": jobs.ESTADO_COMPLETADO,
+                "inicio": upload_started.isoformat(),
+                "fin": datetime.now().isoformat(),
+                "duracion_s": round((datetime.now() - upload_started).total_seconds(), 3),
+            }})
+            await stage_journal.start(job.id, submission)
+            if ASYNC_JOB_BACKEND == "events":
+                await events.submit(submission, job_id=job.id)
+            else:
+                jobs.job_runner.enqueue(job.id, submission)
+            return JSONResponse(status_code=202, content={
+                "message": "Operación recibida. Se procesará en segundo plano.",
+                "job_id": job.id,
+                "status_url": f"/api/operaciones/jobs/{job.id}",
+                "existing_operations": submission.existing_operations,
             })
-            
-            # 5.4. Enviar notificaciones
-            parser_results_for_group = [res for res in parsed_results if os.path.basename(res.get('xml_path', '')) in xml_filenames_in_group]
-            
-            # Lógica para GMAIL
-            try:
-                ruc_deudor_grupo = invoices_in_group[0]['debtor_ruc']
-                destinatarios_para_enviar = correos_finales_por_ruc.get(ruc_deudor_grupo)
-                
-                user_email = metadata.get('user_email', None)
-
-                if destinatarios_para_enviar:
-                    gmail_payload = {
-                        "parsed_invoice_data": {"results": parser_results_for_group},
-                        "pdf_paths": pdf_paths,
-                        "recipient_emails": destinatarios_para_enviar,
-                        "user_email": user_email
-                    }
-                    requests.post(GMAIL_SERVICE_URL, json=gmail_payload).raise_for_status()
-                    print(f"--- ✉️  Notificación por Gmail enviada para op {operation_id}. ---")
-                else:
-                    print(f"ADVERTENCIA: No se enviarán correos para op {operation_id} porque no se encontraron correos para RUC {ruc_deudor_grupo}.")
-            except Exception as e:
-                print(f"ADVERTENCIA: Falló el envío de GMAIL para op {operation_id}. Error: {e}")
-
-            cuentas_desembolso_data = metadata.get('cuentasDesembolso', [])
-            cuenta_principal = cuentas_desembolso_data[0] if cuentas_desembolso_data else {}
-            ## Lógica para Trello
-            desembolso_banco = cuenta_principal.get('banco'),
-            desembolso_tipo = cuenta_principal.get('tipo'),
-            desembolso_moneda = cuenta_principal.get('moneda'),
-            desembolso_numero = cuenta_principal.get('numero')
-            solicitudAdelanto_obj = metadata.get('solicitudAdelanto', {})
-            porcentajeAdelanto = solicitudAdelanto_obj.get('porcentaje', 0)
-            
-            # Lógica para TRELLO
-            try:
-                trello_payload = {
-                    "operation_id": operation_id,
-                    "client_name": invoices_in_group[0].get('client_name'),
-                    "tasa": metadata.get('tasaOperacion', 'N/A'),
-                    "comision": metadata.get('comision', 'N/A'),
-                    "drive_folder_url": drive_folder_url,
-                    "invoices": invoices_in_group,
-                    "attachment_paths": pdf_paths + respaldo_paths,
-                    "cavali_results": cavali_results_json,
-                    "user_email": user_email,
-                    "porcentajeAdelanto": porcentajeAdelanto,
-                    "desembolso_numero": desembolso_numero,
-                    "desembolso_moneda": desembolso_moneda,
-                    "desembolso_tipo": desembolso_tipo,
-                    "desembolso_banco": desembolso_banco
-                }
-                requests.post(TRELLO_SERVICE_URL, json=trello_payload)
-                print(f"--- 🚀 Notificación a Trello enviada para op {operation_id}. ---")
-            except Exception as e:
-                print(f"ADVERTENCIA: Falló la creación en Trello para op {operation_id}. Error: {e}")
-
-            print(f"--- ✅ Operación {operation_id} para {currency} finalizada con éxito. ---")
 
+        # --- 2 a 6. Parser, Excel, CAVALI, Drive, BD y notificaciones ---
+        try:
+            result = await pipeline.run_submission(db, submission, journal=journal)
+        finally:
+            # Aunque una etapa falle, la subida termina y abre la bitácora del envío
+            with suppress(Exception):
+                await submission.wait_for_upload()
+        return JSONResponse(
+            content={**result, "submission_id": journal.envio_id}, headers={SUBMISSION_ID_HEADER: journal.envio_id}
+        )
 
-        return {
-            "message": f"Proceso finalizado. Se crearon {len(created_operations)} operaciones.",
-            "operations": created_operations
-        }
+    except Exception as e:
+        error = pipeline.to_http_exception(e)
+        if journal is not None and journal.submission_data is not None:
+            error.headers = {**(error.headers or {}), SUBMISSION_ID_HEADER: journal.envio_id}
+        raise error
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(
-            status_code=503,
-            detail=f"Error de comunicación con un servicio interno: {e.response.text if e.response else str(e)}"
-        )
+
+@app.get("/api/operaciones/envios/interrumpidos", summary="Envíos que fallaron o quedaron a medias")
+async def get_interrupted_submissions(
+    user: AuthenticatedUser = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    email = None if user.email == ADMIN_EMAIL else user.email
+    return {"submissions": await stage_journal.list_interrupted(db, email=email, limit=limit)}
+
+
+@app.post("/api/operaciones/envios/{envio_id}/reanudar", summary="Reanudar un envío desde su primera etapa pendiente")
+async def resume_submission(
+    envio_id: str,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    journal = await stage_journal.DbStageJournal.load(db, envio_id)
+    owner = journal.summary()["user_email"]
+    if journal.submission_data is None or (user.email != ADMIN_EMAIL and owner != user.email):
+        raise HTTPException(status_code=404, detail=f"No se encontró el envío '{envio_id}'.")
+
+    # Si el envío era un trabajo asíncrono, su estado se actualiza con el resultado
+    job = await db.get(models.TrabajoOperacion, envio_id)
+    try:
+        result = await stage_journal.resume(db, journal, get_bucket())
+    except Exception as e:
+        error = pipeline.to_http_exception(e)
+        if job is not None and error.status_code != 409:
+            await db.rollback()
+            await jobs.fail_job(db, envio_id, str(error.detail))
+        raise error
+    if job is not None:
+        await jobs.complete_job(db, envio_id, result)
+    return {**result, "submission_id": envio_id}
+
+
+@app.get("/api/operaciones/jobs/{job_id}", summary="Consultar el estado de una operación asíncrona")
+async def get_job_status(
+    job_id: str,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await db.get(models.TrabajoOperacion, job_id)
+    # Un trabajo de otro usuario se responde igual que uno inexistente
+    if not job or (user.email != ADMIN_EMAIL and job.email_usuario != user.email):
+        raise HTTPException(status_code=404, detail=f"No se encontró el trabajo '{job_id}'.")
+    return jobs.job_to_dict(job)
+
+
+def verify_event_sender(
+    authorization: Optional[str] = Header(None),
+    x_broker_token: Optional[str] = Header(None),
+):
+    """
+    Solo Pub/Sub (token OIDC de la suscripción) o, en modo http, este mismo proceso
+    (LOCAL_BROKER_TOKEN) pueden publicar en el pipeline por eventos.
+    """
+    if publisher_utils.BROKER_MODE == "pubsub":
+        verify_pubsub_push(authorization)
+    elif not hmac.compare_digest(x_broker_token or "", publisher_utils.LOCAL_BROKER_TOKEN):
+        raise HTTPException(status_code=401, detail="Mensaje del broker sin token válido")
+
+
+async def receive_event(topic: str, request: Request):
+    """
+    Endpoint de push de Pub/Sub. Responder 2xx confirma el mensaje; un 5xx hace que
+    Pub/Sub lo reintente.
+    """
+    body = await request.json()
+    message = body.get("message")
+    payload = json.loads(base64.b64decode(message["data"])) if message else body
+    try:
+        await events.handle(topic, payload)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Topic desconocido: {topic}")
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error inesperado en la orquestación: {str(e)}"
-        )
\ No newline at end of file
+        print(f"ERROR: Falló la etapa de {topic}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error procesando {topic}: {e}")
+    return {"status": "ACK"}
+
+
+# Solo con el backend por eventos. Con el broker local (sqlite/memory) los mensajes
+# no llegan por HTTP y la ruta tampoco existe
+if ASYNC_JOB_BACKEND == "events" and publisher_utils.receives_push():
+    app.add_api_route(
+        "/events/{topic}", receive_event, methods=["POST"], dependencies=[Depends(verify_event_sender)],
+        summary="Recibir un mensaje del pipeline por eventos (push de Pub/Sub)",
+    )
+
+
+@app.get("/metrics/token-cache", summary="Aciertos y fallos del caché de tokens de Firebase")
+async def get_token_cache_metrics():
+    return token_cache.stats()
+
+
+@app.get("/metrics/db", summary="Pool de conexiones y latencia de consultas")
+async def get_db_metrics():
+    return db_metrics.snapshot()
+
+
+@app.get("/metrics/downstream", summary="Circuit breakers, reintentos y notificaciones postergadas por servicio")
+async def get_downstream_metrics():
+    return resilience.snapshot()
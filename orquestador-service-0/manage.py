@@ -0,0 +1,79 @@
+# orquestador-service-0/manage.py
+"""
+Tareas de mantenimiento de la base de datos del orquestador.
+
+    python manage.py init-db           # crea las tablas e índices que falten
+    python manage.py rebuild-summary   # recalcula resumen_operaciones desde operaciones/facturas
+    python manage.py check-summary     # compara el resumen con las tablas originales
+"""
+import sys
+import argparse
+
+from database import SessionLocal, get_engine
+from repository import OperationRepository
+import models
+
+
+def init_db() -> int:
+    """
+    Crea las tablas e índices que falten. Se ejecuta al desplegar, no al importar
+    ni al arrancar el servicio.
+    """
+    engine = get_engine()
+    models.Base.metadata.create_all(bind=engine)
+    models.ensure_columns(engine)
+    # El índice único de facturas necesita emisor_ruc completo antes de crearse
+    completadas = models.backfill_emisor_ruc(engine)
+    if completadas:
+        print(f"--- facturas.emisor_ruc completado en {completadas} filas ---")
+    completadas = models.backfill_email_envios(engine)
+    if completadas:
+        print(f"--- etapas_envio.email_usuario completado en {completadas} envíos ---")
+    models.ensure_indexes(engine)
+    print("--- ✅ Esquema de la base de datos actualizado ---")
+    return 0
+
+
+def rebuild_summary(repo: OperationRepository) -> int:
+    filas = repo.rebuild_operations_summary()
+    print(f"--- ✅ Resumen de operaciones reconstruido: {filas} filas ---")
+    return 0
+
+
+def check_summary(repo: OperationRepository) -> int:
+    differences = repo.check_operations_summary()
+    if not differences:
+        print("--- ✅ El resumen de operaciones coincide con las tablas originales ---")
+        return 0
+    for d in differences:
+        print(
+            f"DIFERENCIA {d['fecha']} {d['email_usuario']} {d['cliente_ruc']} {d['moneda']}: "
+            f"esperado={d['esperado']} resumen={d['resumen']}"
+        )
+    print(f"ERROR: {len(differences)} filas del resumen no coinciden. Ejecute 'python manage.py rebuild-summary'.")
+    return 1
+
+
+# Comandos que trabajan sobre el repositorio de operaciones
+COMMANDS = {
+    "rebuild-summary": rebuild_summary,
+    "check-summary": check_summary,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["init-db", *sorted(COMMANDS)])
+    args = parser.parse_args(argv)
+
+    if args.command == "init-db":
+        return init_db()
+    db = SessionLocal()
+    try:
+        return COMMANDS[args.command](OperationRepository(db))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
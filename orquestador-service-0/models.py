@@ -1,5 +1,5 @@
 # app/infrastructure/persistence/models.py
-from sqlalchemy import Column, String, Float, ForeignKey, Integer, DateTime, Text, Boolean
+from sqlalchemy import Column, String, Float, ForeignKey, Integer, Date, DateTime, Text, Boolean, JSON, Index, inspect, select, text, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -31,11 +31,19 @@ class Operacion(Base):
     
     facturas = relationship("Factura", back_populates="operacion")
 
+# Índices para listar operaciones por páginas en orden (fecha_creacion, id) descendente,
+# por usuario y para el administrador (todas las operaciones)
+Index("ix_operaciones_email_fecha", Operacion.email_usuario, Operacion.fecha_creacion.desc(), Operacion.id.desc())
+Index("ix_operaciones_fecha", Operacion.fecha_creacion.desc(), Operacion.id.desc())
+
 class Factura(Base):
     __tablename__ = "facturas"
     id = Column(Integer, primary_key=True)
     id_operacion = Column(String(255), ForeignKey("operaciones.id"), nullable=False)
     numero_documento = Column(String(255), nullable=False, index=True)
+    # RUC de quien emitió la factura (el cliente de la operación). Puede ser nulo en
+    # filas antiguas que no se pudieron completar con backfill_emisor_ruc
+    emisor_ruc = Column(String(15), nullable=True)
     deudor_ruc = Column(String(15), ForeignKey("empresas.ruc"), nullable=False)
     fecha_emision = Column(DateTime(timezone=True))
     fecha_vencimiento = Column(DateTime(timezone=True))
@@ -47,11 +55,157 @@ class Factura(Base):
     
     operacion = relationship("Operacion", back_populates="facturas")
     deudor = relationship("Empresa")
-    
+
+# Una factura (emisor + número) solo se registra una vez: un reenvío devuelve la operación existente
+UQ_FACTURAS_EMISOR_DOCUMENTO = "uq_facturas_emisor_documento"
+Index(UQ_FACTURAS_EMISOR_DOCUMENTO, Factura.emisor_ruc, Factura.numero_documento, unique=True)
+
 
 class Usuario(Base):
     __tablename__ = "usuarios"
     email = Column(String(255), primary_key=True, index=True)
     nombre = Column(String(255))
     # Esta columna guardará la fecha del último ingreso
-    ultimo_ingreso = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    ultimo_ingreso = Column(DateTime(timezone=True), server_default=func.now())
+
+class TrabajoOperacion(Base):
+    """
+    Envío recibido en modo asíncrono. Guarda el avance de cada etapa del pipeline
+    para poder consultarlo desde GET /api/operaciones/jobs/{id}.
+    """
+    __tablename__ = "trabajos_operacion"
+    id = Column(String(64), primary_key=True)
+    estado = Column(String(20), nullable=False, default="PENDIENTE")
+    etapa_actual = Column(String(50), nullable=True)
+    # {"parse": {"estado": "COMPLETADO", "inicio": "...", "fin": "...", "duracion_s": 1.2}, ...}
+    etapas = Column(JSON, default=dict)
+    email_usuario = Column(String(255), index=True)
+    metadata_envio = Column(JSON)
+    archivos = Column(JSON)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class EtapaEnvio(Base):
+    """
+    Bitácora de un envío: qué etapas del pipeline terminaron y con qué salida
+    (resultados del parser, IDs de operación, URLs de Drive, ...). Al reanudar un
+    envío fallido se reutilizan esas salidas y solo se ejecutan las etapas pendientes.
+    """
+    __tablename__ = "etapas_envio"
+    id_envio = Column(String(64), primary_key=True)
+    etapa = Column(String(80), primary_key=True)
+    estado = Column(String(20), nullable=False)
+    salida = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Solo en la fila de recepción del envío, para listar los envíos de un usuario
+    email_usuario = Column(String(255), nullable=True)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Para listar los envíos que quedaron a medias sin recorrer toda la bitácora
+Index("ix_etapas_envio_etapa_estado", EtapaEnvio.etapa, EtapaEnvio.estado)
+Index("ix_etapas_envio_etapa_email", EtapaEnvio.etapa, EtapaEnvio.email_usuario)
+
+
+class SecuenciaOperacion(Base):
+    """
+    Último correlativo de ID de operación asignado en cada día (OP-YYYYMMDD-NNN).
+    Se incrementa de forma atómica para no depender de MAX(id).
+    """
+    __tablename__ = "secuencias_operacion"
+    fecha = Column(String(8), primary_key=True)
+    ultimo_numero = Column(Integer, nullable=False, default=0)
+
+
+class ResumenOperacion(Base):
+    """
+    Totales de operaciones por día, ejecutivo, cliente y moneda. save_full_operation
+    los actualiza en la misma transacción en que guarda la operación, de modo que
+    los tableros no tienen que recorrer operaciones/facturas.
+    """
+    __tablename__ = "resumen_operaciones"
+    fecha = Column(Date, primary_key=True)
+    email_usuario = Column(String(255), primary_key=True)
+    cliente_ruc = Column(String(15), primary_key=True)
+    moneda = Column(String(10), primary_key=True)
+    cantidad_operaciones = Column(Integer, nullable=False, default=0)
+    cantidad_facturas = Column(Integer, nullable=False, default=0)
+    monto_total = Column(Float, nullable=False, default=0)
+
+
+def ensure_columns(bind):
+    """
+    Agrega las columnas nulables declaradas que falten en tablas ya existentes,
+    ya que create_all no modifica tablas creadas antes.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"--- Columna {table.name}.{column.name} agregada ---")
+
+
+def backfill_emisor_ruc(bind) -> int:
+    """
+    Completa facturas.emisor_ruc con el RUC del cliente de su operación. Si una
+    factura se registró más de una vez, solo la primera recibe el RUC para no
+    violar el índice único; las demás quedan en nulo.
+    """
+    with bind.begin() as conn:
+        result = conn.execute(text("""
+            UPDATE facturas SET emisor_ruc = (
+                SELECT o.cliente_ruc FROM operaciones o WHERE o.id = facturas.id_operacion
+            )
+            WHERE emisor_ruc IS NULL AND id IN (
+                SELECT MIN(f.id) FROM facturas f
+                JOIN operaciones o ON o.id = f.id_operacion
+                GROUP BY o.cliente_ruc, f.numero_documento
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM facturas otra
+                JOIN operaciones o2 ON o2.id = facturas.id_operacion
+                WHERE otra.emisor_ruc = o2.cliente_ruc AND otra.numero_documento = facturas.numero_documento
+            )
+        """))
+        return result.rowcount
+
+
+def backfill_email_envios(bind) -> int:
+    """
+    Completa etapas_envio.email_usuario en las filas de recepción guardadas antes de
+    la columna, con el user_email de la metadata del envío.
+    """
+    with bind.begin() as conn:
+        rows = conn.execute(
+            select(EtapaEnvio.id_envio, EtapaEnvio.salida)
+            .where(EtapaEnvio.etapa == "upload", EtapaEnvio.email_usuario.is_(None))
+        ).all()
+        completadas = 0
+        for id_envio, salida in rows:
+            email = ((salida or {}).get("metadata") or {}).get("user_email")
+            if email:
+                conn.execute(
+                    update(EtapaEnvio)
+                    .where(EtapaEnvio.id_envio == id_envio, EtapaEnvio.etapa == "upload")
+                    .values(email_usuario=email)
+                )
+                completadas += 1
+        return completadas
+
+
+def ensure_indexes(bind):
+    """
+    Crea los índices declarados que falten en tablas ya existentes, ya que
+    create_all solo los crea junto con tablas nuevas.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
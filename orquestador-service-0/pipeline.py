@@ -0,0 +1,808 @@
+# orquestador-service-0/pipeline.py
+import os
+import json
+import asyncio
+import contextlib
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import http_client
+import resilience
+import tracing
+from repository import AsyncOperationRepository, is_duplicate_invoice_error
+from xml_index import XmlContentIndex
+
+load_dotenv()
+
+# --- URLs de los Microservicios ---
+PARSER_SERVICE_URL = os.getenv("PARSER_SERVICE_URL")
+TRELLO_SERVICE_URL = os.getenv("TRELLO_SERVICE_URL")
+GMAIL_SERVICE_URL = os.getenv("GMAIL_SERVICE_URL")
+DRIVE_SERVICE_URL = os.getenv("DRIVE_SERVICE_URL")
+CAVALI_SERVICE_URL = os.getenv("CAVALI_SERVICE_URL")
+EXCEL_SERVICE_URL = os.getenv("EXCEL_SERVICE_URL")
+
+# --- Timeouts por servicio (segundos) ---
+# CAVALI espera al menos 7 s entre el bloqueo y la consulta de estado.
+PARSER_TIMEOUT = float(os.getenv("PARSER_TIMEOUT_SECONDS", "120"))
+EXCEL_TIMEOUT = float(os.getenv("EXCEL_TIMEOUT_SECONDS", "20"))
+CAVALI_TIMEOUT = float(os.getenv("CAVALI_TIMEOUT_SECONDS", "150"))
+DRIVE_TIMEOUT = float(os.getenv("DRIVE_TIMEOUT_SECONDS", "300"))
+GMAIL_TIMEOUT = float(os.getenv("GMAIL_TIMEOUT_SECONDS", "120"))
+TRELLO_TIMEOUT = float(os.getenv("TRELLO_TIMEOUT_SECONDS", "120"))
+
+# Envía al parser el contenido de los XML (multipart) en lugar de sus rutas en GCS,
+# así el parser no los vuelve a descargar y la subida no tiene que terminar antes
+PARSER_INLINE_XML = os.getenv("PARSER_INLINE_XML", "true").lower() == "true"
+# Pide al parser los resultados en NDJSON, uno por XML apenas se parsea, y agrupa las
+# facturas a medida que llegan en lugar de esperar la respuesta completa
+PARSER_STREAM_RESULTS = os.getenv("PARSER_STREAM_RESULTS", "true").lower() == "true"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# --- Estados de una notificación ---
+NOTIFICATION_CHANNELS = ("gmail", "trello")
+NOTIFICACION_ENVIADA = "ENVIADA"
+# El circuito del servicio estaba abierto: se reenviará sola cuando se recupere
+NOTIFICACION_POSTERGADA = "POSTERGADA"
+# No había destinatarios
+NOTIFICACION_OMITIDA = "OMITIDA"
+NOTIFICACION_ERROR = "ERROR"
+
+# Otra operación ya registró alguna factura del envío (restricción única de facturas)
+DUPLICATE_INVOICES_DETAIL = "Algunas facturas del envío ya fueron registradas en otra operación."
+
+
+@dataclass
+class Submission:
+    """
+    Envío ya recibido y guardado en GCS (o subiéndose en upload_task), listo para procesarse.
+    """
+    upload_id: str
+    metadata: dict
+    xml_paths: List[str]
+    pdf_paths: List[str]
+    respaldo_paths: List[str]
+    # Contenido de cada XML, leído una sola vez al recibirlo
+    xml_index: XmlContentIndex = field(default_factory=XmlContentIndex)
+    # Operaciones que ya tenían registradas algunas facturas del envío (reenvíos)
+    existing_operations: List[Dict[str, Any]] = field(default_factory=list)
+    # Subida a GCS en curso; completa las rutas de los archivos al terminar
+    upload_task: Optional["asyncio.Task"] = None
+
+    async def wait_for_upload(self):
+        if self.upload_task is not None:
+            await self.upload_task
+
+    @property
+    def all_gcs_paths(self) -> List[str]:
+        return self.xml_paths + self.pdf_paths + self.respaldo_paths
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Datos del envío que se pueden guardar o publicar; Submission(**d) lo reconstruye sin el índice de XML."""
+        return {
+            "upload_id": self.upload_id,
+            "metadata": self.metadata,
+            "xml_paths": self.xml_paths,
+            "pdf_paths": self.pdf_paths,
+            "respaldo_paths": self.respaldo_paths,
+        }
+
+
+class StageTracker:
+    """
+    Registra el avance de cada etapa del pipeline. Esta implementación no guarda
+    nada; el modo de trabajos en segundo plano usa una que persiste en la BD.
+    """
+
+    @contextlib.asynccontextmanager
+    async def stage(self, name: str):
+        yield
+
+
+# Etapas de la bitácora que abren y cierran un envío: los datos recibidos y la respuesta final
+ETAPA_RECEPCION = "upload"
+ETAPA_RESULTADO = "result"
+
+
+class StageJournal:
+    """
+    Bitácora de las etapas terminadas de un envío y de su salida, para reanudarlo
+    sin repetir lo que ya se hizo. Esta implementación no guarda nada y cada
+    ejecución hace todas las etapas; stage_journal.py guarda la bitácora en la BD.
+    """
+    envio_id: Optional[str] = None
+
+    def completed(self, name: str) -> Optional[Dict[str, Any]]:
+        """Salida de la etapa si ya terminó en un intento anterior."""
+        return None
+
+    async def record(self, name: str, output: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        pass
+
+    async def record_deferred(self, name: str, output: Dict[str, Any]):
+        """Anota una etapa que quedó postergada: no cuenta como completada."""
+        pass
+
+    async def record_failure(self, error: str):
+        """Cierra el envío como fallido: reanudarlo no cambiaría el resultado."""
+        pass
+
+    async def claim(self) -> bool:
+        """Reserva el envío para esta ejecución; False si otra ya lo está procesando."""
+        return True
+
+    async def release(self):
+        pass
+
+
+async def run_stage(journal: StageJournal, name: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Ejecuta una etapa y anota su salida (un dict serializable a JSON), o devuelve
+    la salida anotada si la etapa ya terminó en un intento anterior del envío.
+    """
+    output = journal.completed(name)
+    if output is not None:
+        print(f"--- ⏭️  Etapa '{name}' ya completada en un intento anterior; se reutiliza su resultado ---")
+        return output
+    try:
+        output = await run()
+    except Exception as e:
+        await journal.record(name, error=str(e) or e.__class__.__name__)
+        raise
+    await journal.record(name, output)
+    return output
+
+
+# --- Parser ---
+def _parser_request(upload_id: str, xml_paths: List[str], xml_index: XmlContentIndex = None) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Cuerpo de la petición al parser: con PARSER_INLINE_XML y el índice de contenidos,
+    los archivos en multipart; si no, sus rutas en GCS.
+    """
+    if PARSER_INLINE_XML and xml_index is not None and len(xml_index) > 0:
+        return True, {
+            "data": {"operation_id": upload_id},
+            "files": [("xml_files", (e.filename, e.content, e.content_type)) for e in xml_index.entries()],
+        }
+    return False, {"json": {"operation_id": upload_id, "xml_paths": xml_paths}}
+
+
+async def iter_parse_results(upload_id: str, xml_paths: List[str],
+                             xml_index: XmlContentIndex = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Pide al parser la respuesta en NDJSON y entrega cada resultado apenas llega, en
+    orden de llegada (xml_index indica a qué XML corresponde). Si el parser no
+    responde en stream se entregan los resultados de la respuesta completa.
+
+    Si la respuesta se corta antes de la línea de resumen, lanza
+    httpx.RemoteProtocolError. Quien deje de leer antes del final debe cerrarlo
+    (contextlib.aclosing) para liberar la conexión.
+    """
+    inline, request_kwargs = _parser_request(upload_id, xml_paths, xml_index)
+    summary, received = None, 0
+    with tracing.span("parse", xml_count=len(xml_index) if inline else len(xml_paths), inline=inline, stream=True) as current:
+        async with http_client.stream(
+            "POST", PARSER_SERVICE_URL, headers={"Accept": NDJSON_MEDIA_TYPE},
+            timeout=PARSER_TIMEOUT, service="parser", idempotent=True, **request_kwargs,
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            if not response.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+                # Parser sin modo stream: la respuesta es el JSON con todos los resultados
+                await response.aread()
+                for result in response.json().get("results", []):
+                    yield result
+                return
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if message.pop("type", "result") == "summary":
+                    summary = message
+                    break
+                received += 1
+                yield message
+        current.attributes["results"] = received
+    if summary is None:
+        raise httpx.RemoteProtocolError(f"La respuesta del parser se cortó tras {received} resultados, sin la línea de resumen.")
+    if summary.get("processed") != received:
+        raise httpx.RemoteProtocolError(
+            f"El parser informó {summary.get('processed')} XML procesados pero llegaron {received} resultados."
+        )
+
+
+async def parse_invoices(upload_id: str, xml_paths: List[str], xml_index: XmlContentIndex = None,
+                         on_result: Callable[[Dict[str, Any]], None] = None) -> List[Dict[str, Any]]:
+    """
+    Envía los XML al servicio de Parser y devuelve sus resultados en el orden de los
+    XML. Con PARSER_INLINE_XML y el índice de contenidos se envían los archivos en la
+    petición; si no, sus rutas en GCS. En ambos casos el nombre de archivo de cada
+    resultado es el basename de xml_path.
+
+    Con PARSER_STREAM_RESULTS, on_result(resultado) se llama con cada resultado
+    apenas llega, mientras el parser sigue con los demás.
+    """
+    print("--- 📝 Enviando XMLs al servicio de Parser ---")
+    if PARSER_STREAM_RESULTS:
+        results = []
+        async with contextlib.aclosing(iter_parse_results(upload_id, xml_paths, xml_index)) as stream:
+            async for result in stream:
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        return sorted(results, key=lambda r: r.get("xml_index") or 0)
+
+    inline, request_kwargs = _parser_request(upload_id, xml_paths, xml_index)
+    with tracing.span("parse", xml_count=len(xml_index) if inline else len(xml_paths), inline=inline):
+        parser_response = await http_client.request(
+            "POST", PARSER_SERVICE_URL, timeout=PARSER_TIMEOUT, service="parser", idempotent=True, **request_kwargs
+        )
+        parser_response.raise_for_status()
+        results = parser_response.json().get("results", [])
+    if on_result is not None:
+        for result in results:
+            on_result(result)
+    return results
+
+
+def collect_valid_invoices(parsed_results: List[Dict[str, Any]], xml_index: XmlContentIndex = None) -> List[Dict[str, Any]]:
+    invoices_data_with_filename = []
+    for res in parsed_results:
+        if res.get('status') == 'SUCCESS':
+            data = res['parsed_invoice_data']
+            data['xml_filename'] = os.path.basename(res['xml_path'])
+            entry = xml_index.get(data['xml_filename']) if xml_index is not None else None
+            if entry is not None:
+                data['xml_sha256'] = entry.sha256
+            invoices_data_with_filename.append(data)
+    return invoices_data_with_filename
+
+
+def group_by(invoices: Iterable[Dict[str, Any]], key: str) -> Dict[str, List[Dict[str, Any]]]:
+    grouped = defaultdict(list)
+    for inv in invoices:
+        grouped[inv[key]].append(inv)
+    return grouped
+
+
+class InvoiceGroups:
+    """
+    Facturas válidas del parser agrupadas por moneda y por RUC del deudor. Se llena
+    con add() a medida que llegan los resultados, así al terminar el último XML ya
+    están agrupadas; finish() deja cada lista en el orden de los XML del envío. Solo
+    se adelanta la agrupación: Excel y CAVALI esperan a que termine el parser.
+    Una factura (emisor + número) que se repite en el envío se registra una sola
+    vez: las copias quedan en duplicates y no llegan a la base de datos.
+    """
+
+    def __init__(self, xml_index: XmlContentIndex = None):
+        self.xml_index = xml_index
+        self.received = 0
+        self.invoices: List[Dict[str, Any]] = []
+        self.by_currency: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.by_debtor_ruc: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.duplicates: List[str] = []
+        self._positions: Dict[int, int] = {}
+        self._keys: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add(self, result: Dict[str, Any]):
+        self.received += 1
+        for data in collect_valid_invoices([result], self.xml_index):
+            position = result.get('xml_index') or 0
+            key = (data.get('client_ruc'), data.get('document_id'))
+            first = self._keys.get(key)
+            if first is not None:
+                # Se queda la copia que va primero en el envío, sin importar cuál llegó antes
+                if position >= self._positions[id(first)]:
+                    self._discard_duplicate(data, first)
+                    continue
+                self._remove(first)
+                self._discard_duplicate(first, data)
+            self._keys[key] = data
+            self._positions[id(data)] = position
+            self.invoices.append(data)
+            self.by_currency[data['currency']].append(data)
+            self.by_debtor_ruc[data['debtor_ruc']].append(data)
+
+    def _discard_duplicate(self, duplicate: Dict[str, Any], kept: Dict[str, Any]):
+        self.duplicates.append(duplicate['xml_filename'])
+        print(f"ADVERTENCIA: La factura {duplicate.get('document_id')} del emisor {duplicate.get('client_ruc')} "
+              f"está repetida en el envío; se omite {duplicate['xml_filename']} y se registra {kept['xml_filename']}.")
+
+    def _remove(self, data: Dict[str, Any]):
+        for invoices in (self.invoices, self.by_currency[data['currency']], self.by_debtor_ruc[data['debtor_ruc']]):
+            invoices.remove(data)
+        for grouped, key in ((self.by_currency, data['currency']), (self.by_debtor_ruc, data['debtor_ruc'])):
+            if not grouped[key]:
+                del grouped[key]
+        del self._positions[id(data)]
+
+    def finish(self) -> "InvoiceGroups":
+        def position(inv):
+            return self._positions[id(inv)]
+
+        self.invoices.sort(key=position)
+        # También los grupos, que es el orden en que las monedas reciben su ID de operación
+        for attr in ("by_currency", "by_debtor_ruc"):
+            grouped = getattr(self, attr)
+            for invoices in grouped.values():
+                invoices.sort(key=position)
+            setattr(self, attr, defaultdict(list, sorted(grouped.items(), key=lambda item: position(item[1][0]))))
+        return self
+
+
+# --- Excel (contactos de deudores) ---
+async def sync_debtor_contacts(invoices: List[Dict[str, Any]], correo_de_la_operacion: str,
+                               invoices_by_debtor_ruc: Dict[str, List[Dict[str, Any]]] = None) -> Dict[str, str]:
+    """
+    Actualiza y consulta los contactos de todos los deudores en una sola llamada
+    a /contacts/sync. Devuelve la lista final de correos por RUC.
+    """
+    print("--- 📊 Actualizando y consultando contactos en Google Sheets ---")
+    if invoices_by_debtor_ruc is None:
+        invoices_by_debtor_ruc = group_by(invoices, 'debtor_ruc')
+    contactos = [
+        {"ruc": ruc, "correo": correo_de_la_operacion, "nombre_deudor": invs[0]['debtor_name']}
+        for ruc, invs in invoices_by_debtor_ruc.items()
+    ]
+
+    correos_del_excel = {}
+    with tracing.span("excel_sync", debtor_count=len(contactos)):
+        try:
+            # Construye la URL del lote, quitando la parte '/update-contact'
+            base_excel_url = EXCEL_SERVICE_URL.replace('/update-contact', '')
+            response = await http_client.post_json(
+                f"{base_excel_url}/contacts/sync", {"contactos": contactos},
+                timeout=EXCEL_TIMEOUT, service="excel", idempotent=True,
+            )
+            response.raise_for_status()
+            for ruc, resultado in response.json().get("results", {}).items():
+                if resultado.get("status") == "ERROR":
+                    print(f"⚠️ Alerta: No se pudo actualizar el contacto para RUC {ruc}. Error: {resultado.get('message')}")
+                correos_del_excel[ruc] = resultado.get("emails", "")
+        except httpx.HTTPError as e:
+            print(f"⚠️ Alerta: No se pudieron sincronizar los contactos en Google Sheets. Error: {http_client.describe_error(e)}")
+
+    correos_finales_por_ruc = {}
+    for ruc in invoices_by_debtor_ruc:
+        # Lógica para construir la lista final de correos
+        lista_final = set(c.strip() for c in correos_del_excel.get(ruc, "").split(';') if c.strip())
+        if correo_de_la_operacion:
+            lista_final.add(correo_de_la_operacion)
+        correos_finales_por_ruc[ruc] = ";".join(sorted(lista_final))
+        print(f"Lista de correos final para {ruc}: {correos_finales_por_ruc[ruc]}")
+    return correos_finales_por_ruc
+
+
+# --- CAVALI ---
+async def validate_in_cavali(xml_index: XmlContentIndex, xml_filenames: set) -> Dict[str, Any]:
+    """
+    Envía los XML del grupo a CAVALI. El cuerpo se codifica en base64 por trozos
+    mientras se transmite, a partir del índice de contenidos del envío.
+    """
+    print("--- 📄 Enviando XMLs al servicio de CAVALI para validación ---")
+    cavali_results_json = {}
+    with tracing.span("cavali", xml_count=len(xml_filenames)):
+        try:
+            cavali_response = await http_client.request(
+                "POST", CAVALI_SERVICE_URL,
+                content=xml_index.stream_cavali_payload(xml_filenames),
+                headers={"Content-Type": "application/json"},
+                timeout=CAVALI_TIMEOUT,
+                service="cavali",
+            )
+            cavali_response.raise_for_status()
+            cavali_results_json = cavali_response.json().get("results", {})
+            print("--- ✅ Validación en CAVALI completada ---")
+        except httpx.HTTPError as e:
+            print(f"⚠️ Alerta: Falló la comunicación con el servicio de CAVALI. Error: {http_client.describe_error(e)}")
+    print(f"------------------Resultados de CAVALI: {cavali_results_json}")
+    return cavali_results_json
+
+
+async def validate_groups_in_cavali(xml_index: XmlContentIndex, filenames_by_currency: Dict[str, set]) -> Dict[str, Dict[str, Any]]:
+    """
+    Valida en paralelo cada grupo de moneda en CAVALI.
+    """
+    currencies = list(filenames_by_currency.keys())
+    results = await asyncio.gather(*(validate_in_cavali(xml_index, filenames_by_currency[c]) for c in currencies))
+    return dict(zip(currencies, results))
+
+
+# --- Drive ---
+def files_for_group(submission: Submission, xml_filenames: set) -> List[str]:
+    """
+    Archivos de GCS que corresponden a un grupo de moneda: sus XML, los PDF con el
+    mismo nombre base que esos XML y todos los respaldos. Los PDF que no coinciden
+    con ningún XML del envío se incluyen en todos los grupos.
+    """
+    stem = lambda path: os.path.splitext(os.path.basename(path))[0]
+    group_stems = {os.path.splitext(f)[0] for f in xml_filenames}
+    all_xml_stems = {stem(p) for p in submission.xml_paths}
+    xml_paths = [p for p in submission.xml_paths if os.path.basename(p) in xml_filenames]
+    pdf_paths = [p for p in submission.pdf_paths if stem(p) in group_stems or stem(p) not in all_xml_stems]
+    return xml_paths + pdf_paths + submission.respaldo_paths
+
+
+async def archive_submission(all_gcs_paths: List[str], paths_by_operation: Dict[str, List[str]]) -> Dict[str, str]:
+    """
+    Archiva el envío en Drive en una sola llamada: cada archivo se sube una vez y
+    cada operación recibe una carpeta con accesos directos a sus archivos.
+    Devuelve la URL de la carpeta de cada operación.
+    """
+    # La carpeta compartida toma el nombre de la primera operación del envío
+    submission_id = next(iter(paths_by_operation))
+    base_drive_url = DRIVE_SERVICE_URL.replace('/archive-files', '')
+    with tracing.span("drive", file_count=len(all_gcs_paths)):
+        drive_response = await http_client.post_json(
+            f"{base_drive_url}/archive-submission",
+            {
+                "submission_id": submission_id,
+                "gcs_file_paths": all_gcs_paths,
+                "operations": [{"operation_id": op_id, "gcs_file_paths": paths} for op_id, paths in paths_by_operation.items()],
+            },
+            timeout=DRIVE_TIMEOUT,
+            service="drive",
+        )
+        drive_response.raise_for_status()
+    print("--- 📂 Archivos archivados en Google Drive ---")
+    operations = drive_response.json().get("operations", {})
+    return {op_id: operations.get(op_id, {}).get("drive_folder_url") for op_id in paths_by_operation}
+
+
+# --- Notificaciones ---
+async def _post_notification(service: str, url: str, payload: Dict[str, Any], timeout: float, description: str,
+                             on_sent: Optional[Callable[[], Awaitable[Any]]] = None) -> bool:
+    """
+    Envía una notificación. Si el circuito del servicio está abierto no se espera
+    ni se falla: queda postergada y se reenvía cuando el servicio se recupere
+    (entonces se llama a on_sent). Devuelve False si quedó postergada.
+    """
+    async def _send():
+        response = await http_client.post_json(url, payload, timeout=timeout, service=service)
+        response.raise_for_status()
+
+    async def _send_deferred():
+        await _send()
+        if on_sent is not None:
+            await on_sent()
+
+    try:
+        await _send()
+        return True
+    except httpx.HTTPError:
+        # También se posterga la llamada cuyo fallo terminó de abrir el circuito
+        if not resilience.get_breaker(service).is_open():
+            raise
+        resilience.deferred_calls.defer(service, description, _send_deferred)
+        return False
+
+
+async def notify_gmail(operation_id: str, parser_results_for_group: List[Dict[str, Any]], pdf_paths: List[str],
+                       destinatarios: str, user_email: str, ruc_deudor: str,
+                       on_sent: Optional[Callable[[], Awaitable[Any]]] = None) -> str:
+    try:
+        if destinatarios:
+            gmail_payload = {
+                "parsed_invoice_data": {"results": parser_results_for_group},
+                "pdf_paths": pdf_paths,
+                "recipient_emails": destinatarios,
+                "user_email": user_email
+            }
+            if await _post_notification("gmail", GMAIL_SERVICE_URL, gmail_payload, GMAIL_TIMEOUT,
+                                        f"Notificación por Gmail de op {operation_id}", on_sent):
+                print(f"--- ✉️  Notificación por Gmail enviada para op {operation_id}. ---")
+                return NOTIFICACION_ENVIADA
+            return NOTIFICACION_POSTERGADA
+        print(f"ADVERTENCIA: No se enviarán correos para op {operation_id} porque no se encontraron correos para RUC {ruc_deudor}.")
+        return NOTIFICACION_OMITIDA
+    except Exception as e:
+        print(f"ADVERTENCIA: Falló el envío de GMAIL para op {operation_id}. Error: {e}")
+        return NOTIFICACION_ERROR
+
+
+async def notify_trello(trello_payload: Dict[str, Any], on_sent: Optional[Callable[[], Awaitable[Any]]] = None) -> str:
+    operation_id = trello_payload.get("operation_id")
+    try:
+        if await _post_notification("trello", TRELLO_SERVICE_URL, trello_payload, TRELLO_TIMEOUT,
+                                    f"Tarjeta de Trello de op {operation_id}", on_sent):
+            print(f"--- 🚀 Notificación a Trello enviada para op {operation_id}. ---")
+            return NOTIFICACION_ENVIADA
+        return NOTIFICACION_POSTERGADA
+    except Exception as e:
+        print(f"ADVERTENCIA: Falló la creación en Trello para op {operation_id}. Error: {e}")
+        return NOTIFICACION_ERROR
+
+
+def build_trello_payload(operation_id: str, metadata: dict, drive_folder_url: str, invoices_in_group: List[Dict[str, Any]],
+                         attachment_paths: List[str], cavali_results_json: Dict[str, Any]) -> Dict[str, Any]:
+    cuentas_desembolso_data = metadata.get('cuentasDesembolso', [])
+    cuenta_principal = cuentas_desembolso_data[0] if cuentas_desembolso_data else {}
+    solicitudAdelanto_obj = metadata.get('solicitudAdelanto', {})
+    return {
+        "operation_id": operation_id,
+        "client_name": invoices_in_group[0].get('client_name'),
+        "tasa": metadata.get('tasaOperacion', 'N/A'),
+        "comision": metadata.get('comision', 'N/A'),
+        "drive_folder_url": drive_folder_url,
+        "invoices": invoices_in_group,
+        "attachment_paths": attachment_paths,
+        "cavali_results": cavali_results_json,
+        "user_email": metadata.get('user_email', None),
+        "porcentajeAdelanto": solicitudAdelanto_obj.get('porcentaje', 0),
+        "desembolso_numero": cuenta_principal.get('numero'),
+        "desembolso_moneda": cuenta_principal.get('moneda'),
+        "desembolso_tipo": cuenta_principal.get('tipo'),
+        "desembolso_banco": cuenta_principal.get('banco')
+    }
+
+
+async def notify_operation(operation_id: str, metadata: dict, drive_folder_url: str, invoices_in_group: List[Dict[str, Any]],
+                           parsed_results: List[Dict[str, Any]], pdf_paths: List[str], respaldo_paths: List[str],
+                           cavali_results_json: Dict[str, Any], correos_finales_por_ruc: Dict[str, str],
+                           channels: Iterable[str] = NOTIFICATION_CHANNELS,
+                           on_sent: Optional[Callable[[str], Awaitable[Any]]] = None) -> Dict[str, str]:
+    """
+    Envía en paralelo las notificaciones de una operación por los canales indicados
+    (Gmail y Trello). Devuelve el estado de cada canal; on_sent(canal) se llama
+    cuando un canal postergado se envía por fin.
+    """
+    def _on_sent(channel: str):
+        return (lambda: on_sent(channel)) if on_sent is not None else None
+
+    xml_filenames_in_group = {inv['xml_filename'] for inv in invoices_in_group}
+    parser_results_for_group = [
+        res for res in parsed_results if os.path.basename(res.get('xml_path', '')) in xml_filenames_in_group
+    ]
+    ruc_deudor_grupo = invoices_in_group[0]['debtor_ruc']
+    sends = {}
+    if "gmail" in channels:
+        sends["gmail"] = notify_gmail(
+            operation_id, parser_results_for_group, pdf_paths,
+            correos_finales_por_ruc.get(ruc_deudor_grupo), metadata.get('user_email', None), ruc_deudor_grupo,
+            _on_sent("gmail")
+        )
+    if "trello" in channels:
+        sends["trello"] = notify_trello(build_trello_payload(
+            operation_id, metadata, drive_folder_url, invoices_in_group, pdf_paths + respaldo_paths, cavali_results_json
+        ), _on_sent("trello"))
+    with tracing.span("notifications", operation_id=operation_id):
+        statuses = await asyncio.gather(*sends.values())
+    return dict(zip(sends, statuses))
+
+
+# --- Reenvíos ---
+async def find_processed_invoices(db: AsyncSession, xml_index: XmlContentIndex) -> Dict[str, Any]:
+    """
+    Busca por (RUC del emisor, número de documento) las facturas del envío que ya
+    están registradas, antes de subir ni procesar nada. Devuelve los nombres de
+    esos XML y las operaciones en que se registraron.
+    """
+    keys_by_filename = xml_index.invoice_keys()
+    found = await AsyncOperationRepository(db).find_processed_invoices(list(keys_by_filename.values()))
+    return {
+        "filenames": [name for name, key in keys_by_filename.items() if key in found["invoices"]],
+        "operations": found["operations"],
+    }
+
+
+# --- Orquestación completa ---
+async def run_submission(db: AsyncSession, submission: Submission, tracker: StageTracker = None,
+                         journal: StageJournal = None) -> Dict[str, Any]:
+    """
+    Ejecuta el pipeline completo (parser, Excel, CAVALI, Drive, BD y notificaciones)
+    sobre un envío ya subido a GCS, o que se sube mientras corren el parser y CAVALI.
+    Con una bitácora, cada etapa anota su salida y las que ya terminaron en un intento
+    anterior no se repiten. Si falla por un error que reanudarlo no cambiaría, la
+    bitácora queda cerrada como fallida. Mientras corre, el envío queda reclamado:
+    otra ejecución del mismo envío recibe un 409.
+    """
+    journal = journal or StageJournal()
+    if not await journal.claim():
+        raise HTTPException(status_code=409, detail=f"El envío '{journal.envio_id}' ya se está procesando.")
+    try:
+        return await _run_submission(db, submission, tracker or StageTracker(), journal)
+    except Exception as e:
+        if not is_retryable_error(e):
+            await journal.record_failure(str(to_http_exception(e).detail))
+        raise
+    finally:
+        await journal.release()
+
+
+async def _run_submission(db: AsyncSession, submission: Submission, tracker: StageTracker,
+                          journal: StageJournal) -> Dict[str, Any]:
+    metadata = submission.metadata
+
+    # --- 2. Parsear XMLs y 3. agrupar facturas por moneda y deudor, a medida que llegan ---
+    groups = InvoiceGroups(submission.xml_index)
+
+    async def _parse():
+        async with tracker.stage("parse"):
+            return {"results": await parse_invoices(
+                submission.upload_id, submission.xml_paths, submission.xml_index, on_result=groups.add
+            )}
+
+    parsed_results = (await run_stage(journal, "parse", _parse))["results"]
+    if groups.received != len(parsed_results):
+        # Etapa reanudada desde la bitácora: los resultados no pasaron por add()
+        groups = InvoiceGroups(submission.xml_index)
+        for res in parsed_results:
+            groups.add(res)
+    groups.finish()
+    invoices_data_with_filename = groups.invoices
+
+    if not invoices_data_with_filename:
+        raise HTTPException(status_code=400, detail="No se pudo parsear ninguna factura válida.")
+
+    invoices_by_currency = groups.by_currency
+    filenames_by_currency = {
+        currency: {inv['xml_filename'] for inv in invoices_in_group}
+        for currency, invoices_in_group in invoices_by_currency.items()
+    }
+
+    # --- 4. Contactos en EXCEL y validación en CAVALI, en paralelo ---
+    # Empiezan con el parser terminado: CAVALI valida todos los XML de cada moneda y
+    # Excel sincroniza todos los deudores en una sola llamada
+    correo_de_la_operacion = metadata.get('mailVerificacion', '').strip()
+
+    async def _excel():
+        async with tracker.stage("excel"):
+            return {"correos_por_ruc": await sync_debtor_contacts(
+                invoices_data_with_filename, correo_de_la_operacion, groups.by_debtor_ruc
+            )}
+
+    async def _cavali():
+        async with tracker.stage("cavali"):
+            return {"results_by_currency": await validate_groups_in_cavali(submission.xml_index, filenames_by_currency)}
+
+    excel_output, cavali_output = await asyncio.gather(run_stage(journal, "excel", _excel), run_stage(journal, "cavali", _cavali))
+    correos_finales_por_ruc = excel_output["correos_por_ruc"]
+    cavali_results_by_currency = cavali_output["results_by_currency"]
+
+    repo = AsyncOperationRepository(db)
+    created_operations = []
+    notifications = []
+
+    # --- 5. Cada grupo de moneda es una operación independiente ---
+    # 5.1. Generar IDs y archivar en Drive una sola vez para todo el envío. Al
+    # reanudar se conservan los IDs y las carpetas del primer intento.
+    currencies = list(invoices_by_currency.keys())
+    ids_reused = journal.completed("operation_ids") is not None
+
+    async def _ids():
+        return {"operation_ids": dict(zip(currencies, await repo.generar_ids_operacion(len(currencies))))}
+
+    operation_ids = (await run_stage(journal, "operation_ids", _ids))["operation_ids"]
+    # Drive copia los archivos desde GCS: aquí la subida tiene que haber terminado
+    await submission.wait_for_upload()
+    paths_by_operation = {
+        operation_ids[currency]: files_for_group(submission, {inv['xml_filename'] for inv in invoices_by_currency[currency]})
+        for currency in currencies
+    }
+
+    async def _drive():
+        async with tracker.stage("drive"):
+            return {"urls": await archive_submission(submission.all_gcs_paths, paths_by_operation)}
+
+    drive_urls = (await run_stage(journal, "drive", _drive))["urls"]
+
+    for currency, invoices_in_group in invoices_by_currency.items():
+        print(f"--- ⚙️  Procesando Lote para Moneda: {currency} ---")
+        operation_id = operation_ids[currency]
+        drive_folder_url = drive_urls[operation_id]
+        cavali_results_json = cavali_results_by_currency[currency]
+
+        # 5.2. Guardar operación en la BD
+        async def _save():
+            async with tracker.stage(f"db_{currency}"):
+                with tracing.span("db", operation_id=operation_id):
+                    try:
+                        # Un intento anterior pudo guardarla y fallar antes de anotar la etapa
+                        if not (ids_reused and await repo.existe_operacion(operation_id)):
+                            await repo.save_full_operation(
+                                operation_id,
+                                metadata,
+                                drive_folder_url,
+                                invoices_in_group,
+                                cavali_results_json
+                            )
+                    except Exception:
+                        # Libera la transacción antes de que la bitácora anote el error
+                        await db.rollback()
+                        raise
+            return {"operation_id": operation_id}
+
+        await run_stage(journal, f"db_{currency}", _save)
+
+        created_operations.append({
+            "operation_id": operation_id, "currency": currency,
+            "drive_url": drive_folder_url, "invoice_count": len(invoices_in_group)
+        })
+
+        notifications.append(notify_with_journal(
+            journal, operation_id, metadata, drive_folder_url, invoices_in_group, parsed_results,
+            submission.pdf_paths, submission.respaldo_paths, cavali_results_json, correos_finales_por_ruc
+        ))
+        print(f"--- ✅ Operación {operation_id} para {currency} registrada. ---")
+
+    # --- 6. Enviar notificaciones (Gmail y Trello) de todas las operaciones en paralelo ---
+    async with tracker.stage("notifications"):
+        await asyncio.gather(*notifications)
+
+    result = {
+        "message": f"Proceso finalizado. Se crearon {len(created_operations)} operaciones.",
+        "operations": created_operations,
+        "existing_operations": submission.existing_operations,
+    }
+    if groups.duplicates:
+        result["duplicate_invoices"] = sorted(groups.duplicates)
+    await journal.record(ETAPA_RESULTADO, result)
+    return result
+
+
+async def notify_with_journal(journal: StageJournal, operation_id: str, *args):
+    """
+    Notifica una operación solo por los canales que no se completaron antes y anota
+    el estado de cada uno. Un canal que falló queda con error en la bitácora y se
+    vuelve a intentar al reanudar el envío. Uno postergado se reenvía solo y se anota
+    como completado al enviarse; si el proceso se reinicia antes, queda pendiente en
+    la bitácora y se envía al reanudar el envío.
+    """
+    channels = [c for c in NOTIFICATION_CHANNELS if journal.completed(f"{c}_{operation_id}") is None]
+    if not channels:
+        return
+
+    async def _on_sent(channel: str):
+        await journal.record(f"{channel}_{operation_id}", {"status": NOTIFICACION_ENVIADA})
+
+    statuses = await notify_operation(operation_id, *args, channels=channels, on_sent=_on_sent)
+    for channel, status in statuses.items():
+        name = f"{channel}_{operation_id}"
+        if status == NOTIFICACION_POSTERGADA:
+            await journal.record_deferred(name, {"status": status})
+        elif status == NOTIFICACION_ERROR:
+            await journal.record(name, error=f"La notificación por {channel} falló.")
+        else:
+            await journal.record(name, {"status": status})
+
+
+def is_retryable_error(e: Exception) -> bool:
+    """
+    Si reanudar el envío puede terminarlo. Los errores 4xx dependen de los datos del
+    envío (ninguna factura válida, facturas ya registradas en otra operación) y no.
+    """
+    if isinstance(e, HTTPException):
+        return e.status_code >= 500
+    if isinstance(e, IntegrityError):
+        return not is_duplicate_invoice_error(e)
+    return True
+
+
+def to_http_exception(e: Exception) -> HTTPException:
+    """
+    Traduce un error del pipeline a la respuesta HTTP que se devuelve al cliente.
+    """
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, IntegrityError) and is_duplicate_invoice_error(e):
+        # Otro envío registró las mismas facturas mientras este se procesaba
+        return HTTPException(status_code=409, detail=DUPLICATE_INVOICES_DETAIL)
+    if isinstance(e, resilience.CircuitOpenError):
+        return HTTPException(status_code=503, detail=f"El servicio '{e.service}' no está disponible en este momento. Intente más tarde.")
+    if isinstance(e, httpx.HTTPError):
+        return HTTPException(
+            status_code=503,
+            detail=f"Error de comunicación con un servicio interno: {http_client.describe_error(e)}"
+        )
+    traceback.print_exc()
+    return HTTPException(status_code=500, detail=f"Error inesperado en la orquestación: {str(e)}")
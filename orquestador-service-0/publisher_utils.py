@@ -0,0 +1,107 @@
+# orquestador-service-0/publisher_utils.py
+# Derivado del publisher_utils.py de parser-service-1, que se mantiene tal cual: cada
+# servicio se construye con su propia carpeta como contexto de Docker y no comparte
+# módulos. Este agrega los brokers locales (sqlite/memory/http) y la publicación por
+# lotes del pipeline por eventos; el del parser no lo importa ningún módulo.
+import os
+import json
+import base64
+import secrets
+import threading
+import httpx
+from typing import List, Optional
+
+from broker import SQLiteBroker
+
+GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID", "operaciones-peru")
+# Solo en desarrollo local (IS_LOCAL=true) el broker por defecto es el SQLite local
+IS_LOCAL = os.getenv("IS_LOCAL", "false").lower() == "true"
+
+# Modo del broker:
+#   pubsub -> Google Pub/Sub (producción)
+#   http   -> POST a LOCAL_BROKER_URL/{topic} (simulación local del push de Pub/Sub)
+#   sqlite -> broker SQLite en BROKER_DB_PATH, consumido por workers en este proceso (local)
+#   memory -> broker SQLite en memoria, para pruebas y pruebas de carga sin conexión
+BROKER_MODE = os.getenv("BROKER_MODE", "sqlite" if IS_LOCAL else "pubsub").lower()
+BROKER_DB_PATH = os.getenv("BROKER_DB_PATH", "broker.sqlite3")
+BROKER_MAX_ATTEMPTS = int(os.getenv("BROKER_MAX_ATTEMPTS", "5"))
+LOCAL_BROKER_URL = os.getenv("LOCAL_BROKER_URL", "http://localhost:8080/events")
+# Cada POST del modo http ejecuta la etapa completa antes de responder
+LOCAL_BROKER_TIMEOUT_SECONDS = float(os.getenv("LOCAL_BROKER_TIMEOUT_SECONDS", "600"))
+# En modo http, POST /events/{topic} solo acepta mensajes con este valor en el header
+# X-Broker-Token. Por defecto es aleatorio: solo este mismo proceso lo conoce
+LOCAL_BROKER_TOKEN = os.getenv("LOCAL_BROKER_TOKEN") or secrets.token_urlsafe(32)
+LOCAL_BROKER_TOKEN_HEADER = "X-Broker-Token"
+
+_publisher = None
+_local_broker: Optional[SQLiteBroker] = None
+
+
+def get_publisher():
+    """Instancia del publisher de Pub/Sub con envío por lotes, solo en producción."""
+    global _publisher
+    if _publisher is None:
+        from google.cloud import pubsub_v1
+        _publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(max_messages=100, max_latency=0.05)
+        )
+    return _publisher
+
+
+def get_local_broker() -> SQLiteBroker:
+    global _local_broker
+    if _local_broker is None:
+        path = ":memory:" if BROKER_MODE == "memory" else BROKER_DB_PATH
+        _local_broker = SQLiteBroker(path, max_attempts=BROKER_MAX_ATTEMPTS)
+    return _local_broker
+
+
+def uses_local_broker() -> bool:
+    return BROKER_MODE in ("sqlite", "memory")
+
+
+def receives_push() -> bool:
+    """Si los mensajes llegan por POST /events/{topic} (Pub/Sub o su simulación http)."""
+    return BROKER_MODE in ("pubsub", "http")
+
+
+def _push_local(url: str, payload: dict):
+    data = base64.b64encode(json.dumps(payload).encode("utf-8")).decode("utf-8")
+    try:
+        res = httpx.post(
+            url, json={"message": {"data": data}}, headers={LOCAL_BROKER_TOKEN_HEADER: LOCAL_BROKER_TOKEN},
+            timeout=LOCAL_BROKER_TIMEOUT_SECONDS
+        )
+        print(f"[LOCAL] Enviado a {url} | status={res.status_code}")
+    except httpx.HTTPError as e:
+        print(f"ADVERTENCIA: [LOCAL] No se pudo entregar el mensaje a {url}: {e}")
+
+
+def publish_message(topic: str, payload: dict):
+    publish_messages(topic, [payload])
+
+
+def publish_messages(topic: str, payloads: List[dict]):
+    """
+    Publica varios mensajes en un solo lote.
+    """
+    if not payloads:
+        return
+    if uses_local_broker():
+        ids = get_local_broker().publish_batch(topic, payloads)
+        print(f"[{BROKER_MODE.upper()}] {len(ids)} mensajes encolados en {topic}")
+    elif BROKER_MODE == "http":
+        # Simulación HTTP del push de Pub/Sub, con el mismo sobre. Como Pub/Sub, no espera
+        # a que el destino procese el mensaje: si no, cada etapa quedaría anidada en la
+        # petición de la anterior hasta el final del pipeline
+        url = f"{LOCAL_BROKER_URL}/{topic}"
+        for payload in payloads:
+            threading.Thread(target=_push_local, args=(url, payload), daemon=True).start()
+        print(f"[LOCAL] {len(payloads)} mensajes enviados a {url}")
+    else:
+        publisher = get_publisher()
+        topic_path = publisher.topic_path(GCP_PROJECT_ID, topic)
+        futures = [publisher.publish(topic_path, json.dumps(payload).encode("utf-8")) for payload in payloads]
+        for future in futures:
+            future.result()
+        print(f"[PROD] Publicados {len(futures)} mensajes en Pub/Sub: {topic_path}")
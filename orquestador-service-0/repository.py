@@ -1,37 +1,122 @@
 # orquestador-service-0/repository.py
+import json
+import base64
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
-from sqlalchemy import func
-from datetime import datetime
-from models import Operacion, Factura, Empresa, Usuario 
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, time, timedelta
+from database import dialect_insert
+from models import Operacion, Factura, Empresa, Usuario, ResumenOperacion, UQ_FACTURAS_EMISOR_DOCUMENTO
+from id_allocator import OperationIdAllocator
+
+# El administrador ve las operaciones de todos los usuarios
+ADMIN_EMAIL = "kevin.tupac@capitalexpress.cl"
+
+# Columnas del resumen por las que se puede agrupar en el tablero
+SUMMARY_GROUPS = {
+    "ejecutivo": ResumenOperacion.email_usuario,
+    "cliente": ResumenOperacion.cliente_ruc,
+    "moneda": ResumenOperacion.moneda,
+    "dia": ResumenOperacion.fecha,
+}
+
+
+def encode_operations_cursor(operation_id: str) -> str:
+    """
+    Cursor opaco con la última operación de una página. Su fecha_creacion se lee
+    de la base al pedir la página siguiente, tal como está guardada, para que la
+    comparación (fecha_creacion, id) sea exacta en cualquier motor.
+    """
+    raw = json.dumps({"id": operation_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_operations_cursor(cursor: str) -> str:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["id"]
+    except Exception:
+        raise ValueError("Cursor de paginación inválido.")
+
+
+def is_duplicate_invoice_error(e: IntegrityError) -> bool:
+    """
+    Si el IntegrityError es la restricción única de facturas (emisor + número), es
+    decir, otra operación ya registró alguna de las facturas. Cualquier otra
+    violación (NOT NULL, clave foránea, etc.) es un error del envío o del código.
+    """
+    orig = e.orig
+    for err in (orig, getattr(orig, "__cause__", None)):
+        # asyncpg expone constraint_name; psycopg, diag.constraint_name
+        name = getattr(err, "constraint_name", None) or getattr(getattr(err, "diag", None), "constraint_name", None)
+        if name:
+            return name == UQ_FACTURAS_EMISOR_DOCUMENTO
+    # pg8000 y SQLite solo lo dicen en el mensaje
+    message = str(orig)
+    return UQ_FACTURAS_EMISOR_DOCUMENTO in message or (
+        "UNIQUE constraint failed: facturas.emisor_ruc, facturas.numero_documento" in message
+    )
+
 
 class OperationRepository:
     def __init__(self, db: Session):
         self.db = db
 
-    def _find_or_create_company(self, ruc: str, name: str) -> Optional[Empresa]:
-        if not ruc or not name: return None
-        empresa = self.db.query(Empresa).filter(Empresa.ruc == ruc).first()
-        if not empresa:
-            empresa = Empresa(ruc=ruc, razon_social=name)
-            self.db.add(empresa)
-            self.db.flush()
-        return empresa
+    def _upsert_companies(self, companies: Dict[str, str]):
+        """
+        Registra en un solo INSERT ... ON CONFLICT DO NOTHING todas las empresas
+        (ruc -> razón social) que aún no existen. Las filas van ordenadas por RUC:
+        dos envíos con empresas en común bloquean las filas en el mismo orden y no
+        se interbloquean.
+        """
+        if not companies:
+            return
+        stmt = dialect_insert(self.db.get_bind())(Empresa).values(
+            [{"ruc": ruc, "razon_social": companies[ruc]} for ruc in sorted(companies)]
+        )
+        self.db.execute(stmt.on_conflict_do_nothing(index_elements=[Empresa.ruc]))
 
     def generar_siguiente_id_operacion(self) -> str:
-        today_str = datetime.now().strftime('%Y%m%d')
-        id_prefix = f"OP-{today_str}-"
-        last_id_today = self.db.query(func.max(Operacion.id)).filter(Operacion.id.like(f"{id_prefix}%")).scalar()
-        next_number = int(last_id_today.split('-')[-1]) + 1 if last_id_today else 1
-        return f"{id_prefix}{next_number:03d}"
+        return self.generar_ids_operacion(1)[0]
+
+    def generar_ids_operacion(self, cantidad: int) -> List[str]:
+        """
+        Reserva IDs consecutivos para las operaciones de un mismo envío.
+        """
+        return OperationIdAllocator(self.db.get_bind()).reserve(cantidad)
 
     def save_full_operation(self, operation_id: str, metadata: dict, drive_url: str, invoices_data: List[Dict], cavali_results_map: Dict) -> str: 
+        self._add_full_operation(operation_id, metadata, drive_url, invoices_data, cavali_results_map)
+        self.db.commit()
+        return operation_id
+
+    def save_full_operations(self, operations: List[Dict[str, Any]]) -> List[str]:
+        """
+        Guarda las operaciones de un envío (una por moneda) en una sola transacción:
+        quedan registradas todas o ninguna. Cada elemento lleva los argumentos de
+        save_full_operation (operation_id, metadata, drive_url, invoices_data, cavali_results_map).
+        """
+        for operation in operations:
+            self._add_full_operation(**operation)
+        self.db.commit()
+        return [operation["operation_id"] for operation in operations]
+
+    def _add_full_operation(self, operation_id: str, metadata: dict, drive_url: str, invoices_data: List[Dict], cavali_results_map: Dict):
         if not invoices_data:
             raise ValueError("No se puede guardar una operación sin datos de facturas.")
 
         client_ruc = invoices_data[0].get('client_ruc')
         client_name = invoices_data[0].get('client_name')
-        primer_cliente = self._find_or_create_company(client_ruc, client_name)
+        if not client_ruc or not client_name:
+            raise ValueError("No se puede guardar una operación sin RUC y razón social del cliente.")
+
+        # Cliente y deudores con RUC y razón social, sin repetir
+        companies = {client_ruc: client_name}
+        for inv in invoices_data:
+            if inv.get('debtor_ruc') and inv.get('debtor_name'):
+                companies.setdefault(inv['debtor_ruc'], inv['debtor_name'])
+        self._upsert_companies(companies)
 
         monto_sumatoria = sum(inv.get('total_amount', 0) for inv in invoices_data)
         moneda_operacion = invoices_data[0].get('currency')
@@ -48,7 +133,7 @@ class OperationRepository:
         
         db_operacion = Operacion(
             id=operation_id,
-            cliente_ruc=primer_cliente.ruc,
+            cliente_ruc=client_ruc,
             email_usuario=email,
             nombre_ejecutivo=nombre_ejecutivo,
             url_carpeta_drive=drive_url,
@@ -66,64 +151,140 @@ class OperationRepository:
         self.db.add(db_operacion)
         self.db.flush()
 
+        facturas = []
         for inv in invoices_data:
-            deudor = self._find_or_create_company(inv.get('debtor_ruc'), inv.get('debtor_name'))
             cavali_data = cavali_results_map.get(inv.get('xml_filename'), {})
-            
-            db_factura = Factura(
-                id_operacion=operation_id,
-                numero_documento=inv.get('document_id'),
-                deudor_ruc=deudor.ruc if deudor else None,
-                fecha_emision=datetime.fromisoformat(inv.get('issue_date')) if inv.get('issue_date') else None,
-                fecha_vencimiento=datetime.fromisoformat(inv.get('due_date')) if inv.get('due_date') else None,
-                moneda=inv.get('currency'),
-                monto_total=inv.get('total_amount'),
-                monto_neto=inv.get('net_amount'),
-                mensaje_cavali= cavali_data.get("message"),
-                id_proceso_cavali=cavali_data.get("process_id") 
-            )
-            self.db.add(db_factura)
-            
-        self.db.commit()
-        return operation_id
+            facturas.append({
+                "id_operacion": operation_id,
+                "numero_documento": inv.get('document_id'),
+                "emisor_ruc": inv.get('client_ruc'),
+                "deudor_ruc": inv.get('debtor_ruc') if inv.get('debtor_ruc') and inv.get('debtor_name') else None,
+                "fecha_emision": datetime.fromisoformat(inv.get('issue_date')) if inv.get('issue_date') else None,
+                "fecha_vencimiento": datetime.fromisoformat(inv.get('due_date')) if inv.get('due_date') else None,
+                "moneda": inv.get('currency'),
+                "monto_total": inv.get('total_amount'),
+                "monto_neto": inv.get('net_amount'),
+                "mensaje_cavali": cavali_data.get("message"),
+                "id_proceso_cavali": cavali_data.get("process_id"),
+            })
+        # Un INSERT de varias filas para todas las facturas de la operación
+        self.db.execute(insert(Factura), facturas)
+        self._add_to_summary(email, client_ruc, moneda_operacion, len(facturas), monto_sumatoria)
     
-    def get_operations_by_user_email(self, email: str) -> List[Dict[str, Any]]:
+    def _add_to_summary(self, email: str, client_ruc: str, moneda: Optional[str], cantidad_facturas: int, monto: float):
+        """
+        Suma la operación al resumen del día. La fecha es CURRENT_DATE de la base,
+        la misma que toma fecha_creacion (now()) dentro de la transacción.
+        """
+        stmt = dialect_insert(self.db.get_bind())(ResumenOperacion).values(
+            fecha=func.current_date(),
+            email_usuario=email,
+            cliente_ruc=client_ruc,
+            moneda=moneda or '',
+            cantidad_operaciones=1,
+            cantidad_facturas=cantidad_facturas,
+            monto_total=monto,
+        )
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[
+                ResumenOperacion.fecha, ResumenOperacion.email_usuario,
+                ResumenOperacion.cliente_ruc, ResumenOperacion.moneda,
+            ],
+            set_={
+                "cantidad_operaciones": ResumenOperacion.cantidad_operaciones + 1,
+                "cantidad_facturas": ResumenOperacion.cantidad_facturas + stmt.excluded.cantidad_facturas,
+                "monto_total": ResumenOperacion.monto_total + stmt.excluded.monto_total,
+            },
+        ))
+
+    def existe_operacion(self, operation_id: str) -> bool:
+        return self.db.get(Operacion, operation_id) is not None
+
+    def actualizar_url_drive(self, operation_id: str, drive_url: str):
         """
-        Obtiene las operaciones de un usuario, uniendo la información del cliente.
+        Guarda la carpeta de Drive de una operación que se archivó después de registrarse.
+        """
+        self.db.query(Operacion).filter(Operacion.id == operation_id).update({Operacion.url_carpeta_drive: drive_url})
+        self.db.commit()
+
+    def find_processed_invoices(self, keys: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        Busca facturas ya registradas por (RUC del emisor, número de documento), con
+        el índice único de facturas. Devuelve la operación de cada factura encontrada
+        y un resumen de esas operaciones, con la misma forma que el resultado de un envío.
+        """
+        if not keys:
+            return {"invoices": {}, "operations": []}
+        rows = (
+            self.db.query(
+                Factura.emisor_ruc, Factura.numero_documento, Factura.id_operacion,
+                Operacion.moneda_sumatoria, Operacion.url_carpeta_drive,
+            )
+            .join(Operacion, Operacion.id == Factura.id_operacion)
+            .filter(tuple_(Factura.emisor_ruc, Factura.numero_documento).in_(list(set(keys))))
+            .all()
+        )
+        invoices = {(r.emisor_ruc, r.numero_documento): r.id_operacion for r in rows}
+        operations: Dict[str, Dict[str, Any]] = {}
+        for r in rows:
+            op = operations.setdefault(r.id_operacion, {
+                "operation_id": r.id_operacion, "currency": r.moneda_sumatoria,
+                "drive_url": r.url_carpeta_drive, "invoice_count": 0,
+            })
+            op["invoice_count"] += 1
+        return {"invoices": invoices, "operations": list(operations.values())}
+
+    def get_operations_by_user_email(
+        self,
+        email: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+        moneda: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Obtiene una página de operaciones de un usuario, uniendo la información del cliente.
+        Las operaciones se ordenan por (fecha_creacion, id) descendente y la página
+        siguiente se pide con el next_cursor devuelto, así que cada consulta lee solo
+        `limit` filas del índice sin importar cuántas operaciones haya en el historial.
         """
         # La consulta une Operacion y Empresa para obtener la razón social del cliente.
-        if email == "kevin.tupac@capitalexpress.cl":
-            # Si es el usuario admin, retorna todas las operaciones
-            results = (
-                self.db.query(
-                    Operacion.id,
-                    Operacion.fecha_creacion.label("fechaIngreso"),
-                    Empresa.razon_social.label("cliente"),
-                    Operacion.monto_sumatoria_total.label("monto"),
-                    Operacion.moneda_sumatoria.label("moneda"),
-                    #Operacion.estado
-                )
-                .join(Empresa, Operacion.cliente_ruc == Empresa.ruc)
-                .order_by(Operacion.fecha_creacion.desc())
-                .all()
+        query = (
+            self.db.query(
+                Operacion.id,
+                Operacion.fecha_creacion.label("fechaIngreso"),
+                Empresa.razon_social.label("cliente"),
+                Operacion.monto_sumatoria_total.label("monto"),
+                Operacion.moneda_sumatoria.label("moneda"),
+                #Operacion.estado
             )
-        else:
-            # Si es un usuario normal, filtra por su email
-            results = (
-                self.db.query(
-                    Operacion.id,
-                    Operacion.fecha_creacion.label("fechaIngreso"),
-                    Empresa.razon_social.label("cliente"),
-                    Operacion.monto_sumatoria_total.label("monto"),
-                    Operacion.moneda_sumatoria.label("moneda"),
-                    #Operacion.estado
-                )
-                .join(Empresa, Operacion.cliente_ruc == Empresa.ruc)
-                .filter(Operacion.email_usuario == email)
-                .order_by(Operacion.fecha_creacion.desc())
-                .all()
+            .join(Empresa, Operacion.cliente_ruc == Empresa.ruc)
+        )
+        if email != ADMIN_EMAIL:
+            # Si es un usuario normal, filtra por su email; el admin ve todas las operaciones
+            query = query.filter(Operacion.email_usuario == email)
+        if fecha_desde:
+            query = query.filter(Operacion.fecha_creacion >= datetime.combine(fecha_desde, time.min))
+        if fecha_hasta:
+            query = query.filter(Operacion.fecha_creacion < datetime.combine(fecha_hasta + timedelta(days=1), time.min))
+        if moneda:
+            query = query.filter(Operacion.moneda_sumatoria == moneda)
+        if cursor:
+            cursor_id = decode_operations_cursor(cursor)
+            cursor_fecha = (
+                self.db.query(Operacion.fecha_creacion).filter(Operacion.id == cursor_id).scalar_subquery()
             )
-        return [
+            query = query.filter(tuple_(Operacion.fecha_creacion, Operacion.id) < tuple_(cursor_fecha, cursor_id))
+
+        # Se pide una fila de más para saber si hay una página siguiente
+        results = (
+            query.order_by(Operacion.fecha_creacion.desc(), Operacion.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        next_cursor = encode_operations_cursor(results[limit - 1].id) if len(results) > limit else None
+        operations = [
             {
                 "id": r.id,
                 "fechaIngreso": r.fechaIngreso.isoformat(),
@@ -132,30 +293,186 @@ class OperationRepository:
                 "moneda": r.moneda,
                 "estado": "En Verificación" # Un valor por defecto si es nulo
             }
-            for r in results
+            for r in results[:limit]
         ]
+        return {"operations": operations, "next_cursor": next_cursor}
         
-    def update_and_get_last_login(self, email: str, name: str) -> Optional[datetime]:
+    def get_operations_summary(
+        self,
+        email: str,
+        agrupar_por: str,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
         """
-        Actualiza la hora de ingreso de un usuario y devuelve la anterior.
-        Si el usuario no existe, lo crea.
+        Totales de operaciones agrupados por ejecutivo, cliente, moneda o día, leídos
+        del resumen. Los montos siempre se separan por moneda.
         """
-        now = datetime.now()
-        
-        # Busca al usuario
-        usuario = self.db.query(Usuario).filter(Usuario.email == email).first()
-
-        if usuario:
-            # Si el usuario existe, guarda su fecha de ingreso anterior
-            previous_login = usuario.ultimo_ingreso
-            # Actualiza la fecha al momento actual
-            usuario.ultimo_ingreso = now
-        else:
-            # Si es la primera vez que ingresa, no hay ingreso anterior
-            previous_login = None
-            # Crea el nuevo usuario
-            usuario = Usuario(email=email, nombre=name, ultimo_ingreso=now)
-            self.db.add(usuario)
-        
+        group_column = SUMMARY_GROUPS[agrupar_por]
+        columns = [group_column] if agrupar_por == "moneda" else [group_column, ResumenOperacion.moneda]
+        query = self.db.query(
+            *columns,
+            func.sum(ResumenOperacion.cantidad_operaciones).label("cantidad_operaciones"),
+            func.sum(ResumenOperacion.cantidad_facturas).label("cantidad_facturas"),
+            func.sum(ResumenOperacion.monto_total).label("monto_total"),
+        )
+        if email != ADMIN_EMAIL:
+            query = query.filter(ResumenOperacion.email_usuario == email)
+        if fecha_desde:
+            query = query.filter(ResumenOperacion.fecha >= fecha_desde)
+        if fecha_hasta:
+            query = query.filter(ResumenOperacion.fecha <= fecha_hasta)
+        rows = query.group_by(*columns).order_by(*columns).all()
+
+        razones_sociales = {}
+        if agrupar_por == "cliente":
+            rucs = {r.cliente_ruc for r in rows}
+            razones_sociales = dict(self.db.query(Empresa.ruc, Empresa.razon_social).filter(Empresa.ruc.in_(rucs)).all())
+
+        result = []
+        for r in rows:
+            clave = r[0].isoformat() if agrupar_por == "dia" else r[0]
+            item = {
+                agrupar_por: clave,
+                "moneda": r.moneda,
+                "cantidad_operaciones": int(r.cantidad_operaciones),
+                "cantidad_facturas": int(r.cantidad_facturas),
+                "monto_total": float(r.monto_total),
+            }
+            if agrupar_por == "ejecutivo":
+                item["nombre_ejecutivo"] = clave.split('@')[0].replace('.', ' ').title()
+            if agrupar_por == "cliente":
+                item["razon_social"] = razones_sociales.get(clave)
+            result.append(item)
+        return result
+
+    def _summary_from_raw_tables(self):
+        """
+        Calcula el resumen desde operaciones y facturas (lo que el resumen debería contener).
+        """
+        facturas_por_operacion = (
+            select(Factura.id_operacion, func.count(Factura.id).label("cantidad"))
+            .group_by(Factura.id_operacion)
+            .subquery()
+        )
+        fecha = func.date(Operacion.fecha_creacion)
+        moneda = func.coalesce(Operacion.moneda_sumatoria, '')
+        return (
+            select(
+                fecha.label("fecha"),
+                Operacion.email_usuario,
+                Operacion.cliente_ruc,
+                moneda.label("moneda"),
+                func.count(Operacion.id).label("cantidad_operaciones"),
+                func.coalesce(func.sum(facturas_por_operacion.c.cantidad), 0).label("cantidad_facturas"),
+                func.coalesce(func.sum(Operacion.monto_sumatoria_total), 0).label("monto_total"),
+            )
+            .outerjoin(facturas_por_operacion, facturas_por_operacion.c.id_operacion == Operacion.id)
+            .group_by(fecha, Operacion.email_usuario, Operacion.cliente_ruc, moneda)
+        )
+
+    def rebuild_operations_summary(self) -> int:
+        """
+        Vuelve a calcular todo el resumen desde las tablas de operaciones y facturas.
+        """
+        raw = self._summary_from_raw_tables()
+        self.db.query(ResumenOperacion).delete(synchronize_session=False)
+        self.db.execute(insert(ResumenOperacion).from_select(
+            ["fecha", "email_usuario", "cliente_ruc", "moneda", "cantidad_operaciones", "cantidad_facturas", "monto_total"],
+            raw,
+        ))
+        self.db.commit()
+        return self.db.query(func.count()).select_from(ResumenOperacion).scalar()
+
+    def check_operations_summary(self) -> List[Dict[str, Any]]:
+        """
+        Compara el resumen con las tablas de operaciones y facturas y devuelve las
+        filas que no coinciden (vacío si el resumen es consistente).
+        """
+        def key(r):
+            fecha = r.fecha if isinstance(r.fecha, str) else r.fecha.isoformat()
+            return (fecha, r.email_usuario, r.cliente_ruc, r.moneda)
+
+        def totals(r):
+            return (int(r.cantidad_operaciones), int(r.cantidad_facturas), round(float(r.monto_total), 2))
+
+        expected = {key(r): totals(r) for r in self.db.execute(self._summary_from_raw_tables())}
+        actual = {key(r): totals(r) for r in self.db.query(ResumenOperacion).all()}
+        differences = []
+        for k in sorted(set(expected) | set(actual)):
+            if expected.get(k) != actual.get(k):
+                differences.append({
+                    "fecha": k[0], "email_usuario": k[1], "cliente_ruc": k[2], "moneda": k[3],
+                    "esperado": expected.get(k), "resumen": actual.get(k),
+                })
+        return differences
+
+    def get_last_login(self, email: str) -> Optional[datetime]:
+        """
+        Fecha del último ingreso guardado del usuario, o None si nunca ingresó.
+        """
+        return self.db.query(Usuario.ultimo_ingreso).filter(Usuario.email == email).scalar()
+
+    def save_last_logins(self, logins: Dict[str, Tuple[str, datetime]]):
+        """
+        Guarda en un solo upsert el último ingreso de varios usuarios
+        (email -> (nombre, fecha)). Un usuario nuevo se crea con su nombre; uno
+        existente solo se actualiza si la fecha es más reciente que la guardada.
+        """
+        if not logins:
+            return
+        stmt = dialect_insert(self.db.get_bind())(Usuario).values([
+            {"email": email, "nombre": name, "ultimo_ingreso": fecha}
+            for email, (name, fecha) in logins.items()
+        ])
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[Usuario.email],
+            set_={"ultimo_ingreso": stmt.excluded.ultimo_ingreso},
+            where=Usuario.ultimo_ingreso.is_(None) | (Usuario.ultimo_ingreso < stmt.excluded.ultimo_ingreso),
+        ))
         self.db.commit()
-        return previous_login
\ No newline at end of file
+
+
+class AsyncOperationRepository:
+    """
+    OperationRepository para una AsyncSession. Cada método ejecuta el del
+    repositorio síncrono con run_sync, así las consultas van por el driver
+    asíncrono (asyncpg/aiosqlite) sin bloquear el event loop y la lógica de
+    guardado y consulta vive en un solo lugar.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await self.db.run_sync(lambda session: getattr(OperationRepository(session), method)(*args, **kwargs))
+
+    async def generar_ids_operacion(self, cantidad: int) -> List[str]:
+        return await self._run("generar_ids_operacion", cantidad)
+
+    async def save_full_operation(self, operation_id: str, metadata: dict, drive_url: str, invoices_data: List[Dict], cavali_results_map: Dict) -> str:
+        return await self._run("save_full_operation", operation_id, metadata, drive_url, invoices_data, cavali_results_map)
+
+    async def save_full_operations(self, operations: List[Dict[str, Any]]) -> List[str]:
+        return await self._run("save_full_operations", operations)
+
+    async def existe_operacion(self, operation_id: str) -> bool:
+        return await self._run("existe_operacion", operation_id)
+
+    async def actualizar_url_drive(self, operation_id: str, drive_url: str):
+        return await self._run("actualizar_url_drive", operation_id, drive_url)
+
+    async def find_processed_invoices(self, keys: List[Tuple[str, str]]) -> Dict[str, Any]:
+        return await self._run("find_processed_invoices", keys)
+
+    async def get_operations_by_user_email(self, email: str, **filters) -> Dict[str, Any]:
+        return await self._run("get_operations_by_user_email", email, **filters)
+
+    async def get_operations_summary(self, email: str, agrupar_por: str, fecha_desde: Optional[date] = None, fecha_hasta: Optional[date] = None) -> List[Dict[str, Any]]:
+        return await self._run("get_operations_summary", email, agrupar_por, fecha_desde, fecha_hasta)
+
+    async def get_last_login(self, email: str) -> Optional[datetime]:
+        return await self._run("get_last_login", email)
+
+    async def save_last_logins(self, logins: Dict[str, Tuple[str, datetime]]):
+        return await self._run("save_last_logins", logins)
@@ -0,0 +1,277 @@
+# orquestador-service-0/resilience.py
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+# --- Configuración ---
+# Intentos por llamada, contando el primero
+HTTP_RETRY_MAX_ATTEMPTS = int(os.getenv("HTTP_RETRY_MAX_ATTEMPTS", "3"))
+# Espera antes de cada reintento: aleatoria entre 0 y base * 2^intento, con tope
+HTTP_RETRY_BASE_SECONDS = float(os.getenv("HTTP_RETRY_BASE_SECONDS", "0.2"))
+HTTP_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_MAX_BACKOFF_SECONDS", "2"))
+# Presupuesto global: en la ventana, los reintentos no superan este porcentaje de las
+# peticiones (más un mínimo por segundo), para no multiplicar la carga de un servicio caído
+HTTP_RETRY_BUDGET_RATIO = float(os.getenv("HTTP_RETRY_BUDGET_RATIO", "0.2"))
+HTTP_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("HTTP_RETRY_BUDGET_MIN_PER_SECOND", "1"))
+HTTP_RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("HTTP_RETRY_BUDGET_WINDOW_SECONDS", "10"))
+# Fallos seguidos que abren el circuito de un servicio y cuánto tiempo queda abierto
+CB_FAILURE_THRESHOLD = int(os.getenv("CB_FAILURE_THRESHOLD", "5"))
+CB_RESET_SECONDS = float(os.getenv("CB_RESET_SECONDS", "30"))
+# Cada cuántos segundos se reintentan las notificaciones postergadas, y cuántas se guardan
+DEFERRED_RETRY_SECONDS = float(os.getenv("DEFERRED_RETRY_SECONDS", "15"))
+DEFERRED_MAX_PENDING = int(os.getenv("DEFERRED_MAX_PENDING", "1000"))
+
+# Respuestas que indican un problema pasajero del servicio
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+CERRADO = "CERRADO"
+ABIERTO = "ABIERTO"
+SEMIABIERTO = "SEMIABIERTO"
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """
+    El circuito del servicio está abierto: la llamada se rechaza sin enviarse.
+    Hereda de httpx.HTTPError para que las etapas la manejen como cualquier otro
+    error de comunicación.
+    """
+
+    def __init__(self, service: str):
+        super().__init__(f"Circuito abierto para el servicio '{service}'")
+        self.service = service
+
+
+class RetryBudget:
+    """
+    Limita los reintentos de todos los servicios juntos a una fracción de las
+    peticiones de los últimos HTTP_RETRY_BUDGET_WINDOW_SECONDS.
+    """
+
+    def __init__(self, ratio: float = HTTP_RETRY_BUDGET_RATIO, min_per_second: float = HTTP_RETRY_BUDGET_MIN_PER_SECOND,
+                 window_seconds: float = HTTP_RETRY_BUDGET_WINDOW_SECONDS):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self.exhausted = 0
+
+    def _prune(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window_seconds:
+                events.popleft()
+
+    def record_request(self):
+        # Se poda también aquí: sin reintentos, try_acquire no se llamaría nunca
+        now = time.monotonic()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        allowed = self.min_per_second * self.window_seconds + self.ratio * len(self._requests)
+        if len(self._retries) >= allowed:
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        return {
+            "window_s": self.window_seconds,
+            "requests_in_window": len(self._requests),
+            "retries_in_window": len(self._retries),
+            "exhausted": self.exhausted,
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un servicio. Tras CB_FAILURE_THRESHOLD fallos seguidos se
+    abre y rechaza las llamadas durante CB_RESET_SECONDS; luego deja pasar una sola
+    llamada de prueba que lo vuelve a cerrar o lo mantiene abierto.
+    """
+
+    def __init__(self, service: str, failure_threshold: int = CB_FAILURE_THRESHOLD, reset_seconds: float = CB_RESET_SECONDS):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CERRADO
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        # Contadores para /metrics/downstream
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def is_open(self) -> bool:
+        """True si las llamadas se rechazarían ahora mismo (sin consumir la prueba)."""
+        if self.state == ABIERTO:
+            return time.monotonic() - self.opened_at < self.reset_seconds
+        return self.state == SEMIABIERTO and self._probe_in_flight
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == ABIERTO and now - self.opened_at >= self.reset_seconds:
+            self.state = SEMIABIERTO
+            self._probe_in_flight = False
+        # Una prueba que nunca terminó (p. ej. una petición cancelada) no bloquea el circuito
+        if self._probe_in_flight and now - self._probe_started >= self.reset_seconds:
+            self._probe_in_flight = False
+        if self.state == ABIERTO or (self.state == SEMIABIERTO and self._probe_in_flight):
+            self.rejected += 1
+            return False
+        if self.state == SEMIABIERTO:
+            self._probe_in_flight = True
+            self._probe_started = now
+        return True
+
+    def record_success(self):
+        if self.state != CERRADO:
+            print(f"--- 🔌 Circuito de '{self.service}' cerrado de nuevo ---")
+        self.state = CERRADO
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == SEMIABIERTO or self.consecutive_failures >= self.failure_threshold:
+            if self.state != ABIERTO:
+                self.times_opened += 1
+                print(f"ADVERTENCIA: Circuito de '{self.service}' abierto tras {self.consecutive_failures} fallos seguidos.")
+            self.state = ABIERTO
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+retry_budget = RetryBudget()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(service: str) -> CircuitBreaker:
+    if service not in _breakers:
+        _breakers[service] = CircuitBreaker(service)
+    return _breakers[service]
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Espera con jitter completo antes del reintento número `attempt` (desde 1)."""
+    return random.uniform(0, min(HTTP_RETRY_MAX_BACKOFF_SECONDS, HTTP_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def is_failure(response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+    """Lo que cuenta como fallo para el circuito: errores de red, timeouts y 5xx."""
+    if error is not None:
+        return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.PoolTimeout)
+    return response.status_code >= 500
+
+
+def is_retryable(response: Optional[httpx.Response], error: Optional[Exception], idempotent: bool) -> bool:
+    """
+    Sin conexión la petición no llegó a enviarse y siempre se puede repetir; un
+    timeout de lectura o un 5xx pasajero solo se repiten si la llamada es idempotente.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if not idempotent:
+        return False
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response.status_code in RETRYABLE_STATUS
+
+
+class DeferredCalls:
+    """
+    Llamadas no críticas (notificaciones) que no se pudieron enviar porque el
+    circuito de su servicio estaba abierto. Se reintentan cada DEFERRED_RETRY_SECONDS
+    hasta que el servicio se recupera, sin retener la operación que las originó.
+    """
+
+    def __init__(self, retry_seconds: float = DEFERRED_RETRY_SECONDS, max_pending: int = DEFERRED_MAX_PENDING):
+        self.retry_seconds = retry_seconds
+        self.max_pending = max_pending
+        self._pending: Deque[Tuple[str, str, Callable[[], Awaitable[Any]]]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def defer(self, service: str, description: str, call: Callable[[], Awaitable[Any]]):
+        if len(self._pending) >= self.max_pending:
+            _, oldest, _ = self._pending.popleft()
+            self.dropped += 1
+            print(f"ADVERTENCIA: Se descarta la llamada postergada más antigua ({oldest}).")
+        self._pending.append((service, description, call))
+        print(f"--- ⏸️  {description} postergada: el circuito de '{service}' está abierto ---")
+
+    async def run_pending(self) -> int:
+        sent = 0
+        for _ in range(len(self._pending)):
+            service, description, call = self._pending.popleft()
+            if get_breaker(service).is_open():
+                self._pending.append((service, description, call))
+                continue
+            try:
+                await call()
+                sent += 1
+                print(f"--- ▶️  {description} enviada tras postergarse ---")
+            except Exception as e:
+                if get_breaker(service).is_open():
+                    # La prueba volvió a abrir el circuito: se mantiene en la cola
+                    self._pending.append((service, description, call))
+                else:
+                    print(f"ADVERTENCIA: Falló {description} postergada. Error: {e}")
+        return sent
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(self.retry_seconds)
+            await self.run_pending()
+
+    def start(self):
+        self._task = asyncio.create_task(self._retry_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.run_pending()
+        if self._pending:
+            print(f"ADVERTENCIA: {len(self._pending)} llamadas postergadas no se enviaron antes de apagar; "
+                  f"quedan pendientes en la bitácora de su envío.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), "dropped": self.dropped}
+
+
+deferred_calls = DeferredCalls()
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "services": {name: breaker.stats() for name, breaker in sorted(_breakers.items())},
+        "retry_budget": retry_budget.stats(),
+        "deferred": deferred_calls.stats(),
+    }
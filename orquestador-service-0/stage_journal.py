@@ -0,0 +1,269 @@
+# orquestador-service-0/stage_journal.py
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, dialect_insert
+from models import EtapaEnvio
+import gcs_uploader
+import pipeline
+from xml_index import XmlContentIndex
+
+# --- Configuración ---
+# Un envío sin etapas con error solo se considera interrumpido (y se puede reanudar)
+# tras este tiempo sin avanzar; debe superar el timeout de la etapa más lenta (Drive)
+ENVIO_RESUME_IDLE_SECONDS = float(os.getenv("ENVIO_RESUME_IDLE_SECONDS", "600"))
+
+ESTADO_COMPLETADO = "COMPLETADO"
+ESTADO_ERROR = "ERROR"
+# Notificación postergada por un circuito abierto: la reenvía resilience.deferred_calls,
+# pero si el proceso se reinicia antes solo queda esta anotación para reanudarla
+ESTADO_POSTERGADO = "POSTERGADO"
+# Resultado de un envío que falló por un error que reanudarlo no cambiaría (facturas
+# ya registradas, ninguna factura válida): no se lista ni se puede reanudar
+ESTADO_FALLIDO = "FALLIDO"
+# Fila "claim" del envío: la ejecución que lo procesa la marca RECLAMADO y la suelta
+# (LIBERADO) al terminar. Si el proceso muere, caduca tras ENVIO_RESUME_IDLE_SECONDS
+# sin anotar nada, igual que un envío sin avanzar se considera interrumpido.
+ETAPA_RECLAMO = "claim"
+ESTADO_RECLAMADO = "RECLAMADO"
+ESTADO_LIBERADO = "LIBERADO"
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite devuelve fechas sin zona horaria (CURRENT_TIMESTAMP está en UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class DbStageJournal(pipeline.StageJournal):
+    """
+    Bitácora de un envío en la tabla etapas_envio. Cada anotación usa su propia
+    sesión: las etapas en paralelo (Excel y CAVALI) pueden anotar a la vez y lo
+    anotado no depende de la transacción del pipeline.
+    """
+
+    def __init__(self, envio_id: str, rows: List[EtapaEnvio] = ()):
+        self.envio_id = envio_id
+        self._claimed = False
+        self.stages: Dict[str, Dict[str, Any]] = {
+            r.etapa: {"estado": r.estado, "salida": r.salida, "error": r.error, "actualizado": _as_utc(r.fecha_actualizacion)}
+            for r in rows
+        }
+
+    @classmethod
+    async def load(cls, db: AsyncSession, envio_id: str) -> "DbStageJournal":
+        rows = (await db.execute(select(EtapaEnvio).where(EtapaEnvio.id_envio == envio_id))).scalars().all()
+        return cls(envio_id, rows)
+
+    def completed(self, name: str) -> Optional[Dict[str, Any]]:
+        stage = self.stages.get(name)
+        return stage["salida"] if stage and stage["estado"] == ESTADO_COMPLETADO else None
+
+    async def record(self, name: str, output: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        await self._save(name, ESTADO_ERROR if error else ESTADO_COMPLETADO, output, error)
+
+    async def record_deferred(self, name: str, output: Dict[str, Any]):
+        await self._save(name, ESTADO_POSTERGADO, output)
+
+    async def record_failure(self, error: str):
+        await self._save(pipeline.ETAPA_RESULTADO, ESTADO_FALLIDO, error=error)
+
+    async def claim(self) -> bool:
+        """
+        Reserva el envío con un upsert condicional: solo lo consigue si nadie lo
+        tiene reclamado o si el reclamo anterior caducó.
+        """
+        now = datetime.now(timezone.utc)
+        expired = now - timedelta(seconds=ENVIO_RESUME_IDLE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            stmt = dialect_insert(db.get_bind())(EtapaEnvio).values(
+                id_envio=self.envio_id, etapa=ETAPA_RECLAMO, estado=ESTADO_RECLAMADO, fecha_actualizacion=now,
+            )
+            claimed = (await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[EtapaEnvio.id_envio, EtapaEnvio.etapa],
+                    set_={"estado": ESTADO_RECLAMADO, "fecha_actualizacion": now},
+                    where=or_(EtapaEnvio.estado != ESTADO_RECLAMADO, EtapaEnvio.fecha_actualizacion < expired),
+                ).returning(EtapaEnvio.id_envio)
+            )).scalar()
+            await db.commit()
+        self._claimed = claimed is not None
+        return self._claimed
+
+    async def release(self):
+        if not self._claimed:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(self._claim_row().values(estado=ESTADO_LIBERADO))
+            await db.commit()
+        self._claimed = False
+
+    def _claim_row(self):
+        return update(EtapaEnvio).where(
+            EtapaEnvio.id_envio == self.envio_id, EtapaEnvio.etapa == ETAPA_RECLAMO, EtapaEnvio.estado == ESTADO_RECLAMADO,
+        )
+
+    async def _save(self, name: str, estado: str, output: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+                    email_usuario: Optional[str] = None):
+        async with AsyncSessionLocal() as db:
+            await db.merge(EtapaEnvio(
+                id_envio=self.envio_id, etapa=name, estado=estado, salida=output, error=error, email_usuario=email_usuario
+            ))
+            if self._claimed:
+                # Cada avance renueva el reclamo: una etapa larga no lo deja caducar
+                await db.execute(self._claim_row().values(fecha_actualizacion=datetime.now(timezone.utc)))
+            await db.commit()
+        self.stages[name] = {"estado": estado, "salida": output, "error": error, "actualizado": datetime.now(timezone.utc)}
+
+    async def record_submission(self, submission: pipeline.Submission):
+        """
+        Anota lo necesario para reanudar el envío: metadata, rutas de los archivos
+        en GCS y reenvíos detectados. Solo se llama con la subida ya terminada.
+        """
+        await self._save(pipeline.ETAPA_RECEPCION, ESTADO_COMPLETADO, {
+            **submission.to_dict(), "existing_operations": submission.existing_operations,
+        }, email_usuario=submission.metadata.get("user_email"))
+
+    # --- Estado del envío ---
+    @property
+    def submission_data(self) -> Optional[Dict[str, Any]]:
+        return self.completed(pipeline.ETAPA_RECEPCION)
+
+    @property
+    def finished(self) -> bool:
+        return self.completed(pipeline.ETAPA_RESULTADO) is not None
+
+    @property
+    def failed_permanently(self) -> bool:
+        stage = self.stages.get(pipeline.ETAPA_RESULTADO)
+        return stage is not None and stage["estado"] == ESTADO_FALLIDO
+
+    def failed_stages(self) -> List[str]:
+        return [name for name, stage in self.stages.items() if stage["estado"] in (ESTADO_ERROR, ESTADO_FALLIDO)]
+
+    def deferred_stages(self) -> List[str]:
+        return [name for name, stage in self.stages.items() if stage["estado"] == ESTADO_POSTERGADO]
+
+    def last_update(self) -> Optional[datetime]:
+        dates = [s["actualizado"] for s in self.stages.values() if s["actualizado"]]
+        return max(dates) if dates else None
+
+    def interrupted(self) -> bool:
+        """
+        Sin terminar y con alguna etapa fallida, o sin avanzar hace ENVIO_RESUME_IDLE_SECONDS.
+        Uno terminado solo si le quedan notificaciones: las que fallaron enseguida y
+        las postergadas pasado ese tiempo (si siguen postergadas, se perdieron con un
+        reinicio del proceso). Uno que falló de forma definitiva nunca.
+        """
+        if self.failed_permanently:
+            return False
+        last_update = self.last_update()
+        idle = last_update is None or datetime.now(timezone.utc) - last_update >= timedelta(seconds=ENVIO_RESUME_IDLE_SECONDS)
+        if self.finished:
+            # Terminado, solo las notificaciones pueden seguir con error o postergadas
+            return bool(self.failed_stages()) or (bool(self.deferred_stages()) and idle)
+        return bool(self.failed_stages()) or idle
+
+    def summary(self) -> Dict[str, Any]:
+        data = self.submission_data or {}
+        last_update = self.last_update()
+        return {
+            "submission_id": self.envio_id,
+            "upload_id": data.get("upload_id"),
+            "user_email": (data.get("metadata") or {}).get("user_email"),
+            "finished": self.finished,
+            "failed_permanently": self.failed_permanently,
+            "completed_stages": [name for name, s in self.stages.items() if s["estado"] == ESTADO_COMPLETADO],
+            "failed_stages": {name: self.stages[name]["error"] for name in self.failed_stages()},
+            "deferred_stages": self.deferred_stages(),
+            "updated_at": last_update.isoformat() if last_update else None,
+        }
+
+
+async def start(envio_id: str, submission: pipeline.Submission) -> DbStageJournal:
+    """Abre la bitácora de un envío recién subido a GCS."""
+    journal = DbStageJournal(envio_id)
+    await journal.record_submission(submission)
+    return journal
+
+
+async def load_submission(journal: DbStageJournal, bucket) -> pipeline.Submission:
+    """
+    Reconstruye el envío desde la bitácora. Los XML solo se vuelven a descargar de
+    GCS si alguna etapa que los lee (parser o CAVALI) quedó pendiente.
+    """
+    data = dict(journal.submission_data)
+    existing_operations = data.pop("existing_operations", [])
+    submission = pipeline.Submission(**data, existing_operations=existing_operations)
+    if journal.completed("parse") is None or journal.completed("cavali") is None:
+        submission.xml_index = XmlContentIndex.from_contents(await gcs_uploader.download_files(bucket, submission.xml_paths))
+    return submission
+
+
+async def resume(db: AsyncSession, journal: DbStageJournal, bucket, tracker: pipeline.StageTracker = None) -> Dict[str, Any]:
+    """
+    Continúa un envío interrumpido desde su primera etapa pendiente. Si ya había
+    terminado devuelve su respuesta sin repetir nada, salvo las notificaciones que
+    fallaron o quedaron postergadas.
+    """
+    if journal.submission_data is None:
+        raise HTTPException(status_code=404, detail=f"No se encontró el envío '{journal.envio_id}'.")
+    if journal.finished and not journal.failed_stages() and not journal.deferred_stages():
+        return journal.completed(pipeline.ETAPA_RESULTADO)
+    if journal.failed_permanently:
+        detail = journal.stages[pipeline.ETAPA_RESULTADO]["error"]
+        raise HTTPException(status_code=409, detail=f"El envío '{journal.envio_id}' falló y no se puede reanudar: {detail}")
+    if not journal.interrupted():
+        raise HTTPException(status_code=409, detail=f"El envío '{journal.envio_id}' todavía se está procesando.")
+    print(f"--- 🔁 Reanudando envío {journal.envio_id}. Etapas ya completadas: {journal.summary()['completed_stages']} ---")
+    submission = await load_submission(journal, bucket)
+    return await pipeline.run_submission(db, submission, tracker, journal)
+
+
+async def list_interrupted(db: AsyncSession, email: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Envíos que quedaron a medias (ver DbStageJournal.interrupted), del más reciente
+    al más antiguo. Con email, solo los de ese usuario. El filtro, el orden y el
+    límite se resuelven en SQL; solo se cargan las etapas de los envíos elegidos.
+    """
+    def any_stage(condition):
+        return func.max(case((condition, 1), else_=0))
+
+    uploads = select(EtapaEnvio.id_envio).where(EtapaEnvio.etapa == pipeline.ETAPA_RECEPCION)
+    if email:
+        uploads = uploads.where(EtapaEnvio.email_usuario == email)
+
+    es_resultado = EtapaEnvio.etapa == pipeline.ETAPA_RESULTADO
+    actualizado = func.max(EtapaEnvio.fecha_actualizacion)
+    finished = any_stage(and_(es_resultado, EtapaEnvio.estado == ESTADO_COMPLETADO)) == 1
+    idle = actualizado <= datetime.now(timezone.utc) - timedelta(seconds=ENVIO_RESUME_IDLE_SECONDS)
+    selected = (
+        select(EtapaEnvio.id_envio)
+        .where(EtapaEnvio.id_envio.in_(uploads))
+        .group_by(EtapaEnvio.id_envio)
+        .having(
+            any_stage(and_(es_resultado, EtapaEnvio.estado == ESTADO_FALLIDO)) == 0,
+            or_(
+                any_stage(EtapaEnvio.estado == ESTADO_ERROR) == 1,
+                and_(~finished, idle),
+                and_(finished, any_stage(EtapaEnvio.estado == ESTADO_POSTERGADO) == 1, idle),
+            ),
+        )
+        .order_by(actualizado.desc())
+        .limit(limit)
+    )
+    envio_ids = (await db.execute(selected)).scalars().all()
+    if not envio_ids:
+        return []
+
+    rows = (await db.execute(select(EtapaEnvio).where(EtapaEnvio.id_envio.in_(envio_ids)))).scalars().all()
+    rows_by_envio: Dict[str, List[EtapaEnvio]] = {envio_id: [] for envio_id in envio_ids}
+    for row in rows:
+        rows_by_envio[row.id_envio].append(row)
+    return [DbStageJournal(envio_id, envio_rows).summary() for envio_id, envio_rows in rows_by_envio.items()]
@@ -0,0 +1,128 @@
+# orquestador-service-0/tests/conftest.py
+"""
+Fixtures de las pruebas del orquestador: una base SQLite temporal (DATABASE_URL se
+fija antes de importar database, así nunca se toca otra base) y los microservicios
+simulados con httpx.MockTransport.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+
+import httpx
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# tracing.py vive en shared/, común a todos los servicios
+sys.path[:0] = [SERVICE_DIR, os.path.join(os.path.dirname(SERVICE_DIR), "shared")]
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pruebas.sqlite')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+import database  # noqa: E402
+import http_client  # noqa: E402
+import models  # noqa: E402
+import pipeline  # noqa: E402
+import resilience  # noqa: E402
+
+CLIENT_RUC = "20500000001"
+DEBTOR_RUC = "20100000001"
+METADATA = {
+    "user_email": "ejecutivo@capital.pe",
+    "mailVerificacion": "verificacion@capital.pe",
+    "tasaOperacion": 1.5,
+    "comision": 10,
+    "solicitudAdelanto": {},
+    "cuentasDesembolso": [],
+}
+
+
+def run(coro):
+    """Ejecuta una corrutina y libera las conexiones del pool, atadas a su event loop."""
+    async def _run():
+        try:
+            return await coro
+        finally:
+            await database.close_engines()
+    return asyncio.run(_run())
+
+
+@pytest.fixture
+def db():
+    """Esquema completo y tablas vacías en cada prueba."""
+    engine = database.get_engine()
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    yield engine
+
+
+class FakeServices:
+    """
+    Parser, Excel, CAVALI, Drive, Gmail y Trello simulados. Cada llamada se anota en
+    calls con el nombre del servicio; los de failing responden 503.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+        # Moneda de cada XML por nombre de archivo (PEN si no se indica)
+        self.currencies = {}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        service = request.url.host
+        self.calls.append(service)
+        if service in self.failing:
+            return httpx.Response(503, json={"detail": f"{service} no disponible"})
+        if service == "parser":
+            return httpx.Response(200, json={"results": [self._parse(i, path) for i, path in enumerate(self._xml_paths(request))]})
+        if service == "drive":
+            operations = json.loads(request.content)["operations"]
+            return httpx.Response(200, json={"operations": {
+                o["operation_id"]: {"drive_folder_url": f"https://drive/{o['operation_id']}"} for o in operations
+            }})
+        return httpx.Response(200, json={"results": {}})
+
+    @staticmethod
+    def _xml_paths(request: httpx.Request):
+        if request.headers["content-type"].startswith("multipart"):
+            return [name.decode() for name in re.findall(rb'filename="([^"]+)"', request.read())]
+        return json.loads(request.content)["xml_paths"]
+
+    def _parse(self, position: int, path: str):
+        filename = os.path.basename(path)
+        return {
+            "status": "SUCCESS", "xml_path": path, "xml_index": position,
+            "parsed_invoice_data": {
+                "document_id": f"F001-{os.path.splitext(filename)[0]}", "currency": self.currencies.get(filename, "PEN"),
+                "client_ruc": CLIENT_RUC, "client_name": "Cliente SAC",
+                "debtor_ruc": DEBTOR_RUC, "debtor_name": "Deudor SAC",
+                "total_amount": 118.0, "net_amount": 100.0,
+                "issue_date": "2024-01-01T00:00:00", "due_date": "2024-02-01T00:00:00",
+            },
+        }
+
+
+@pytest.fixture
+def services(monkeypatch):
+    fake = FakeServices()
+    for name in ("parser", "excel", "cavali", "drive", "gmail", "trello"):
+        monkeypatch.setattr(pipeline, f"{name.upper()}_SERVICE_URL", f"http://{name}/{name}")
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(fake.handler)))
+    monkeypatch.setattr(resilience, "HTTP_RETRY_BASE_SECONDS", 0)
+    resilience._breakers.clear()
+    yield fake
+    resilience._breakers.clear()
+
+
+def make_submission(*names: str) -> pipeline.Submission:
+    contents = {f"{name}.xml": f"<Invoice><ID>{name}</ID></Invoice>".encode() for name in names}
+    return pipeline.Submission(
+        upload_id="OP-PRUEBA", metadata=dict(METADATA),
+        xml_paths=[f"gs://bucket/xml/{filename}" for filename in contents],
+        pdf_paths=[], respaldo_paths=[],
+        xml_index=pipeline.XmlContentIndex.from_contents(contents),
+    )
@@ -0,0 +1,62 @@
+# orquestador-service-0/tests/test_id_allocator.py
+"""
+Reservas concurrentes de IDs de operación contra una base SQLite en disco: ningún
+ID se repite, cada bloque es consecutivo y la numeración del día no tiene huecos.
+"""
+import os
+import sys
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base  # noqa: E402
+import models  # noqa: E402  (registra las tablas en Base.metadata)
+from id_allocator import OperationIdAllocator  # noqa: E402
+
+HILOS = 8
+RESERVAS_POR_HILO = 25
+BLOQUE = 2
+
+
+def _numero(op_id: str) -> int:
+    return int(op_id.rsplit('-', 1)[1])
+
+
+def test_reservas_concurrentes_sin_repetidos_ni_huecos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ids.sqlite'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    allocator = OperationIdAllocator(engine)
+    fecha = datetime(2099, 1, 1)
+
+    def worker(_):
+        return [allocator.reserve(BLOQUE, fecha) for _ in range(RESERVAS_POR_HILO)]
+
+    with ThreadPoolExecutor(max_workers=HILOS) as executor:
+        bloques = [b for result in executor.map(worker, range(HILOS)) for b in result]
+    engine.dispose()
+
+    ids = [op_id for bloque in bloques for op_id in bloque]
+    esperados = HILOS * RESERVAS_POR_HILO * BLOQUE
+    assert len(set(ids)) == len(ids) == esperados
+    assert sorted(_numero(op_id) for op_id in ids) == list(range(1, esperados + 1))
+    for bloque in bloques:
+        primero = _numero(bloque[0])
+        assert [_numero(op_id) for op_id in bloque] == list(range(primero, primero + BLOQUE))
+        assert all(op_id.startswith("OP-20990101-") for op_id in bloque)
+
+
+def test_el_contador_sigue_al_mayor_numero_existente(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ids.sqlite'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(models.Empresa.__table__.insert(), [{"ruc": "20500000001", "razon_social": "Cliente SAC"}])
+        # Como texto "OP-20990101-1000" < "OP-20990101-999"
+        conn.execute(models.Operacion.__table__.insert(), [
+            {"id": f"OP-20990101-{n:03d}", "cliente_ruc": "20500000001"} for n in (7, 999, 1000)
+        ])
+
+    assert OperationIdAllocator(engine).reserve(2, datetime(2099, 1, 1)) == ["OP-20990101-1001", "OP-20990101-1002"]
+    engine.dispose()
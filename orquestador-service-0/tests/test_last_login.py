@@ -0,0 +1,81 @@
+# orquestador-service-0/tests/test_last_login.py
+"""
+Último ingreso de los usuarios: se acumula en memoria, se guarda en un solo upsert
+al vaciar la cola (o al apagar) y un ingreso viejo nunca pisa uno más reciente.
+"""
+from datetime import datetime
+
+import database
+from database import AsyncSessionLocal
+from last_login import LastLoginTracker
+from models import Usuario
+from repository import AsyncOperationRepository
+from conftest import run
+
+
+async def _record(tracker: LastLoginTracker, email: str, name: str = "Ana"):
+    async with AsyncSessionLocal() as db:
+        return await tracker.record(AsyncOperationRepository(db), email, name)
+
+
+def _saved():
+    with database.SessionLocal() as session:
+        return {u.email: (u.nombre, u.ultimo_ingreso) for u in session.query(Usuario)}
+
+
+def test_ingresos_se_guardan_juntos_al_vaciar_la_cola(db):
+    tracker = LastLoginTracker()
+    assert run(_record(tracker, "ana@capital.pe")) is None
+    primero = tracker._last_login["ana@capital.pe"]
+    assert run(_record(tracker, "ana@capital.pe")) == primero
+    run(_record(tracker, "luis@capital.pe", "Luis"))
+    assert _saved() == {}
+
+    assert run(tracker.flush()) == 2
+    saved = _saved()
+    assert saved["ana@capital.pe"] == ("Ana", tracker._last_login["ana@capital.pe"])
+    assert set(saved) == {"ana@capital.pe", "luis@capital.pe"}
+    assert run(tracker.flush()) == 0
+
+    # Otro proceso lee el ingreso guardado la primera vez que ve al usuario
+    assert run(_record(LastLoginTracker(), "ana@capital.pe")) == saved["ana@capital.pe"][1]
+
+
+def test_ingreso_viejo_no_pisa_uno_reciente(db):
+    async def _save(fecha):
+        async with AsyncSessionLocal() as session:
+            await AsyncOperationRepository(session).save_last_logins({"ana@capital.pe": ("Ana", fecha)})
+
+    run(_save(datetime(2024, 1, 2)))
+    run(_save(datetime(2024, 1, 1)))
+    assert _saved()["ana@capital.pe"][1] == datetime(2024, 1, 2)
+    run(_save(datetime(2024, 1, 3)))
+    assert _saved()["ana@capital.pe"][1] == datetime(2024, 1, 3)
+
+
+class BrokenSession:
+    """Sesión cuya base no responde: falla la consulta, no la apertura."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run_sync(self, fn):
+        raise ConnectionError("base caída")
+
+    async def rollback(self):
+        pass
+
+
+def test_flush_fallido_devuelve_los_ingresos_a_la_cola(db):
+    tracker = LastLoginTracker(session_factory=BrokenSession)
+    run(_record(tracker, "ana@capital.pe"))
+    assert run(tracker.flush()) == 0
+    assert "ana@capital.pe" in tracker._pending
+
+    # Se guarda al apagar, con la base de vuelta
+    tracker.session_factory = AsyncSessionLocal
+    run(tracker.stop())
+    assert "ana@capital.pe" in _saved() and tracker._pending == {}
@@ -0,0 +1,74 @@
+# orquestador-service-0/tests/test_operations_pagination.py
+"""
+Listado de operaciones por cursor: cada página sigue a la anterior por
+(fecha_creacion, id) sin repetir ni saltar operaciones, aunque entren nuevas.
+"""
+from datetime import datetime
+
+import pytest
+
+import database
+from models import Empresa, Operacion
+from repository import ADMIN_EMAIL, OperationRepository, decode_operations_cursor
+from conftest import CLIENT_RUC
+
+EMAIL = "ejecutivo@capital.pe"
+
+
+def _add_operations(*operations):
+    with database.SessionLocal() as session:
+        if session.get(Empresa, CLIENT_RUC) is None:
+            session.add(Empresa(ruc=CLIENT_RUC, razon_social="Cliente SAC"))
+        for operation_id, email, fecha, moneda in operations:
+            session.add(Operacion(
+                id=operation_id, cliente_ruc=CLIENT_RUC, email_usuario=email,
+                fecha_creacion=fecha, moneda_sumatoria=moneda, monto_sumatoria_total=100.0,
+            ))
+        session.commit()
+
+
+def _pages(email: str, limit: int, **filters):
+    pages, cursor = [], None
+    while True:
+        with database.SessionLocal() as session:
+            page = OperationRepository(session).get_operations_by_user_email(email, limit=limit, cursor=cursor, **filters)
+        pages.append([op["id"] for op in page["operations"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def operaciones(db):
+    # Dos operaciones con la misma fecha: el id desempata el orden
+    _add_operations(
+        ("OP-20240101-001", EMAIL, datetime(2024, 1, 1, 9), "PEN"),
+        ("OP-20240101-002", EMAIL, datetime(2024, 1, 1, 9), "USD"),
+        ("OP-20240102-001", EMAIL, datetime(2024, 1, 2, 9), "PEN"),
+        ("OP-20240103-001", "otro@capital.pe", datetime(2024, 1, 3, 9), "PEN"),
+        ("OP-20240104-001", EMAIL, datetime(2024, 1, 4, 9), "PEN"),
+    )
+
+
+def test_paginas_en_orden_sin_repetidos(operaciones):
+    assert _pages(EMAIL, limit=2) == [["OP-20240104-001", "OP-20240102-001"], ["OP-20240101-002", "OP-20240101-001"]]
+    assert sum(_pages(ADMIN_EMAIL, limit=3), []) == [
+        "OP-20240104-001", "OP-20240103-001", "OP-20240102-001", "OP-20240101-002", "OP-20240101-001",
+    ]
+    assert _pages(EMAIL, limit=10, moneda="PEN") == [["OP-20240104-001", "OP-20240102-001", "OP-20240101-001"]]
+
+
+def test_operacion_nueva_no_desplaza_la_pagina_siguiente(operaciones):
+    with database.SessionLocal() as session:
+        first = OperationRepository(session).get_operations_by_user_email(EMAIL, limit=2)
+    _add_operations(("OP-20240105-001", EMAIL, datetime(2024, 1, 5, 9), "PEN"))
+
+    with database.SessionLocal() as session:
+        second = OperationRepository(session).get_operations_by_user_email(EMAIL, limit=2, cursor=first["next_cursor"])
+    assert [op["id"] for op in second["operations"]] == ["OP-20240101-002", "OP-20240101-001"]
+    assert second["next_cursor"] is None
+
+
+def test_cursor_invalido():
+    with pytest.raises(ValueError):
+        decode_operations_cursor("no-es-un-cursor")
@@ -0,0 +1,75 @@
+# orquestador-service-0/tests/test_operations_summary.py
+"""
+Resumen de operaciones: cada operación guardada suma a su fila del día en la misma
+transacción, una que falla no suma nada y rebuild/check lo reconcilian con las tablas.
+"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import database
+from models import ResumenOperacion
+from repository import ADMIN_EMAIL, OperationRepository
+from conftest import CLIENT_RUC, DEBTOR_RUC, METADATA
+
+
+def _invoice(number: str, currency: str, amount: float):
+    return {
+        "document_id": f"F001-{number}", "currency": currency, "xml_filename": f"{number}.xml",
+        "client_ruc": CLIENT_RUC, "client_name": "Cliente SAC", "debtor_ruc": DEBTOR_RUC, "debtor_name": "Deudor SAC",
+        "total_amount": amount, "net_amount": amount, "issue_date": "2024-01-01T00:00:00",
+    }
+
+
+def _save(operation_id: str, *invoices, metadata=METADATA):
+    with database.SessionLocal() as session:
+        OperationRepository(session).save_full_operation(operation_id, metadata, "https://drive", list(invoices), {})
+
+
+def _summary(agrupar_por: str, email=METADATA["user_email"]):
+    with database.SessionLocal() as session:
+        return OperationRepository(session).get_operations_summary(email, agrupar_por)
+
+
+def test_cada_operacion_suma_al_resumen(db):
+    _save("OP-1", _invoice("1", "PEN", 100), _invoice("2", "PEN", 50))
+    _save("OP-2", _invoice("3", "PEN", 25))
+    _save("OP-3", _invoice("4", "USD", 10))
+    _save("OP-4", _invoice("5", "PEN", 5), metadata={**METADATA, "user_email": "otro@capital.pe"})
+
+    assert _summary("moneda") == [
+        {"moneda": "PEN", "cantidad_operaciones": 2, "cantidad_facturas": 3, "monto_total": 175.0},
+        {"moneda": "USD", "cantidad_operaciones": 1, "cantidad_facturas": 1, "monto_total": 10.0},
+    ]
+    por_ejecutivo = _summary("ejecutivo", email=ADMIN_EMAIL)
+    assert [(r["ejecutivo"], r["moneda"], r["cantidad_operaciones"]) for r in por_ejecutivo] == [
+        ("ejecutivo@capital.pe", "PEN", 2), ("ejecutivo@capital.pe", "USD", 1), ("otro@capital.pe", "PEN", 1),
+    ]
+    assert [r["razon_social"] for r in _summary("cliente")] == ["Cliente SAC", "Cliente SAC"]
+    with database.SessionLocal() as session:
+        assert OperationRepository(session).check_operations_summary() == []
+
+
+def test_operacion_rechazada_no_suma(db):
+    _save("OP-1", _invoice("1", "PEN", 100))
+    # La misma factura (emisor + número) ya está registrada: se revierte todo
+    with pytest.raises(IntegrityError):
+        _save("OP-2", _invoice("1", "PEN", 100))
+
+    assert [r["cantidad_operaciones"] for r in _summary("moneda")] == [1]
+
+
+def test_rebuild_corrige_un_resumen_desactualizado(db):
+    _save("OP-1", _invoice("1", "PEN", 100))
+    _save("OP-2", _invoice("2", "USD", 10))
+    with database.SessionLocal() as session:
+        session.query(ResumenOperacion).filter(ResumenOperacion.moneda == "USD").delete()
+        session.query(ResumenOperacion).update({ResumenOperacion.monto_total: 1})
+        session.commit()
+
+    with database.SessionLocal() as session:
+        repo = OperationRepository(session)
+        differences = repo.check_operations_summary()
+        assert sorted(d["moneda"] for d in differences) == ["PEN", "USD"]
+        assert repo.rebuild_operations_summary() == 2
+        assert repo.check_operations_summary() == []
+    assert [r["monto_total"] for r in _summary("moneda")] == [100.0, 10.0]
@@ -0,0 +1,107 @@
+# orquestador-service-0/tests/test_resilience.py
+"""
+Circuit breakers, presupuesto de reintentos y notificaciones postergadas de las
+llamadas a los microservicios.
+"""
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import http_client
+import resilience
+from resilience import ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, DeferredCalls, RetryBudget
+from conftest import run
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_circuito_se_abre_y_deja_pasar_una_sola_prueba(clock):
+    breaker = CircuitBreaker("drive", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == ABIERTO and not breaker.allow()
+
+    clock.value += 30
+    assert breaker.allow() and breaker.state == SEMIABIERTO
+    assert not breaker.allow()  # la prueba sigue en curso
+    breaker.record_failure()
+    assert breaker.state == ABIERTO and breaker.is_open()
+
+    clock.value += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CERRADO and breaker.allow()
+    # Se abrió dos veces: tras los fallos seguidos y al fallar la prueba
+    assert breaker.stats()["times_opened"] == 2 and breaker.stats()["rejected"] == 2
+
+
+def test_presupuesto_de_reintentos_por_ventana(clock):
+    budget = RetryBudget(ratio=0.2, min_per_second=0.1, window_seconds=10)
+    for _ in range(10):
+        budget.record_request()
+    # 1 por el mínimo (0.1/s en 10 s) más el 20 % de 10 peticiones
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert budget.exhausted == 1
+
+    # Pasada la ventana se olvidan peticiones y reintentos
+    clock.value += 11
+    assert budget.stats()["requests_in_window"] == 0 and budget.try_acquire()
+
+
+def test_reintenta_solo_llamadas_idempotentes(services, monkeypatch):
+    monkeypatch.setattr(resilience, "retry_budget", RetryBudget())
+    services.failing.add("drive")
+
+    response = run(http_client.request("POST", "http://drive/drive", service="drive", idempotent=True, json={}))
+    assert response.status_code == 503
+    assert services.calls == ["drive"] * resilience.HTTP_RETRY_MAX_ATTEMPTS
+
+    services.calls.clear()
+    run(http_client.request("POST", "http://drive/drive", service="drive", json={}))
+    assert services.calls == ["drive"]
+
+
+def test_circuito_abierto_no_envia_la_llamada(services, monkeypatch):
+    monkeypatch.setattr(resilience, "retry_budget", RetryBudget())
+    services.failing.add("trello")
+    for _ in range(resilience.CB_FAILURE_THRESHOLD):
+        run(http_client.request("POST", "http://trello/trello", service="trello", json={}))
+
+    services.calls.clear()
+    with pytest.raises(resilience.CircuitOpenError):
+        run(http_client.request("POST", "http://trello/trello", service="trello", json={}))
+    assert services.calls == []
+    assert resilience.snapshot()["services"]["trello"]["state"] == ABIERTO
+
+
+def test_postergadas_se_envian_cuando_el_circuito_se_cierra(clock, monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    breaker = resilience.get_breaker("gmail")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    sent = []
+
+    async def _call(name):
+        sent.append(name)
+
+    deferred = DeferredCalls(max_pending=2)
+    for name in ("a", "b", "c"):
+        deferred.defer("gmail", f"correo {name}", lambda name=name: _call(name))
+    assert deferred.stats() == {"pending": 2, "dropped": 1}
+
+    assert run(deferred.run_pending()) == 0 and sent == []
+    clock.value += breaker.reset_seconds
+    breaker.record_success()
+    assert run(deferred.run_pending()) == 2
+    assert sent == ["b", "c"] and deferred.stats()["pending"] == 0
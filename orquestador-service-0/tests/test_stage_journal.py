@@ -0,0 +1,156 @@
+# orquestador-service-0/tests/test_stage_journal.py
+"""
+Bitácora de etapas: qué envíos quedan interrumpidos y qué se repite al reanudarlos.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import pipeline
+import resilience
+import stage_journal
+from database import AsyncSessionLocal
+from conftest import make_submission, run
+
+
+async def _submit(envio_id: str, submission: pipeline.Submission):
+    """Procesa el envío como POST /submit-operation; devuelve el resultado o la excepción."""
+    journal = await stage_journal.start(envio_id, submission)
+    async with AsyncSessionLocal() as db:
+        try:
+            return await pipeline.run_submission(db, submission, journal=journal)
+        except Exception as e:
+            return e
+
+
+async def _load(envio_id: str) -> stage_journal.DbStageJournal:
+    async with AsyncSessionLocal() as db:
+        return await stage_journal.DbStageJournal.load(db, envio_id)
+
+
+async def _resume(envio_id: str):
+    async with AsyncSessionLocal() as db:
+        journal = await stage_journal.DbStageJournal.load(db, envio_id)
+        return await stage_journal.resume(db, journal, bucket=None)
+
+
+async def _list(email=None):
+    async with AsyncSessionLocal() as db:
+        return await stage_journal.list_interrupted(db, email=email)
+
+
+def test_reanudar_repite_solo_las_etapas_pendientes(db, services):
+    services.failing.add("drive")
+    error = run(_submit("envio-drive", make_submission("a", "b")))
+    assert isinstance(error, Exception)
+
+    journal = run(_load("envio-drive"))
+    assert journal.interrupted() and journal.failed_stages() == ["drive"]
+    assert [s["submission_id"] for s in run(_list())] == ["envio-drive"]
+
+    services.failing.clear()
+    services.calls.clear()
+    result = run(_resume("envio-drive"))
+
+    assert len(result["operations"]) == 1
+    # Parser, Excel, CAVALI y los IDs se reutilizan de la bitácora
+    assert sorted(services.calls) == ["drive", "gmail", "trello"]
+    assert not run(_load("envio-drive")).interrupted()
+    assert run(_list()) == []
+
+
+def test_notificacion_fallida_se_reintenta_al_reanudar(db, services):
+    services.failing.add("gmail")
+    result = run(_submit("envio-gmail", make_submission("a")))
+    operation_id = result["operations"][0]["operation_id"]
+
+    journal = run(_load("envio-gmail"))
+    assert journal.finished
+    assert journal.failed_stages() == [f"gmail_{operation_id}"]
+    assert journal.interrupted()
+    assert [s["submission_id"] for s in run(_list())] == ["envio-gmail"]
+
+    services.failing.clear()
+    services.calls.clear()
+    assert run(_resume("envio-gmail")) == result
+
+    # Solo se reenvía el canal que falló
+    assert services.calls == ["gmail"]
+    journal = run(_load("envio-gmail"))
+    assert journal.completed(f"gmail_{operation_id}") == {"status": pipeline.NOTIFICACION_ENVIADA}
+    assert not journal.interrupted()
+    assert run(_list()) == []
+
+    services.calls.clear()
+    assert run(_resume("envio-gmail")) == result
+    assert services.calls == []
+
+
+def test_envio_sin_facturas_validas_no_se_puede_reanudar(db, services, monkeypatch):
+    monkeypatch.setattr(services, "_parse", lambda position, path: {"status": "ERROR", "xml_path": path, "xml_index": position})
+    error = run(_submit("envio-invalido", make_submission("a")))
+    assert getattr(error, "status_code", None) == 400
+
+    journal = run(_load("envio-invalido"))
+    assert journal.failed_permanently and not journal.interrupted()
+    assert run(_list()) == []
+    with pytest.raises(HTTPException) as exc:
+        run(_resume("envio-invalido"))
+    assert exc.value.status_code == 409
+
+
+def test_listado_filtra_por_usuario(db, services):
+    services.failing.add("drive")
+    run(_submit("envio-usuario", make_submission("a")))
+
+    assert [s["submission_id"] for s in run(_list("ejecutivo@capital.pe"))] == ["envio-usuario"]
+    assert run(_list("otro@capital.pe")) == []
+
+
+def test_reanudar_un_envio_reclamado_da_409(db, services):
+    services.failing.add("drive")
+    run(_submit("envio-reclamado", make_submission("a")))
+    services.failing.clear()
+    services.calls.clear()
+
+    async def _resume_twice():
+        return await asyncio.gather(_resume("envio-reclamado"), _resume("envio-reclamado"), return_exceptions=True)
+
+    results = run(_resume_twice())
+    conflicts = [r for r in results if isinstance(r, HTTPException)]
+    assert len(conflicts) == 1 and conflicts[0].status_code == 409
+    # Drive y las notificaciones se ejecutaron una sola vez
+    assert sorted(services.calls) == ["drive", "gmail", "trello"]
+
+    # Al terminar se suelta el reclamo; mientras otra ejecución lo tiene, se rechaza
+    other = run(_load("envio-reclamado"))
+    assert run(other.claim())
+    with pytest.raises(HTTPException) as exc:
+        run(pipeline.run_submission(None, make_submission("a"), journal=run(_load("envio-reclamado"))))
+    assert exc.value.status_code == 409
+    run(other.release())
+    assert run(run(_load("envio-reclamado")).claim())
+
+
+def test_notificacion_postergada_se_reanuda_tras_la_espera(db, services, monkeypatch):
+    monkeypatch.setattr(resilience, "deferred_calls", resilience.DeferredCalls())
+    gmail = resilience.get_breaker("gmail")
+    for _ in range(gmail.failure_threshold):
+        gmail.record_failure()
+    result = run(_submit("envio-postergado", make_submission("a")))
+    name = f"gmail_{result['operations'][0]['operation_id']}"
+
+    # Mientras resilience.deferred_calls pueda reenviarla no se considera interrumpido
+    journal = run(_load("envio-postergado"))
+    assert journal.deferred_stages() == [name] and not journal.interrupted()
+    assert run(_list()) == []
+
+    # Pasada la espera se asume que el proceso se reinició y se perdió el reenvío
+    monkeypatch.setattr(stage_journal, "ENVIO_RESUME_IDLE_SECONDS", 0)
+    assert [s["submission_id"] for s in run(_list())] == ["envio-postergado"]
+    gmail.record_success()
+    services.calls.clear()
+    assert run(_resume("envio-postergado")) == result
+    assert services.calls == ["gmail"]
+    assert run(_load("envio-postergado")).completed(name) == {"status": pipeline.NOTIFICACION_ENVIADA}
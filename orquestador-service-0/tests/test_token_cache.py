@@ -0,0 +1,106 @@
+# orquestador-service-0/tests/test_token_cache.py
+"""
+Caché de tokens verificados: un token se verifica una sola vez hasta poco antes de
+su exp, los fallidos no se guardan y el caché descarta primero el menos usado.
+"""
+import pytest
+from fastapi import HTTPException
+
+import token_cache
+from token_cache import TokenCache
+
+
+class FakeVerifier:
+    def __init__(self, exp: float = 1000):
+        self.exp = exp
+        self.calls = []
+
+    def __call__(self, token: str):
+        self.calls.append(token)
+        if token.startswith("malo"):
+            raise ValueError("firma inválida")
+        return {"email": f"{token}@capital.pe", "exp": self.exp}
+
+
+class Clock:
+    def __init__(self, now: float = 0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_se_verifica_una_vez_hasta_su_exp():
+    verifier, clock = FakeVerifier(exp=1000), Clock()
+    cache = TokenCache(leeway_seconds=30, clock=clock, verify_token=verifier)
+
+    assert cache.verify("a")["email"] == "a@capital.pe"
+    cache.verify("a")
+    assert verifier.calls == ["a"]
+
+    # Dentro del margen previo al exp se vuelve a verificar
+    clock.now = 975
+    cache.verify("a")
+    assert verifier.calls == ["a", "a"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_token_vencido_o_invalido_no_se_guarda():
+    verifier = FakeVerifier(exp=10)
+    cache = TokenCache(leeway_seconds=30, clock=Clock(), verify_token=verifier)
+    cache.verify("a")
+    cache.verify("a")
+    assert verifier.calls == ["a", "a"] and cache.stats()["entries"] == 0
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            cache.verify("malo")
+    assert verifier.calls.count("malo") == 2
+
+
+def test_descarta_el_menos_usado():
+    verifier = FakeVerifier()
+    cache = TokenCache(max_entries=2, clock=Clock(), verify_token=verifier)
+    cache.verify("a")
+    cache.verify("b")
+    cache.verify("a")
+    cache.verify("c")  # descarta b, el menos usado
+
+    verifier.calls.clear()
+    cache.verify("a")
+    cache.verify("b")
+    assert verifier.calls == ["b"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_get_current_user_usa_el_cache(monkeypatch):
+    verifier = FakeVerifier(exp=float("inf"))
+    monkeypatch.setattr(token_cache, "token_cache", TokenCache(verify_token=verifier))
+
+    user = token_cache.get_current_user("Bearer ana.perez")
+    token_cache.get_current_user("Bearer ana.perez")
+    assert (user.email, user.name) == ("ana.perez@capital.pe", "ana.perez")
+    assert verifier.calls == ["ana.perez"]
+
+    for header in (None, "Token x", "Bearer malo"):
+        with pytest.raises(HTTPException) as exc:
+            token_cache.get_current_user(header)
+        assert exc.value.status_code == 401
+
+
+def test_push_de_pubsub_solo_de_la_cuenta_de_la_suscripcion(monkeypatch):
+    monkeypatch.setattr(token_cache, "PUBSUB_PUSH_AUDIENCE", "https://orquestador/events")
+    monkeypatch.setattr(token_cache, "PUBSUB_PUSH_SERVICE_ACCOUNT", "push@capital.iam")
+    monkeypatch.setattr(token_cache, "pubsub_token_cache", TokenCache(verify_token=lambda token: {
+        "email": token, "email_verified": True, "exp": float("inf"),
+    }))
+
+    assert token_cache.verify_pubsub_push("Bearer push@capital.iam")["email"] == "push@capital.iam"
+    with pytest.raises(HTTPException) as exc:
+        token_cache.verify_pubsub_push("Bearer otra@capital.iam")
+    assert exc.value.status_code == 403
+
+    monkeypatch.setattr(token_cache, "PUBSUB_PUSH_SERVICE_ACCOUNT", None)
+    with pytest.raises(HTTPException) as exc:
+        token_cache.verify_pubsub_push("Bearer push@capital.iam")
+    assert exc.value.status_code == 403
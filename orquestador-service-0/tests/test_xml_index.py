@@ -0,0 +1,29 @@
+# orquestador-service-0/tests/test_xml_index.py
+"""
+Lectura rápida de la clave de una factura (emisor, número) para detectar reenvíos:
+debe leer los mismos XML que el parser, incluidos los Latin-1 sin declaración.
+"""
+import os
+
+from xml_index import extract_invoice_key
+
+CORPUS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "parser-service-1", "benchmarks", "corpus"
+)
+
+
+def _corpus(name: str) -> bytes:
+    with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+        return f.read()
+
+
+def test_clave_de_xml_latin1_sin_declaracion():
+    content = _corpus("latin1-sin-declaracion.xml")
+    assert not content.startswith(b"<?xml")
+    assert extract_invoice_key(content) == ("20601234567", "F700-1")
+    # La misma factura que su versión con declaración de codificación
+    assert extract_invoice_key(content) == extract_invoice_key(_corpus("latin1-declarado.xml"))
+
+
+def test_clave_de_xml_ilegible():
+    assert extract_invoice_key(b"<Invoice><sin cerrar>") is None
@@ -0,0 +1,173 @@
+# orquestador-service-0/token_cache.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Header, HTTPException
+import firebase_admin
+from firebase_admin import auth, credentials
+
+# --- Configuración ---
+# Máximo de tokens verificados que se guardan en memoria
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "1024"))
+# Un token deja de usarse desde el caché estos segundos antes de su exp
+TOKEN_CACHE_LEEWAY_SECONDS = float(os.getenv("TOKEN_CACHE_LEEWAY_SECONDS", "30"))
+# Push de Pub/Sub (POST /events/{topic}): audiencia del token OIDC (la configurada en la
+# suscripción, por defecto la URL del endpoint) y cuenta de servicio que lo firma
+PUBSUB_PUSH_AUDIENCE = os.getenv("PUBSUB_PUSH_AUDIENCE")
+PUBSUB_PUSH_SERVICE_ACCOUNT = os.getenv("PUBSUB_PUSH_SERVICE_ACCOUNT")
+
+
+_firebase_lock = threading.Lock()
+
+
+def _ensure_firebase_app():
+    """
+    Inicializa Firebase Admin con la primera verificación en lugar de al importar.
+    """
+    with _firebase_lock:
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app(credentials.ApplicationDefault())
+            print("Firebase Admin SDK inicializado correctamente.")
+
+
+def _verify_firebase_token(token: str) -> Dict[str, Any]:
+    _ensure_firebase_app()
+    return auth.verify_id_token(token)
+
+
+def _verify_pubsub_token(token: str) -> Dict[str, Any]:
+    from google.auth.transport import requests as google_requests
+    from google.oauth2 import id_token
+    return id_token.verify_oauth2_token(token, google_requests.Request(), audience=PUBSUB_PUSH_AUDIENCE)
+
+
+class TokenCache:
+    """
+    Caché LRU acotado de claims de tokens ya verificados (por defecto, de Firebase).
+    La clave es el SHA-256 del token (el token en sí no se guarda) y cada entrada
+    vence en el exp del propio token.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES, leeway_seconds: float = TOKEN_CACHE_LEEWAY_SECONDS,
+                 clock: Callable[[], float] = time.time, verify_token: Callable[[str], Dict[str, Any]] = _verify_firebase_token):
+        self.verify_token = verify_token
+        self.max_entries = max_entries
+        self.leeway_seconds = leeway_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is not None and claims.get("exp", 0) - self.leeway_seconds > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return claims
+            if claims is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        if claims.get("exp", 0) - self.leeway_seconds <= self.clock():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Devuelve los claims del token, verificándolo (con Firebase) solo si no está en caché.
+        """
+        claims = self.get(token)
+        if claims is None:
+            claims = self.verify_token(token)
+            self.put(token, claims)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+token_cache = TokenCache()
+# Tokens OIDC con que Pub/Sub firma cada push: se repiten mientras no vencen (~1 h)
+pubsub_token_cache = TokenCache(verify_token=_verify_pubsub_token)
+
+
+@dataclass
+class AuthenticatedUser:
+    email: str
+    name: str
+    claims: Dict[str, Any]
+
+
+def get_current_user(authorization: Optional[str] = Header(None)) -> AuthenticatedUser:
+    """
+    Dependencia de FastAPI: valida el header Authorization: Bearer <token> de
+    Firebase y devuelve el usuario. Es síncrona para que la verificación (que
+    puede descargar las claves públicas de Google) corra fuera del event loop.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Falta el token de autorización")
+
+    try:
+        token = authorization.split("Bearer ")[1]
+        decoded_token = token_cache.verify(token)
+        user_email = decoded_token['email']
+        user_name = decoded_token.get('name', user_email.split('@')[0])
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
+    return AuthenticatedUser(email=user_email, name=user_name, claims=decoded_token)
+
+
+def verify_pubsub_push(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Dependencia de FastAPI para el push de Pub/Sub: valida el token OIDC del header
+    Authorization (firma de Google, audiencia PUBSUB_PUSH_AUDIENCE) y que lo emita
+    la cuenta de servicio PUBSUB_PUSH_SERVICE_ACCOUNT de la suscripción.
+    """
+    if not PUBSUB_PUSH_AUDIENCE or not PUBSUB_PUSH_SERVICE_ACCOUNT:
+        print("ADVERTENCIA: Push de Pub/Sub rechazado: faltan PUBSUB_PUSH_AUDIENCE o PUBSUB_PUSH_SERVICE_ACCOUNT.")
+        raise HTTPException(status_code=403, detail="El endpoint de eventos no está configurado")
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Falta el token de autorización")
+    try:
+        claims = pubsub_token_cache.verify(authorization.split("Bearer ")[1])
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Token inválido: {e}")
+    if claims.get("email") != PUBSUB_PUSH_SERVICE_ACCOUNT or not claims.get("email_verified"):
+        raise HTTPException(status_code=403, detail="El token no corresponde a la suscripción de Pub/Sub")
+    return claims
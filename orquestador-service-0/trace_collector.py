@@ -0,0 +1,197 @@
+# orquestador-service-0/trace_collector.py
+"""
+Colector local de trazas. Junta los spans de todos los servicios (los que envían
+con TRACE_COLLECTOR_URL o las líneas "[SPAN] {...}" de sus logs) y muestra la ruta
+crítica de un envío: la cadena de etapas que determinó cuánto tardó.
+
+    python trace_collector.py serve --port 9411          # recibe POST /spans e imprime cada traza al terminar
+    python trace_collector.py path <request_id|OP-...> orquestador.log parser.log ...
+    docker logs orquestador | python trace_collector.py path <request_id>
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Una traza se imprime cuando pasa este tiempo sin recibir spans nuevos
+TRACE_QUIET_SECONDS = 5.0
+
+Span = Dict[str, Any]
+
+
+def _end(span: Span) -> float:
+    return span["start"] + span["duration_s"]
+
+
+def read_spans(lines: Iterable[str]) -> List[Span]:
+    spans = []
+    for line in lines:
+        _, marker, data = line.partition("[SPAN] ")
+        if marker:
+            try:
+                spans.append(json.loads(data))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def find_trace(spans: List[Span], key: str) -> List[Span]:
+    """Spans de la traza con ese request ID, o de la que registró esa operación."""
+    trace_id = key
+    if not any(s["trace_id"] == key for s in spans):
+        trace_id = next((s["trace_id"] for s in spans if s.get("attributes", {}).get("operation_id") == key), None)
+    return [s for s in spans if s["trace_id"] == trace_id]
+
+
+def critical_path(spans: List[Span]) -> List[Tuple[Span, float]]:
+    """
+    Recorre la traza desde el final hacia atrás: en cada span se sigue al hijo que
+    termina último antes del punto actual, y el tiempo sin hijos activos se le
+    atribuye al propio span. Devuelve (span, segundos en la ruta crítica) en orden
+    cronológico. El fin de cada span incluye a sus descendientes, para que las
+    etapas que siguen en segundo plano (modo asíncrono) también cuenten.
+    """
+    ids = {s["span_id"] for s in spans}
+    children: Dict[Optional[str], List[Span]] = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+
+    effective_end: Dict[str, float] = {}
+
+    def _effective_end(span: Span) -> float:
+        if span["span_id"] not in effective_end:
+            effective_end[span["span_id"]] = max([_end(span)] + [_effective_end(c) for c in children[span["span_id"]]])
+        return effective_end[span["span_id"]]
+
+    contribution: Dict[str, float] = defaultdict(float)
+    on_path: Dict[str, Span] = {}
+
+    def _walk(span: Span, window_end: float):
+        on_path[span["span_id"]] = span
+        cursor = min(_effective_end(span), window_end)
+        for child in sorted(children[span["span_id"]], key=_effective_end, reverse=True):
+            if child["start"] >= cursor:
+                continue
+            child_end = min(_effective_end(child), cursor)
+            contribution[span["span_id"]] += cursor - child_end
+            _walk(child, child_end)
+            cursor = max(child["start"], span["start"])
+            if cursor <= span["start"]:
+                break
+        contribution[span["span_id"]] += max(cursor - span["start"], 0.0)
+
+    roots = children[None]
+    if not roots:
+        return []
+    _walk(min(roots, key=lambda s: s["start"]), float("inf"))
+    return [(s, contribution[s["span_id"]]) for s in sorted(on_path.values(), key=lambda s: s["start"])]
+
+
+def format_critical_path(spans: List[Span]) -> str:
+    path = critical_path(spans)
+    if not path:
+        return "No hay spans para esa traza."
+    depth: Dict[str, int] = {}
+    by_id = {s["span_id"]: s for s in spans}
+    for s, _ in path:
+        depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1 if s["parent_id"] in by_id else 0
+    total = max(_end(s) for s in spans) - min(s["start"] for s in spans)
+    lines = [f"Ruta crítica de {path[0][0]['trace_id']} ({total:.3f}s, {len(spans)} spans)"]
+    lines.append(f"{'servicio':<14}{'etapa':<44}{'duración':>10}{'en ruta':>10}")
+    for s, seconds in path:
+        name = "  " * depth[s["span_id"]] + s["name"]
+        status = "" if s.get("status", "OK") == "OK" else f"  {s['status']}"
+        lines.append(f"{s['service']:<14}{name:<44}{s['duration_s']:>9.3f}s{seconds:>9.3f}s{status}")
+    return "\n".join(lines)
+
+
+# --- Servidor ---
+class _Store:
+    def __init__(self):
+        self.traces: Dict[str, List[Span]] = defaultdict(list)
+        self.last_seen: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, spans: List[Span]):
+        now = time.monotonic()
+        with self.lock:
+            for s in spans:
+                self.traces[s["trace_id"]].append(s)
+                self.last_seen[s["trace_id"]] = now
+
+    def print_finished(self):
+        now = time.monotonic()
+        with self.lock:
+            finished = [t for t, seen in self.last_seen.items() if now - seen >= TRACE_QUIET_SECONDS]
+            for trace_id in finished:
+                del self.last_seen[trace_id]
+            ready = [list(self.traces[t]) for t in finished]
+        for spans in ready:
+            print(format_critical_path(spans) + "\n", flush=True)
+
+
+def serve(port: int):
+    store = _Store()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/spans":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            store.add(json.loads(body))
+            self.send_response(204)
+            self.end_headers()
+
+        def do_GET(self):
+            key = self.path.rsplit("/", 1)[-1]
+            with store.lock:
+                all_spans = [s for spans in store.traces.values() for s in spans]
+            text = format_critical_path(find_trace(all_spans, key)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.end_headers()
+            self.wfile.write(text)
+
+        def log_message(self, *args):
+            pass
+
+    def _printer():
+        while True:
+            time.sleep(1)
+            store.print_finished()
+
+    threading.Thread(target=_printer, daemon=True).start()
+    print(f"--- 🛰️  Colector de trazas escuchando en :{port} (GET /traces/<request_id|operation_id>) ---", flush=True)
+    ThreadingHTTPServer(("", port), Handler).serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve")
+    serve_parser.add_argument("--port", type=int, default=9411)
+    path_parser = sub.add_parser("path")
+    path_parser.add_argument("key", help="X-Request-ID o ID de operación")
+    path_parser.add_argument("logs", nargs="*", help="Archivos de log (por defecto, la entrada estándar)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port)
+        return 0
+    lines: List[str] = []
+    for path in args.logs:
+        with open(path, encoding="utf-8") as f:
+            lines.extend(f)
+    if not args.logs:
+        lines = list(sys.stdin)
+    print(format_critical_path(find_trace(read_spans(lines), args.key)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
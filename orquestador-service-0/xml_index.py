@@ -0,0 +1,157 @@
+# orquestador-service-0/xml_index.py
+import io
+import json
+import base64
+import hashlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Tamaño de cada trozo de base64 al armar el payload de CAVALI (múltiplo de 3 bytes)
+B64_CHUNK_BYTES = 3 * 16 * 1024
+
+UBL_NS = {
+    'cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
+    'cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2'
+}
+
+
+def _parse_root(content: bytes) -> Optional[ET.Element]:
+    """
+    Lee el XML igual que _parse_root del parser: con la codificación que declara y,
+    si falla (p. ej. Latin-1 sin declaración), como ISO-8859-1 y luego como UTF-8.
+    """
+    try:
+        return ET.fromstring(content.removeprefix(b'\xef\xbb\xbf'))
+    except ET.ParseError:
+        pass
+    try:
+        return ET.fromstring(content.decode('iso-8859-1').encode('utf-8'))
+    except ET.ParseError:
+        pass
+    try:
+        return ET.fromstring(content.decode('utf-8').lstrip('\ufeff').encode('utf-8'))
+    except (UnicodeDecodeError, ET.ParseError):
+        return None
+
+
+def extract_invoice_key(content: bytes) -> Optional[Tuple[str, str]]:
+    """
+    (RUC del emisor, número de documento) de un XML UBL, con las mismas rutas que
+    usa el parser. Es una lectura rápida para detectar reenvíos antes de subir y
+    parsear; devuelve None si el XML no se puede leer.
+    """
+    root = _parse_root(content)
+    if root is None:
+        return None
+    document_id = root.find('./cbc:ID', UBL_NS)
+    emisor_ruc = root.find('.//cac:AccountingSupplierParty//cac:PartyIdentification/cbc:ID', UBL_NS)
+    if document_id is None or emisor_ruc is None or not document_id.text or not emisor_ruc.text:
+        return None
+    return emisor_ruc.text.strip(), document_id.text.strip()
+
+
+@dataclass(frozen=True)
+class XmlEntry:
+    filename: str
+    sha256: str
+    content: bytes
+    content_type: str = "application/xml"
+    invoice_key: Optional[Tuple[str, str]] = None
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.content)
+
+    @property
+    def file(self) -> io.BytesIO:
+        # Permite subir la entrada a GCS con el mismo código que un UploadFile
+        return io.BytesIO(self.content)
+
+
+class XmlContentIndex:
+    """
+    Contenido de los XML de un envío, leído una sola vez al recibirlo e indexado
+    por nombre de archivo y por SHA-256. Lo comparten el parser, CAVALI y el resto
+    de etapas, de modo que ningún XML se vuelve a leer ni a codificar por grupo.
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, XmlEntry] = {}
+        self._by_hash: Dict[str, XmlEntry] = {}
+
+    @classmethod
+    async def from_upload_files(cls, xml_files) -> "XmlContentIndex":
+        index = cls()
+        for xml_file in xml_files:
+            await xml_file.seek(0)
+            index.add(xml_file.filename, await xml_file.read())
+        return index
+
+    @classmethod
+    def from_contents(cls, contents: Dict[str, bytes]) -> "XmlContentIndex":
+        index = cls()
+        for filename, content in contents.items():
+            index.add(filename, content)
+        return index
+
+    def add(self, filename: str, content: bytes) -> XmlEntry:
+        entry = XmlEntry(
+            filename=filename, sha256=hashlib.sha256(content).hexdigest(), content=content,
+            invoice_key=extract_invoice_key(content),
+        )
+        self._by_name[filename] = entry
+        self._by_hash.setdefault(entry.sha256, entry)
+        return entry
+
+    def discard(self, filenames: Iterable[str]):
+        """Quita del envío los archivos indicados (p. ej. facturas ya procesadas)."""
+        for filename in filenames:
+            entry = self._by_name.pop(filename, None)
+            if entry is not None and self._by_hash.get(entry.sha256) is entry:
+                del self._by_hash[entry.sha256]
+
+    def invoice_keys(self) -> Dict[str, Tuple[str, str]]:
+        """(RUC del emisor, número de documento) de cada XML que se pudo leer, por nombre de archivo."""
+        return {name: entry.invoice_key for name, entry in self._by_name.items() if entry.invoice_key}
+
+    def get(self, filename: str) -> Optional[XmlEntry]:
+        return self._by_name.get(filename)
+
+    def get_by_hash(self, sha256: str) -> Optional[XmlEntry]:
+        return self._by_hash.get(sha256)
+
+    def entries(self) -> List[XmlEntry]:
+        return list(self._by_name.values())
+
+    def select(self, filenames: Iterable[str]) -> List[XmlEntry]:
+        """Entradas de los archivos indicados, en el orden en que se recibieron."""
+        wanted = set(filenames)
+        return [entry for name, entry in self._by_name.items() if name in wanted]
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._by_name
+
+    # --- Payload de CAVALI ---
+    def iter_cavali_payload(self, filenames: Iterable[str]) -> Iterator[bytes]:
+        """
+        Genera el JSON {"xml_files_data": [{"filename", "content_base64"}, ...]} por
+        trozos, codificando cada XML en base64 a medida que se envía en lugar de
+        mantener todas las cadenas en memoria.
+        """
+        yield b'{"xml_files_data": ['
+        for i, entry in enumerate(self.select(filenames)):
+            prefix = b', ' if i else b''
+            yield prefix + b'{"filename": ' + json.dumps(entry.filename).encode('utf-8') + b', "content_base64": "'
+            view = memoryview(entry.content)
+            for start in range(0, len(view), B64_CHUNK_BYTES):
+                yield base64.b64encode(view[start:start + B64_CHUNK_BYTES])
+            yield b'"}'
+        yield b']}'
+
+    async def stream_cavali_payload(self, filenames: Iterable[str]) -> AsyncIterator[bytes]:
+        for chunk in self.iter_cavali_payload(filenames):
+            yield chunk
@@ -0,0 +1,104 @@
+# parser-service-1/benchmarks/bench_extractor.py
+"""
+Compara parser.extract_invoice_data con la versión anterior (reference_parser.py)
+sobre las facturas de benchmarks/corpus: primero comprueba que ambas devuelven lo
+mismo y luego mide cuánto tarda cada una en recorrer el corpus. Con pytest-benchmark:
+
+    pytest benchmarks/bench_extractor.py --benchmark-group-by=group
+
+O sin pytest-benchmark, con timeit:
+
+    python benchmarks/bench_extractor.py --rounds 200
+"""
+import os
+import sys
+import glob
+import timeit
+import argparse
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+import reference_parser  # noqa: E402
+from parser import extract_invoice_data  # noqa: E402
+
+# Facturas UBL 2.1 generadas con ubl_corpus.py (orquestador) y variantes de
+# codificación (BOM, Latin-1 con y sin declaración) y de términos de pago
+CORPUS = {
+    os.path.basename(path): open(path, "rb").read()
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "corpus", "*.xml")))
+}
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark():
+        pytest.skip("requiere pytest-benchmark (pip install pytest-benchmark)")
+
+
+def _fix_mojibake(text: str) -> str:
+    try:
+        return text.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def expected_output(content: bytes) -> dict:
+    """
+    Salida de la versión anterior, con la única diferencia aceptada: aquella leía
+    el XML como Latin-1 y lo volvía a codificar en UTF-8, así que las tildes y la Ñ
+    de un XML en UTF-8 (o declarado ISO-8859-1) salían como "COMPAÃ\\x91IA". El
+    extractor nuevo respeta la codificación que declara el XML.
+    """
+    data = reference_parser.extract_invoice_data(content)
+    return {k: _fix_mojibake(v) if isinstance(v, str) else v for k, v in data.items()}
+
+
+def _parse_corpus(extract):
+    for content in CORPUS.values():
+        extract(content)
+
+
+def test_corpus_not_empty():
+    assert len(CORPUS) >= 10
+
+
+@pytest.mark.parametrize("name", sorted(CORPUS))
+def test_same_output_as_reference(name):
+    assert extract_invoice_data(CORPUS[name]) == expected_output(CORPUS[name])
+
+
+@pytest.mark.benchmark(group="corpus")
+def test_bench_reference(benchmark):
+    benchmark(_parse_corpus, reference_parser.extract_invoice_data)
+
+
+@pytest.mark.benchmark(group="corpus")
+def test_bench_extractor(benchmark):
+    benchmark(_parse_corpus, extract_invoice_data)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=100, help="pasadas por el corpus en cada medición")
+    args = parser.parse_args(argv)
+
+    for name, content in CORPUS.items():
+        assert extract_invoice_data(content) == expected_output(content), f"{name}: salida distinta a la referencia"
+    print(f"{len(CORPUS)} facturas con la misma salida que la referencia")
+
+    timings = {}
+    for label, extract in (("referencia", reference_parser.extract_invoice_data), ("extractor", extract_invoice_data)):
+        # El mejor de 5 repeticiones, para descontar ruido de la máquina
+        best = min(timeit.repeat(lambda: _parse_corpus(extract), number=args.rounds, repeat=5))
+        timings[label] = best / (args.rounds * len(CORPUS))
+        print(f"{label:<11} {timings[label] * 1e6:8.1f} µs por factura")
+    print(f"speedup     {timings['referencia'] / timings['extractor']:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# parser-service-1/benchmarks/bench_parse_pipeline.py
+"""
+Compara el parser secuencial (descargar y parsear un XML tras otro) con
+parse_pipeline.parse_xml_paths para 10, 100 y 1000 facturas UBL sintéticas y
+distinto número de procesos. La descarga de GCS se simula con una espera. Para el
+modo stream (parse_pipeline.iter_xml_paths) mide además cuándo llega el primer
+resultado, que es cuando el orquestador puede empezar a agrupar.
+
+    python benchmarks/bench_parse_pipeline.py
+    python benchmarks/bench_parse_pipeline.py --sizes 1000 --processes 0,2,4,8 --download-ms 0
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# El generador de facturas vive con los benchmarks del orquestador
+CORPUS_DIR = os.path.join(os.path.dirname(SERVICE_DIR), "orquestador-service-0", "benchmarks")
+# tracing.py, que importa parse_pipeline, vive en shared/ con los demás servicios
+sys.path[:0] = [SERVICE_DIR, CORPUS_DIR, os.path.join(os.path.dirname(SERVICE_DIR), "shared")]
+# Un span por XML ensuciaría la salida y el tiempo medido
+os.environ.setdefault("TRACE_PRINT_SPANS", "false")
+# Sin caché de parseo: cada modo vuelve a parsear las mismas facturas
+os.environ.setdefault("PARSE_CACHE_MAX_MB", "0")
+
+import parse_pipeline  # noqa: E402
+from parser import extract_invoice_data  # noqa: E402
+from ubl_corpus import iter_submissions  # noqa: E402
+
+
+def make_download(corpus, download_ms):
+    def download(xml_path):
+        if download_ms:
+            time.sleep(download_ms / 1000)
+        return corpus[xml_path]
+    return download
+
+
+def run_sequential(xml_paths, download):
+    # Equivale al endpoint anterior: un XML a la vez
+    return [extract_invoice_data(download(p)) for p in xml_paths]
+
+
+def run_pipeline(xml_paths, download, processes):
+    parse_pipeline.shutdown()
+    parse_pipeline.PARSER_PROCESSES = processes
+    # Arranca los procesos antes de medir: en el servicio se crean una sola vez
+    asyncio.run(parse_pipeline.parse_xml_paths("warmup", xml_paths[:max(processes, 1)], download))
+    started = time.perf_counter()
+    results = asyncio.run(parse_pipeline.parse_xml_paths("bench", xml_paths, download))
+    return time.perf_counter() - started, [r.get("parsed_invoice_data") for r in results]
+
+
+def run_stream(xml_paths, download):
+    async def consume():
+        started = time.perf_counter()
+        first, results = None, []
+        async for result in parse_pipeline.iter_xml_paths("bench", xml_paths, download):
+            first = first or time.perf_counter() - started
+            results.append(result)
+        return first, time.perf_counter() - started, results
+
+    first, elapsed, results = asyncio.run(consume())
+    results.sort(key=lambda r: r["xml_index"])
+    return first, elapsed, [r.get("parsed_invoice_data") for r in results]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="cantidades de facturas, separadas por coma")
+    cpus = os.cpu_count() or 1
+    default_processes = sorted({0, 1, cpus} | {p for p in (2, 4) if p < cpus})
+    parser.add_argument("--processes", default=",".join(map(str, default_processes)),
+                        help="tamaños del pool de procesos a probar (0 = parsear en los hilos de descarga)")
+    parser.add_argument("--download-ms", type=float, default=20, help="latencia simulada de cada descarga de GCS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    processes = [int(p) for p in args.processes.split(",")]
+    files = next(iter_submissions(1, max(sizes), seed=args.seed))
+    corpus = {f"gs://bench/{name}": content for name, content in files}
+    all_paths = list(corpus)
+    download = make_download(corpus, args.download_ms)
+    print(f"{cpus} CPUs, {parse_pipeline.PARSER_IO_CONCURRENCY} descargas en paralelo, "
+          f"{args.download_ms:.0f} ms por descarga, {sum(map(len, corpus.values())) // len(corpus)} bytes por XML")
+
+    rows = []
+    for size in sizes:
+        xml_paths = all_paths[:size]
+        started = time.perf_counter()
+        expected = run_sequential(xml_paths, download)
+        sequential = time.perf_counter() - started
+        rows.append((size, "secuencial", sequential, sequential, sequential / size))
+        for p in processes:
+            elapsed, parsed = run_pipeline(xml_paths, download, p)
+            assert parsed == expected, f"el pipeline con {p} procesos devolvió otros datos u otro orden"
+            rows.append((size, f"pipeline, {p} procesos", elapsed, sequential, elapsed))
+            # Con el pool ya creado por run_pipeline
+            first, elapsed, parsed = run_stream(xml_paths, download)
+            assert parsed == expected, f"el stream con {p} procesos devolvió otros datos"
+            rows.append((size, f"stream, {p} procesos", elapsed, sequential, first))
+    parse_pipeline.shutdown()
+
+    print(f"\n{'facturas':>9} {'modo':<22} {'segundos':>9} {'primero':>9} {'facturas/s':>11} {'speedup':>8}")
+    for size, mode, elapsed, sequential, first in rows:
+        print(f"{size:>9} {mode:<22} {elapsed:>9.3f} {first:>9.3f} {size / elapsed:>11.0f} {sequential / elapsed:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
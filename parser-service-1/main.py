@@ -1,16 +1,39 @@
 ## 8001
 import os
+import sys
 import json
+import time
+import base64
+import binascii
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from google.cloud import storage
-from parser import extract_invoice_data
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import parse_pipeline
+from parse_cache import parse_cache
+import tracing
 
-app = FastAPI(title="Parser Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    parse_pipeline.shutdown()
+
+
+app = FastAPI(title="Parser Service", lifespan=lifespan)
+tracing.install(app, "parser")
 
 # Configuración del bucket
 GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID", "operaciones-peru")
 BUCKET_NAME = os.getenv("BUCKET_NAME", "tu-bucket-pruebas")  # asegúrate de definir esto en tu .env o directamente aquí
 
+# Respuesta en stream: un objeto JSON por línea
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 storage_client = storage.Client()
 bucket = storage_client.bucket(BUCKET_NAME)
 
@@ -22,50 +45,101 @@ def read_xml_from_gcs(gcs_path):
     return blob.download_as_bytes()
 
 
+def _decode_inline_files(xml_files) -> List[Tuple[str, bytes]]:
+    try:
+        return [(f["filename"], base64.b64decode(f["content_b64"], validate=True)) for f in xml_files]
+    except (KeyError, TypeError, binascii.Error) as e:
+        raise HTTPException(status_code=400, detail=f"xml_files debe ser una lista de {{filename, content_b64}}: {e}")
+
+
+async def _read_command(request: Request) -> dict:
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        files = [(f.filename, await f.read()) for f in form.getlist("xml_files") if hasattr(f, "read")]
+        return {"operation_id": form.get("operation_id"), "xml_files": files}
+    try:
+        command = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe ser JSON o multipart/form-data.")
+    if command.get("xml_files"):
+        command["xml_files"] = _decode_inline_files(command["xml_files"])
+    return command
+
+
+def _wants_stream(request: Request) -> bool:
+    return (
+        request.query_params.get("stream", "").lower() == "true"
+        or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    )
+
+
+def _ndjson(data: Dict[str, Any]) -> bytes:
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_results(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Una línea {"type": "result", ...} por XML apenas se parsea, y al final una línea
+    {"type": "summary", ...}. Si falta el resumen, la respuesta quedó cortada.
+    """
+    started = time.perf_counter()
+    processed = ok = 0
+    async for result in results:
+        processed += 1
+        ok += result["status"] == "SUCCESS"
+        yield _ndjson({"type": "result", **result})
+    yield _ndjson({
+        "type": "summary",
+        "message": f"Procesados {processed} archivos",
+        "processed": processed,
+        "success": ok,
+        "errors": processed - ok,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+
+
 @app.post("/parser")
-async def receive_parser_request(command: dict):
+async def receive_parser_request(request: Request):
+    """
+    Parsea los XML de un envío. Acepta:
+    - JSON {"operation_id", "xml_paths": ["gs://..."]}: descarga cada XML de GCS.
+    - JSON {"operation_id", "xml_files": [{"filename", "content_b64"}]}: XML en base64.
+    - multipart/form-data con operation_id y los archivos en xml_files: los XML en
+      bruto, sin pasar por GCS ni el 33 % extra de base64 (lo usa el orquestador).
+    Con XML en la petición, xml_path de cada resultado es el nombre de archivo.
+
+    Con ?stream=true o "Accept: application/x-ndjson" responde en NDJSON: una línea
+    por XML apenas se parsea (en orden de llegada; xml_index indica cuál es) y una
+    línea final de resumen, sin esperar al último XML ni juntar todos los resultados.
+    """
+    command = await _read_command(request)
     op_id = command.get("operation_id")
     xml_paths = command.get("xml_paths") or []
+    xml_files = command.get("xml_files") or []
+
+    if not op_id or not (xml_paths or xml_files):
+        raise HTTPException(status_code=400, detail="Faltan campos requeridos (operation_id, xml_paths o xml_files)")
+
+    if _wants_stream(request):
+        if xml_files:
+            print(f"[Parser] Procesando operación en stream: {op_id} con {len(xml_files)} XMLs recibidos en la petición")
+            results = parse_pipeline.iter_xml_contents(op_id, xml_files)
+        else:
+            print(f"[Parser] Procesando operación en stream: {op_id} con {len(xml_paths)} XMLs")
+            results = parse_pipeline.iter_xml_paths(op_id, xml_paths, read_xml_from_gcs)
+        return StreamingResponse(_stream_results(results), media_type=NDJSON_MEDIA_TYPE)
+
+    if xml_files:
+        print(f"[Parser] Procesando operación: {op_id} con {len(xml_files)} XMLs recibidos en la petición")
+        results = await parse_pipeline.parse_xml_contents(op_id, xml_files)
+    else:
+        print(f"[Parser] Procesando operación: {op_id} con {len(xml_paths)} XMLs")
+        results = await parse_pipeline.parse_xml_paths(op_id, xml_paths, read_xml_from_gcs)
+
+    return {"message": f"Procesados {len(results)} archivos", "results": results}
+
 
-    if not op_id or not xml_paths:
-        raise HTTPException(status_code=400, detail="Faltan campos requeridos (operation_id, xml_paths)")
-
-    print(f"[Parser] Procesando operación: {op_id} con {len(xml_paths)} XMLs")
-
-    results = []
-
-    for idx, xml_path in enumerate(xml_paths):
-        print(f"[Parser] Procesando XML {idx+1}: {xml_path}")
-        if not xml_path:
-            results.append({
-                "status": "ERROR",
-                "xml_index": idx + 1,
-                "xml_path": None,
-                "error_message": "Ruta del XML no proporcionada."
-            })
-            continue
-
-        try:
-            xml_bytes = read_xml_from_gcs(xml_path)
-            invoice_data = extract_invoice_data(xml_bytes)
-            result = {
-                "operation_id": op_id,
-                "status": "SUCCESS",
-                "xml_index": idx + 1,
-                "xml_path": xml_path,
-                "parsed_invoice_data": invoice_data
-            }
-            print(f"[Parser] Datos extraídos correctamente: {invoice_data}")
-        except Exception as e:
-            result = {
-                "operation_id": op_id,
-                "status": "ERROR",
-                "xml_index": idx + 1,
-                "xml_path": xml_path,
-                "error_message": str(e)
-            }
-            print(f"[Parser] Error al procesar XML {idx+1}: {e}")
-
-        results.append(result)
-
-    return {"message": f"Procesados {len(xml_paths)} archivos", "results": results}
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Aciertos de la caché de parseo de esta instancia (cada instancia lleva su cuenta)."""
+    return parse_cache.stats()
@@ -0,0 +1,198 @@
+# parser-service-1/parse_cache.py
+import os
+import re
+import json
+import socket
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# --- Configuración ---
+# Memoria máxima del nivel en proceso (MB de JSON de los resultados); 0 lo desactiva
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "64"))
+# Nivel persistente opcional: "" (ninguno), "disk" o "gcs"
+PARSE_CACHE_PERSISTENT = os.getenv("PARSE_CACHE_PERSISTENT", "").lower()
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "/tmp/parse-cache")
+# En GCS cada resultado se guarda junto al XML: {GCS_CONTENT_PREFIX}/{sha256}/parsed-v{CACHE_VERSION}.json
+PARSE_CACHE_BUCKET = os.getenv("PARSE_CACHE_BUCKET", os.getenv("BUCKET_NAME", ""))
+# Mismo prefijo con el que el orquestador guarda los archivos por contenido
+GCS_CONTENT_PREFIX = os.getenv("GCS_CONTENT_PREFIX", "contenido")
+
+# Súbelo cuando cambie lo que devuelve extract_invoice_data: las entradas anteriores dejan de usarse
+CACHE_VERSION = 1
+
+_CONTENT_PATH = re.compile(rf"/{re.escape(GCS_CONTENT_PREFIX)}/([0-9a-f]{{64}})/[^/]+$")
+
+
+def sha256_from_path(gcs_path: str) -> Optional[str]:
+    """SHA-256 de un XML guardado por contenido (gs://bucket/contenido/{sha256}/archivo.xml)."""
+    match = _CONTENT_PATH.search(gcs_path or "")
+    return match.group(1) if match else None
+
+
+class LruTier:
+    """Resultados en memoria, desalojando los menos usados cuando se supera max_bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: Dict[str, Any], size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+
+class DiskTier:
+    name = "disk"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}-v{CACHE_VERSION}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Se escribe aparte y se renombra, para que otro proceso nunca lea un archivo a medias
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class GcsTier:
+    name = "gcs"
+
+    def __init__(self, bucket_name: str):
+        from google.cloud import storage
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def _blob(self, key: str):
+        return self.bucket.blob(f"{GCS_CONTENT_PREFIX}/{key}/parsed-v{CACHE_VERSION}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(key).download_as_text()
+        except NotFound:
+            return None
+
+    def put(self, key: str, data: str):
+        self._blob(key).upload_from_string(data, content_type="application/json")
+
+
+class ParseCache:
+    """
+    Resultados de extract_invoice_data por SHA-256 del XML: un nivel en memoria
+    (LRU por tamaño) y, opcionalmente, uno persistente en disco o en GCS que
+    comparten las instancias. Solo se guardan los XML que se parsearon bien.
+    """
+
+    def __init__(self, max_bytes: int, persistent=None):
+        self.memory = LruTier(max_bytes)
+        self.persistent = persistent
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.persistent_errors = 0
+
+    @property
+    def disabled(self) -> bool:
+        return self.memory.max_bytes <= 0 and self.persistent is None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory_hits += 1
+            return dict(data)
+        if self.persistent is not None:
+            try:
+                raw = await asyncio.to_thread(self.persistent.get, key)
+            except Exception as e:
+                self.persistent_errors += 1
+                print(f"ADVERTENCIA: No se pudo leer la caché de parseo ({self.persistent.name}). Error: {e}")
+                raw = None
+            if raw is not None:
+                self.persistent_hits += 1
+                data = json.loads(raw)
+                self.memory.put(key, data, len(raw))
+                return dict(data)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: Dict[str, Any]):
+        if self.disabled:
+            return
+        raw = json.dumps(data, ensure_ascii=False)
+        self.memory.put(key, dict(data), len(raw))
+        if self.persistent is not None:
+            try:
+                await asyncio.to_thread(self.persistent.put, key, raw)
+            except Exception as e:
+                self.persistent_errors += 1
+                print(f"ADVERTENCIA: No se pudo guardar en la caché de parseo ({self.persistent.name}). Error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "instance": socket.gethostname(),
+            "lookups": lookups,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_hit_ratio": round(self.memory_hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "evictions": self.memory.evictions,
+            "persistent_tier": self.persistent.name if self.persistent is not None else None,
+            "persistent_errors": self.persistent_errors,
+        }
+
+
+def _build_from_env() -> ParseCache:
+    persistent = None
+    if PARSE_CACHE_PERSISTENT == "disk":
+        persistent = DiskTier(PARSE_CACHE_DIR)
+    elif PARSE_CACHE_PERSISTENT == "gcs":
+        persistent = GcsTier(PARSE_CACHE_BUCKET)
+    return ParseCache(int(PARSE_CACHE_MAX_MB * 1024 * 1024), persistent)
+
+
+parse_cache = _build_from_env()
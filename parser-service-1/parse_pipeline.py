@@ -0,0 +1,184 @@
+# parser-service-1/parse_pipeline.py
+import os
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from parser import extract_invoice_data
+from parse_cache import parse_cache, sha256_from_path
+import tracing
+
+# --- Configuración ---
+# Número de XML que se descargan de GCS en simultáneo
+PARSER_IO_CONCURRENCY = int(os.getenv("PARSER_IO_CONCURRENCY", "16"))
+# Procesos que parsean XML en paralelo. Con 0 se parsea en los hilos de descarga
+PARSER_PROCESSES = int(os.getenv("PARSER_PROCESSES", str(os.cpu_count() or 1)))
+
+_io_executor = ThreadPoolExecutor(max_workers=PARSER_IO_CONCURRENCY, thread_name_prefix="parser-io")
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if PARSER_PROCESSES <= 0:
+        return None
+    if _process_pool is None:
+        # spawn: los hijos no heredan los hilos ni las conexiones abiertas del cliente de GCS
+        _process_pool = ProcessPoolExecutor(max_workers=PARSER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown():
+    """Cierra el pool de procesos (al apagar el servicio)."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown()
+        _process_pool = None
+
+
+async def _parse(xml_bytes: bytes) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    if pool is None:
+        return await loop.run_in_executor(_io_executor, extract_invoice_data, xml_bytes)
+    try:
+        return await loop.run_in_executor(pool, extract_invoice_data, xml_bytes)
+    except BrokenProcessPool:
+        # Un proceso hijo murió (p. ej. por falta de memoria) y el pool ya no sirve:
+        # se crea otro en el siguiente XML
+        _discard_process_pool(pool)
+        raise
+
+
+async def _cached(sha256: Optional[str], xml_path: str) -> Optional[Dict[str, Any]]:
+    if sha256 is None or parse_cache.disabled:
+        return None
+    with tracing.span("parse_cache", xml_path=xml_path) as current:
+        invoice_data = await parse_cache.get(sha256)
+        current.attributes["hit"] = invoice_data is not None
+    return invoice_data
+
+
+async def _process_one(op_id: str, idx: int, xml_path: str, download: Optional[Callable[[str], bytes]] = None,
+                       content: Optional[bytes] = None) -> Dict[str, Any]:
+    if not xml_path:
+        return {
+            "status": "ERROR",
+            "xml_index": idx + 1,
+            "xml_path": None,
+            "error_message": "Ruta del XML no proporcionada."
+        }
+
+    loop = asyncio.get_running_loop()
+    try:
+        # Los XML guardados por contenido traen su SHA-256 en la ruta: un acierto en
+        # la caché evita tanto la descarga como el parseo
+        sha256 = sha256_from_path(xml_path) if content is None else None
+        invoice_data = await _cached(sha256, xml_path)
+        if invoice_data is None and content is None:
+            with tracing.span("gcs_download", xml_path=xml_path):
+                content = await loop.run_in_executor(_io_executor, download, xml_path)
+        if invoice_data is None and sha256 is None:
+            # XML recibido en la petición o ruta antigua: al menos se evita el parseo
+            sha256 = hashlib.sha256(content).hexdigest()
+            invoice_data = await _cached(sha256, xml_path)
+        if invoice_data is None:
+            with tracing.span("parse_xml", xml_path=xml_path):
+                invoice_data = await _parse(content)
+            await parse_cache.put(sha256, invoice_data)
+        return {
+            "operation_id": op_id,
+            "status": "SUCCESS",
+            "xml_index": idx + 1,
+            "xml_path": xml_path,
+            "parsed_invoice_data": invoice_data
+        }
+    except Exception as e:
+        print(f"[Parser] Error al procesar XML {idx+1}: {e}")
+        return {
+            "operation_id": op_id,
+            "status": "ERROR",
+            "xml_index": idx + 1,
+            "xml_path": xml_path,
+            "error_message": str(e)
+        }
+
+
+def _log_summary(ok: int, total: int, started: float):
+    print(
+        f"[Parser] {ok}/{total} XMLs procesados en {time.perf_counter() - started:.2f}s "
+        f"({PARSER_IO_CONCURRENCY} descargas en paralelo, {PARSER_PROCESSES} procesos)"
+    )
+
+
+async def _gather_results(jobs) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
+    results = await asyncio.gather(*jobs)
+    _log_summary(sum(1 for r in results if r["status"] == "SUCCESS"), len(results), started)
+    return list(results)
+
+
+async def _iter_results(jobs) -> AsyncIterator[Dict[str, Any]]:
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(job) for job in jobs]
+    ok = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            ok += result["status"] == "SUCCESS"
+            yield result
+    finally:
+        # Si quien consume deja de leer (p. ej. el cliente cortó la conexión), no se
+        # sigue parseando para nadie
+        for task in tasks:
+            task.cancel()
+    _log_summary(ok, len(tasks), started)
+
+
+def _path_jobs(op_id: str, xml_paths: List[str], download: Callable[[str], bytes]) -> Iterable:
+    return (_process_one(op_id, idx, xml_path, download=download) for idx, xml_path in enumerate(xml_paths))
+
+
+def _content_jobs(op_id: str, files: List[Tuple[str, bytes]]) -> Iterable:
+    return (_process_one(op_id, idx, filename, content=content) for idx, (filename, content) in enumerate(files))
+
+
+async def parse_xml_paths(op_id: str, xml_paths: List[str], download: Callable[[str], bytes]) -> List[Dict[str, Any]]:
+    """
+    Descarga y parsea los XML de un envío. Las descargas (bloqueantes) se solapan en
+    un pool de hilos y cada XML pasa al pool de procesos apenas termina de bajar, sin
+    esperar a los demás. Los resultados mantienen el orden de xml_paths.
+    """
+    return await _gather_results(_path_jobs(op_id, xml_paths, download))
+
+
+async def parse_xml_contents(op_id: str, files: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """
+    Parsea XML recibidos en la misma petición, como (nombre de archivo, contenido).
+    En los resultados, xml_path es el nombre de archivo.
+    """
+    return await _gather_results(_content_jobs(op_id, files))
+
+
+def iter_xml_paths(op_id: str, xml_paths: List[str], download: Callable[[str], bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Igual que parse_xml_paths, pero entrega cada resultado apenas termina su XML, en
+    orden de llegada y no de xml_paths (xml_index indica a cuál corresponde).
+    """
+    return _iter_results(_path_jobs(op_id, xml_paths, download))
+
+
+def iter_xml_contents(op_id: str, files: List[Tuple[str, bytes]]) -> AsyncIterator[Dict[str, Any]]:
+    """Igual que parse_xml_contents, pero entrega cada resultado apenas termina su XML."""
+    return _iter_results(_content_jobs(op_id, files))
@@ -1,34 +1,103 @@
 from lxml import etree
 from datetime import datetime, timedelta
 
-def extract_invoice_data(xml_content_bytes: bytes) -> dict:
+CBC = '{urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2}'
+CAC = '{urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2}'
+
+# Elementos que abren cada una de las rutas que se extraen
+ISSUE_DATE = CBC + 'IssueDate'
+LEGAL_MONETARY_TOTAL = CAC + 'LegalMonetaryTotal'
+PAYMENT_TERMS = CAC + 'PaymentTerms'
+CUSTOMER_PARTY = CAC + 'AccountingCustomerParty'
+SUPPLIER_PARTY = CAC + 'AccountingSupplierParty'
+SCANNED_TAGS = (ISSUE_DATE, LEGAL_MONETARY_TOTAL, PAYMENT_TERMS, CUSTOMER_PARTY, SUPPLIER_PARTY)
+
+
+def _child(element, tag):
+    return next(element.iterchildren(tag), None)
+
+
+def _descendant_with_parent(element, tag, parent_tag):
+    # Equivale a element.find('.//padre/etiqueta')
+    return next((e for e in element.iterdescendants(tag) if e.getparent().tag == parent_tag), None)
+
+
+def _text(element, default=None):
+    return element.text.strip() if element is not None and element.text is not None else default
+
+
+def _parse_root(xml_content_bytes: bytes):
     """
-    Toma el contenido de un archivo XML en bytes, lo parsea y devuelve
-    un diccionario con los datos extraídos de la factura.
-   
+    Parsea los bytes tal como llegan, con la codificación que declara el XML. Si no
+    se pueden leer así (p. ej. Latin-1 sin declaración), se reintenta como antes:
+    primero como ISO-8859-1 y luego como UTF-8 sin BOM.
     """
+    try:
+        return etree.fromstring(xml_content_bytes)
+    except etree.XMLSyntaxError:
+        pass
     try:
         xml_content = xml_content_bytes.decode('iso-8859-1')
-        root = etree.fromstring(xml_content.encode('utf-8'))
+        return etree.fromstring(xml_content.encode('utf-8'))
     except Exception:
         xml_content = xml_content_bytes.decode('utf-8').lstrip('\ufeff')
-        root = etree.fromstring(xml_content.encode('utf-8'))
+        return etree.fromstring(xml_content.encode('utf-8'))
 
-    ns = {
-        'cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
-        'cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2'
-    }
 
-    def find_text(xpath, default=None):
-        element = root.find(xpath, ns)
-        return element.text.strip() if element is not None and element.text is not None else default
+def _has_id(payment_terms, value: str) -> bool:
+    # Equivale al predicado [cbc:ID='valor'] de ElementPath: algún hijo cbc:ID con ese texto
+    return any("".join(e.itertext()) == value for e in payment_terms.iterchildren(CBC + 'ID'))
+
+
+def _scan(root) -> dict:
+    """
+    Recorre el árbol una sola vez (el filtro por etiqueta corre en lxml, en C) y
+    guarda la primera coincidencia de cada ruta en orden de documento, igual que
+    root.find('.//...'), sin una búsqueda completa por campo.
+    """
+    found = {}
+
+    def first(key, element):
+        if element is not None and key not in found:
+            found[key] = element
+
+    for element in root.iterdescendants(*SCANNED_TAGS):
+        tag = element.tag
+        if tag == ISSUE_DATE:
+            first('issue_date', element)
+        elif tag == LEGAL_MONETARY_TOTAL:
+            first('payable_amount', _child(element, CBC + 'PayableAmount'))
+        elif tag == PAYMENT_TERMS:
+            if _has_id(element, 'FormaPago'):
+                first('payment_form', _child(element, CBC + 'PaymentMeansID'))
+            first('due_date', _child(element, CBC + 'PaymentDueDate'))
+            if _has_id(element, 'Detraccion'):
+                first('detraction', _child(element, CBC + 'PaymentPercent'))
+        else:
+            role = 'debtor' if tag == CUSTOMER_PARTY else 'client'
+            first(f'{role}_name', _descendant_with_parent(element, CBC + 'RegistrationName', CAC + 'PartyLegalEntity'))
+            first(f'{role}_ruc', _descendant_with_parent(element, CBC + 'ID', CAC + 'PartyIdentification'))
+    return found
+
+
+def extract_invoice_data(xml_content_bytes: bytes) -> dict:
+    """
+    Toma el contenido de un archivo XML en bytes, lo parsea y devuelve
+    un diccionario con los datos extraídos de la factura.
+
+    """
+    root = _parse_root(xml_content_bytes)
+    found = _scan(root)
+
+    def find_text(key, default=None):
+        return _text(found.get(key), default)
 
     # Extracción de datos
-    issue_date_str = find_text('.//cbc:IssueDate')
-    total_amount = float(find_text('.//cac:LegalMonetaryTotal/cbc:PayableAmount', '0'))
-    payment_form = find_text(".//cac:PaymentTerms[cbc:ID='FormaPago']/cbc:PaymentMeansID")
-    due_date_str = find_text('.//cac:PaymentTerms/cbc:PaymentDueDate')
-    
+    issue_date_str = find_text('issue_date')
+    total_amount = float(find_text('payable_amount', '0'))
+    payment_form = find_text('payment_form')
+    due_date_str = find_text('due_date')
+
     # Lógica de fechas
     issue_date = datetime.strptime(issue_date_str, '%Y-%m-%d') if issue_date_str else None
     due_date = None
@@ -42,22 +111,22 @@ def extract_invoice_data(xml_content_bytes: bytes) -> dict:
     issue_date_iso = issue_date.isoformat() if issue_date else None
     due_date_iso = due_date.isoformat() if due_date else None
 
-    currency_element = root.find('.//cac:LegalMonetaryTotal/cbc:PayableAmount', ns)
+    currency_element = found.get('payable_amount')
     currency = currency_element.get('currencyID', 'N/A') if currency_element is not None else 'N/A'
-    detraction_amount = float(find_text(".//cac:PaymentTerms[cbc:ID='Detraccion']/cbc:PaymentPercent", '0'))
+    detraction_amount = float(find_text('detraction', '0'))
     net_amount = total_amount * (100 - detraction_amount) / 100
 
     invoice_data = {
-        "document_id": find_text('./cbc:ID'),
+        "document_id": _text(_child(root, CBC + 'ID')),
         "issue_date": issue_date_iso,
         "due_date": due_date_iso,
         "currency": currency,
         "total_amount": total_amount,
         "net_amount": net_amount,
-        "debtor_name": find_text('.//cac:AccountingCustomerParty//cac:PartyLegalEntity/cbc:RegistrationName'),
-        "debtor_ruc": find_text('.//cac:AccountingCustomerParty//cac:PartyIdentification/cbc:ID'),
-        "client_name": find_text('.//cac:AccountingSupplierParty//cac:PartyLegalEntity/cbc:RegistrationName'),
-        "client_ruc": find_text('.//cac:AccountingSupplierParty//cac:PartyIdentification/cbc:ID')
+        "debtor_name": find_text('debtor_name'),
+        "debtor_ruc": find_text('debtor_ruc'),
+        "client_name": find_text('client_name'),
+        "client_ruc": find_text('client_ruc')
     }
-    
-    return invoice_data
\ No newline at end of file
+
+    return invoice_data
@@ -1,3 +1,6 @@
+# parser-service-1/publisher_utils.py
+# Versión original, sin uso en el parser. La del orquestador es una copia ampliada
+# (brokers locales, publicación por lotes); un cambio aquí no le llega a esa copia.
 import os
 import json
 import requests
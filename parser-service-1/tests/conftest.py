@@ -0,0 +1,9 @@
+# parser-service-1/tests/conftest.py
+import os
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# tracing.py vive en shared/, común a todos los servicios
+sys.path[:0] = [SERVICE_DIR, os.path.join(os.path.dirname(SERVICE_DIR), "shared")]
+
+CORPUS_DIR = os.path.join(SERVICE_DIR, "benchmarks", "corpus")
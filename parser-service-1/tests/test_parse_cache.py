@@ -0,0 +1,106 @@
+# parser-service-1/tests/test_parse_cache.py
+"""
+Caché de parseo por SHA-256 del XML: memoria con LRU por tamaño, nivel persistente
+compartido y, en el pipeline, un acierto evita la descarga y el parseo.
+"""
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+import parse_pipeline
+from parse_cache import DiskTier, LruTier, ParseCache, sha256_from_path
+from conftest import CORPUS_DIR
+
+SHA = "a" * 64
+
+
+def test_lru_desaloja_por_tamano():
+    tier = LruTier(max_bytes=10)
+    tier.put("a", {"v": 1}, 4)
+    tier.put("b", {"v": 2}, 4)
+    tier.get("a")
+    tier.put("c", {"v": 3}, 4)  # desaloja b, el menos usado
+    tier.put("grande", {"v": 4}, 11)  # no cabe: no se guarda
+
+    assert tier.get("b") is None and tier.get("grande") is None
+    assert tier.get("a") == {"v": 1} and tier.get("c") == {"v": 3}
+    assert (tier.bytes, tier.evictions) == (8, 1)
+
+
+def test_nivel_persistente_compartido(tmp_path):
+    primera = ParseCache(1024, DiskTier(str(tmp_path)))
+    asyncio.run(primera.put(SHA, {"document_id": "F001-1"}))
+
+    # Otra instancia, con la memoria vacía, lo lee del disco y lo deja en memoria
+    segunda = ParseCache(1024, DiskTier(str(tmp_path)))
+    assert asyncio.run(segunda.get(SHA)) == {"document_id": "F001-1"}
+    asyncio.run(segunda.get(SHA))
+    assert (segunda.persistent_hits, segunda.memory_hits, segunda.misses) == (1, 1, 0)
+    assert asyncio.run(segunda.get("b" * 64)) is None
+
+
+def test_resultado_devuelto_es_una_copia():
+    cache = ParseCache(1024)
+    asyncio.run(cache.put(SHA, {"document_id": "F001-1"}))
+    asyncio.run(cache.get(SHA))["document_id"] = "modificado"
+    assert asyncio.run(cache.get(SHA)) == {"document_id": "F001-1"}
+
+
+def test_falla_del_nivel_persistente_cuenta_como_fallo_de_cache():
+    class BrokenTier:
+        name = "roto"
+
+        def get(self, key):
+            raise OSError("sin acceso")
+
+        def put(self, key, data):
+            raise OSError("sin acceso")
+
+    cache = ParseCache(0, BrokenTier())
+    asyncio.run(cache.put(SHA, {"document_id": "F001-1"}))
+    assert asyncio.run(cache.get(SHA)) is None
+    assert cache.stats()["persistent_errors"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_sha256_de_la_ruta_por_contenido():
+    assert sha256_from_path(f"gs://bucket/contenido/{SHA}/factura.xml") == SHA
+    assert sha256_from_path("gs://bucket/xml/factura.xml") is None
+    assert sha256_from_path(None) is None
+
+
+@pytest.fixture
+def pipeline_cache(monkeypatch):
+    cache = ParseCache(1024 * 1024)
+    monkeypatch.setattr(parse_pipeline, "parse_cache", cache)
+    monkeypatch.setattr(parse_pipeline, "PARSER_PROCESSES", 0)
+    return cache
+
+
+def test_acierto_evita_descarga_y_parseo(pipeline_cache):
+    with open(os.path.join(CORPUS_DIR, "20601234567-01-F700-1.xml"), "rb") as f:
+        content = f.read()
+    path = f"gs://bucket/contenido/{hashlib.sha256(content).hexdigest()}/factura.xml"
+    downloads = []
+
+    def download(xml_path):
+        downloads.append(xml_path)
+        return content
+
+    first = asyncio.run(parse_pipeline._process_one("OP-1", 0, path, download))
+    second = asyncio.run(parse_pipeline._process_one("OP-1", 0, path, download))
+    assert first["status"] == second["status"] == "SUCCESS"
+    assert second["parsed_invoice_data"] == first["parsed_invoice_data"]
+    assert downloads == [path]
+
+    # El mismo XML recibido en la petición también reutiliza el resultado
+    inline = asyncio.run(parse_pipeline._process_one("OP-2", 0, "factura.xml", content=content))
+    assert inline["parsed_invoice_data"] == first["parsed_invoice_data"]
+    assert pipeline_cache.stats()["hits"] == 2
+
+
+def test_xml_invalido_no_se_guarda(pipeline_cache):
+    result = asyncio.run(parse_pipeline._process_one("OP-1", 0, "roto.xml", content=b"<Invoice>"))
+    assert result["status"] == "ERROR"
+    assert pipeline_cache.stats()["memory_entries"] == 0
@@ -0,0 +1,224 @@
+# shared/tracing.py
+# Instrumentación común a todos los servicios (orquestador, parser, cavali, drive,
+# gmail, trello, excel). Cada Dockerfile se construye desde la raíz del repositorio y
+# copia este archivo junto a main.py; en local, main.py agrega shared/ al sys.path.
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import contextlib
+import urllib.request
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# --- Configuración ---
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+# Imprime cada span como una línea "[SPAN] {...}" que trace_collector.py sabe leer
+TRACE_PRINT_SPANS = os.getenv("TRACE_PRINT_SPANS", "false").lower() == "true"
+# Si se define, los spans también se envían al colector local (POST /spans)
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL")
+
+# Límites superiores (segundos) de los buckets de los histogramas
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    service: str
+    name: str
+    start: float
+    duration_s: float = 0.0
+    status: str = "OK"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "service": self.service, "name": self.name, "start": round(self.start, 6),
+            "duration_s": round(self.duration_s, 6), "status": self.status, "attributes": self.attributes,
+        }
+
+
+_service_name = os.getenv("SERVICE_NAME", "servicio")
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+# --- Histogramas estilo Prometheus ---
+class Histogram:
+    def __init__(self, buckets=SPAN_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Dict[str, str], value: float):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # [conteo por bucket..., +Inf, suma]
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self, name: str, help_text: str) -> List[str]:
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            labels = ",".join(f'{k}="{v}"' for k, v in key)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series[len(self.buckets)]}')
+            lines.append(f"{name}_sum{{{labels}}} {series[-1]:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {series[len(self.buckets)]}")
+        return lines
+
+
+span_duration = Histogram()
+http_duration = Histogram()
+
+
+def render_metrics() -> str:
+    lines = span_duration.render("span_duration_seconds", "Duración de cada etapa instrumentada")
+    lines += http_duration.render("http_server_duration_seconds", "Duración de las peticiones HTTP recibidas")
+    return "\n".join(lines) + "\n"
+
+
+# --- Exportación de spans ---
+_export_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=10000)
+_exporter: Optional[threading.Thread] = None
+
+
+def _export_loop():
+    while True:
+        batch = [_export_queue.get()]
+        while len(batch) < 100:
+            try:
+                batch.append(_export_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            req = urllib.request.Request(
+                f"{TRACE_COLLECTOR_URL.rstrip('/')}/spans", data=json.dumps(batch).encode("utf-8"),
+                headers={"Content-Type": "application/json"}, method="POST",
+            )
+            urllib.request.urlopen(req, timeout=2).close()
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudieron enviar {len(batch)} spans al colector. Error: {e}")
+
+
+def _export(span: Span):
+    global _exporter
+    data = span.to_dict()
+    if TRACE_PRINT_SPANS:
+        print(f"[SPAN] {json.dumps(data, ensure_ascii=False)}")
+    if TRACE_COLLECTOR_URL:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+            _exporter.start()
+        try:
+            _export_queue.put_nowait(data)
+        except queue.Full:
+            pass
+
+
+# --- Spans ---
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def outgoing_headers() -> Dict[str, str]:
+    """Cabeceras para propagar la traza actual a otro servicio."""
+    span = _current_span.get()
+    if span is None:
+        return {}
+    return {REQUEST_ID_HEADER: span.trace_id, PARENT_SPAN_HEADER: span.span_id}
+
+
+@contextlib.contextmanager
+def span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Mide una etapa. Sirve tanto en código síncrono como dentro de corrutinas: el
+    span actual se guarda en un ContextVar, así las etapas anidadas y las llamadas
+    salientes quedan como hijas suyas.
+    """
+    parent = _current_span.get()
+    current = Span(
+        trace_id=trace_id or (parent.trace_id if parent else uuid.uuid4().hex),
+        span_id=_new_id(),
+        parent_id=parent_id or (parent.span_id if parent and not trace_id else None),
+        service=_service_name,
+        name=name,
+        start=time.time(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = f"ERROR: {e.__class__.__name__}"
+        raise
+    finally:
+        current.duration_s = time.perf_counter() - started
+        _current_span.reset(token)
+        span_duration.observe({"service": current.service, "span": current.name}, current.duration_s)
+        _export(current)
+
+
+def continue_trace(headers: Optional[Dict[str, str]], name: str, **attributes: Any):
+    """Span que continúa una traza recibida en cabeceras (o en un mensaje del broker)."""
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    return span(
+        name, trace_id=headers.get(REQUEST_ID_HEADER.lower()), parent_id=headers.get(PARENT_SPAN_HEADER.lower()), **attributes
+    )
+
+
+# --- FastAPI ---
+def install(app, service_name: str):
+    """
+    Instrumenta una app de FastAPI: cada petición abre un span que continúa la traza
+    de X-Request-ID (o inicia una nueva), la respuesta devuelve ese X-Request-ID y
+    GET /metrics expone los histogramas en formato Prometheus.
+    """
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    global _service_name
+    _service_name = os.getenv("SERVICE_NAME", service_name)
+
+    @app.middleware("http")
+    async def _trace_requests(request: Request, call_next):
+        if request.url.path == "/metrics":
+            return await call_next(request)
+        started = time.perf_counter()
+        with continue_trace(dict(request.headers), f"{request.method} {request.url.path}") as current:
+            response = await call_next(request)
+            # Se nombra por la ruta (/jobs/{job_id}) y no por la URL, para no crear una serie
+            # por ID; las URLs que no coinciden con ninguna ruta comparten "unmatched"
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            current.name = f"{request.method} {route}"
+            current.attributes["status_code"] = response.status_code
+        http_duration.observe(
+            {"service": _service_name, "method": request.method, "route": route, "status": str(response.status_code)},
+            time.perf_counter() - started,
+        )
+        response.headers[REQUEST_ID_HEADER] = current.trace_id
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    async def _metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
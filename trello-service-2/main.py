@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import datetime
 import json
@@ -8,9 +9,15 @@ from dotenv import load_dotenv
 from google.cloud import storage
 from collections import defaultdict
 
+# tracing.py es común a todos los servicios y vive en shared/, en la raíz del
+# repositorio; la imagen de Docker lo copia junto a este archivo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+import tracing
+
 # --- Carga de configuración ---
 load_dotenv()
 app = FastAPI(title="Trello Service (v3 Corregido)")
+tracing.install(app, "trello")
 
 # --- Clientes y Variables ---
 TRELLO_API_KEY = os.getenv("TRELLO_API_KEY")
@@ -151,8 +158,9 @@ def process_operation_and_create_card(payload: Dict[str, Any]):
         
         print("\n--- 2. Llamando a la API de Trello ---")
         url_card = "https://api.trello.com/1/cards"
-        response = requests.post(url_card, params=auth_params, json=card_payload)
-        response.raise_for_status() 
+        with tracing.span("trello_card"):
+            response = requests.post(url_card, params=auth_params, json=card_payload)
+            response.raise_for_status()
         
         card_id = response.json()["id"]
         print(f"--- 3. Tarjeta creada: {card_id} ---")
@@ -160,10 +168,12 @@ def process_operation_and_create_card(payload: Dict[str, Any]):
         url_attachment = f"https://api.trello.com/1/cards/{card_id}/attachments"
         for path in attachment_paths:
             try:
-                file_bytes = download_blob_as_bytes(path)
+                with tracing.span("gcs_download", gcs_path=path):
+                    file_bytes = download_blob_as_bytes(path)
                 filename = os.path.basename(path)
                 files = {"file": (filename, file_bytes)}
-                requests.post(url_attachment, params=auth_params, files=files)
+                with tracing.span("trello_attachment", filename=filename):
+                    requests.post(url_attachment, params=auth_params, files=files)
             except Exception as e:
                 print(f"ADVERTENCIA: No se pudo adjuntar {path}. Error: {e}")
 